@@ -1,8 +1,8 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from data_processor import DataProcessor
+from data_processor import DataProcessor, SORT_COLUMNS
+from chart_renderer import ChartRenderer
+from dataset_store import DatasetStore
+from config import CHART_BACKEND, DATASET_STORE
 import logging
 
 # Configure logging
@@ -17,7 +17,7 @@ st.set_page_config(
 )
 
 st.title("🍰 Bakery Sales Dashboard")
-st.markdown("Visualizing daily performance from the bakery sales database or CSV backup.")
+st.markdown("Visualizing daily performance from the bakery sales database or local backup.")
 
 # Initialize data processor
 @st.cache_resource
@@ -26,56 +26,93 @@ def get_data_processor():
 
 data_processor = get_data_processor()
 
+@st.cache_resource
+def get_dataset_store():
+    # One read-only copy of the local data for every session, used when the
+    # database is unavailable; st.cache_data would give each session a copy
+    return DatasetStore(data_processor)
+
+if DATASET_STORE:
+    data_processor.dataset_store = get_dataset_store()
+
+@st.cache_resource
+def get_chart_renderer():
+    # One renderer (and chart cache) shared by every session
+    return ChartRenderer()
+
+chart_renderer = get_chart_renderer()
+
+def show_bar_chart(name, data, x, y, palette, xlabel, ylabel, cache_key):
+    """Draw a bar chart of aggregated points with the configured backend"""
+    data = data[[x, y]].sort_values(y, ascending=False)
+    if CHART_BACKEND == "native":
+        st.bar_chart(data, x=x, y=y)
+    else:
+        png = chart_renderer.bar_chart((name,) + cache_key, data, x, y, palette, xlabel, ylabel)
+        st.image(png, use_column_width=True)
+
 # --- LOAD DATA ---
 @st.cache_data(ttl=300)  # Cache for 5 minutes
-def load_cached_data():
-    data = data_processor.load_data()
+def load_cached_cube():
+    # Small (city x product) aggregate cube; filter changes only slice it
+    cube = data_processor.get_sales_cube()
+
+    if cube is None or cube.empty:
+        st.error("No data available from database or local backup")
+        return None
 
-    if data.empty:
-        st.error("No data available from database or CSV backup")
-        return pd.DataFrame()
+    return cube
 
-    # Calculate metrics
-    data = data_processor.calculate_metrics(data)
-    return data
+# Rows per page offered in the raw data table
+PAGE_SIZES = [25, 50, 100, 500]
 
-data = load_cached_data()
+@st.cache_data(ttl=300, max_entries=100)
+def load_cached_page(cities, products, sort_by, ascending, page, page_size):
+    # Only the visible page of raw rows is fetched, sorted by the data layer
+    return data_processor.get_page(cities, products, sort_by, ascending,
+                                   offset=page * page_size, limit=page_size)
 
-if not data.empty:
+cube = load_cached_cube()
+
+if cube is not None:
     # Get summary stats
-    summary = data_processor.get_summary_stats(data)
+    overall = data_processor.slice_cube(cube)
+    summary = data_processor.get_summary_from_partial(cube)
 
     # --- SIDEBAR FILTERS ---
     st.sidebar.header("🔍 Filters")
 
     # City filter
-    cities = data["city"].unique()
+    cities = overall["by_city"]["city"].tolist()
     selected_cities = st.sidebar.multiselect(
         "Select City",
-        options=list(cities),
-        default=list(cities)
+        options=cities,
+        default=cities
     )
 
     # Product filter
-    products = data["product"].unique()
+    products = overall["by_product"]["product"].tolist()
     selected_products = st.sidebar.multiselect(
         "Select Product",
-        options=list(products),
-        default=list(products)
+        options=products,
+        default=products
     )
 
     # Apply filters
-    df_filtered = data[
-        (data["city"].isin(selected_cities)) &
-        (data["product"].isin(selected_products))
-        ]
+    filtered = data_processor.slice_cube(cube, selected_cities, selected_products)
+    kpis = filtered["kpis"]
+    has_data = kpis["total_transactions"] > 0
+
+    # Charts only change when the data or the filter selection does
+    chart_key = (chart_renderer.data_version(cube),
+                 tuple(sorted(selected_cities)), tuple(sorted(selected_products)))
 
     # --- KPIs ---
     st.header("📊 Key Performance Indicators")
 
-    total_revenue = round(df_filtered["revenue"].sum(), 2)
-    total_profit = round(df_filtered["profit"].sum(), 2)
-    avg_price = round(df_filtered["unit_price"].mean(), 2)
+    total_revenue = round(kpis["total_revenue"], 2) if has_data else 0
+    total_profit = round(kpis["total_profit"], 2) if has_data else 0
+    avg_price = round(kpis["avg_unit_price"], 2) if has_data else 0
     profit_margin = round((total_profit / total_revenue * 100), 2) if total_revenue > 0 else 0
 
     col1, col2, col3, col4 = st.columns(4)
@@ -93,29 +130,17 @@ if not data.empty:
 
     with col1:
         st.subheader("Revenue by City")
-        if not df_filtered.empty:
-            city_rev = df_filtered.groupby("city")["revenue"].sum().reset_index().sort_values("revenue",
-                                                                                              ascending=False)
-            fig, ax = plt.subplots(figsize=(10, 6))
-            sns.barplot(x="city", y="revenue", data=city_rev, palette="magma", ax=ax)
-            ax.set_ylabel("Revenue ($)")
-            ax.set_xlabel("City")
-            plt.tight_layout()
-            st.pyplot(fig)
+        if has_data:
+            show_bar_chart("city_revenue", filtered["by_city"], "city", "revenue",
+                           "magma", "City", "Revenue ($)", chart_key)
         else:
             st.info("No data available for selected filters")
 
     with col2:
         st.subheader("Profit by Product")
-        if not df_filtered.empty:
-            prod_profit = df_filtered.groupby("product")["profit"].sum().reset_index().sort_values("profit",
-                                                                                                   ascending=False)
-            fig, ax = plt.subplots(figsize=(10, 6))
-            sns.barplot(x="product", y="profit", data=prod_profit, palette="crest", ax=ax)
-            ax.set_ylabel("Profit ($)")
-            ax.set_xlabel("Product")
-            plt.tight_layout()
-            st.pyplot(fig)
+        if has_data:
+            show_bar_chart("product_profit", filtered["by_product"], "product", "profit",
+                           "crest", "Product", "Profit ($)", chart_key)
         else:
             st.info("No data available for selected filters")
 
@@ -124,26 +149,17 @@ if not data.empty:
 
     with col3:
         st.subheader("Units Sold by Product")
-        if not df_filtered.empty:
-            units_sold = df_filtered.groupby("product")["units_sold"].sum().reset_index().sort_values("units_sold",
-                                                                                                      ascending=False)
-            fig, ax = plt.subplots(figsize=(10, 6))
-            sns.barplot(x="product", y="units_sold", data=units_sold, palette="plasma", ax=ax)
-            ax.set_ylabel("Units Sold")
-            ax.set_xlabel("Product")
-            plt.tight_layout()
-            st.pyplot(fig)
+        if has_data:
+            show_bar_chart("product_units", filtered["by_product"], "product", "units_sold",
+                           "plasma", "Product", "Units Sold", chart_key)
         else:
             st.info("No data available for selected filters")
 
     with col4:
         st.subheader("Top Performing Cities")
-        if not df_filtered.empty:
+        if has_data:
             # Create a simple summary of top cities
-            city_summary = df_filtered.groupby("city").agg({
-                'revenue': 'sum',
-                'profit': 'sum'
-            }).reset_index()
+            city_summary = filtered["by_city"][["city", "revenue", "profit"]]
             st.dataframe(city_summary.sort_values('revenue', ascending=False), use_container_width=True)
         else:
             st.info("No data available for selected filters")
@@ -169,23 +185,41 @@ if not data.empty:
 
     # Data table
     st.subheader("Raw Data")
-    if not df_filtered.empty:
+    if not has_data:
+        st.info("No data available for selected filters")
+    elif st.checkbox("Show raw data"):
+        total_rows = int(kpis["total_transactions"])
+        col1, col2, col3, col4 = st.columns(4)
+        sort_by = col1.selectbox("Sort by", ["(none)"] + list(SORT_COLUMNS))
+        ascending = col2.selectbox("Order", ["Ascending", "Descending"]) == "Ascending"
+        page_size = col3.selectbox("Rows per page", PAGE_SIZES, index=1)
+        page_count = max((total_rows + page_size - 1) // page_size, 1)
+        page = col4.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1)
+
+        df_page = load_cached_page(
+            tuple(selected_cities), tuple(selected_products),
+            None if sort_by == "(none)" else sort_by, ascending, page - 1, page_size
+        )
+        first_row = (page - 1) * page_size
+        st.caption(f"Rows {first_row + 1:,}–{first_row + len(df_page):,} of {total_rows:,}")
         st.dataframe(
-            df_filtered,
+            df_page,
             use_container_width=True,
             hide_index=True
         )
 
-        # Download button for filtered data
-        csv = df_filtered.to_csv(index=False)
-        st.download_button(
-            label="📥 Download Filtered Data as CSV",
-            data=csv,
-            file_name="bakery_sales_filtered.csv",
-            mime="text/csv"
-        )
-    else:
-        st.info("No data available for selected filters")
+        # The CSV is only built when asked for, streaming the rows in chunks
+        export_key = (tuple(selected_cities), tuple(selected_products))
+        if st.button("Prepare CSV export"):
+            st.session_state["csv_export"] = (export_key, data_processor.export_csv(*export_key))
+        export = st.session_state.get("csv_export")
+        if export and export[0] == export_key:
+            st.download_button(
+                label="📥 Download Filtered Data as CSV",
+                data=export[1],
+                file_name="bakery_sales_filtered.csv",
+                mime="text/csv"
+            )
 
 else:
     st.error("""
@@ -196,14 +230,14 @@ else:
     - Check database credentials in `.env` file
     - Verify the 'sales' table exists in your database
 
-    **CSV Backup:**
-    - Ensure 'cleaned_bakery_sales.csv' exists in the project directory
-    - Or update CSV_BACKUP_PATH in config.py
+    **Local Backup:**
+    - Ensure 'bakery_sales.parquet' exists in the project directory (create it from 'bakery_sales.csv' with `python data_processor.py import-csv`)
+    - Or update BACKUP_PATH in config.py
 
     **Troubleshooting Steps:**
     1. Check the logs in the 'logs' directory
     2. Verify your database connection settings
-    3. Ensure the CSV file is in the correct location
+    3. Ensure the backup file is in the correct location
     """)
 
 # --- FOOTER ---
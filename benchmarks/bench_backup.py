@@ -0,0 +1,92 @@
+"""Compare loading the local backup from CSV, Parquet and memory-mapped Feather.
+
+Times a full load, a one-column projection and a single-city filter for each
+format. Each format runs in its own subprocess so the peak RSS growth of the
+full load is measured independently.
+
+Usage: python -m benchmarks.bench_backup --rows 10000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from benchmarks.bench_dtypes import best_time
+from benchmarks.profiling import PeakRSS
+from benchmarks.synthetic_data import generate_sales, CITIES
+
+FORMATS = ("csv", "parquet", "feather")
+
+
+def make_processor(workdir, backup_format):
+    from data_processor import DataProcessor
+
+    processor = DataProcessor()
+    processor.csv_backup_path = os.path.join(workdir, "sales.csv")
+    processor.backup_path = os.path.join(workdir, f"sales.{backup_format}")
+    return processor
+
+
+def run_format(backup_format, workdir, repeat):
+    """Time the loads for one format; prints a JSON result line"""
+    processor = make_processor(workdir, backup_format)
+    city = CITIES[0]
+    if backup_format == "csv":
+        path = processor.csv_backup_path
+        full = lambda: processor.read_typed_csv(path)
+        column = lambda: processor.read_typed_csv(path)[["units_sold"]]
+        one_city = lambda: processor.filter_frame(processor.read_typed_csv(path), [city])
+    else:
+        path = processor.backup_path
+        full = processor.load_data_from_backup
+        column = lambda: processor.load_data_from_backup(["units_sold"])
+        one_city = lambda: processor.load_data_from_backup(cities=[city])
+
+    with PeakRSS() as rss:
+        full()
+
+    print(json.dumps({
+        "mb": os.path.getsize(path) / 1024 ** 2,
+        "full": best_time(full, repeat),
+        "column": best_time(column, repeat),
+        "city": best_time(one_city, repeat),
+        "peak_rss_growth_mb": rss.growth_mb,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", choices=FORMATS, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_format(args.worker, args.workdir, args.repeat)
+        return
+
+    print(f"Generating {args.rows:,} synthetic rows...")
+    with tempfile.TemporaryDirectory() as workdir:
+        generate_sales(args.rows, seed=args.seed).to_csv(os.path.join(workdir, "sales.csv"), index=False)
+        # Same rows in the same order for every columnar format
+        for backup_format in FORMATS[1:]:
+            make_processor(workdir, backup_format).import_csv_backup()
+
+        print(f"\n{'format':<10}{'MB':>8}{'full load':>11}{'1 column':>10}"
+              f"{'1 city':>9}{'peak RSS MB':>13}")
+        for backup_format in FORMATS:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_backup", "--worker", backup_format,
+                 "--workdir", workdir, "--repeat", str(args.repeat)],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{backup_format:<10}{result['mb']:>8.1f}{result['full']:>10.2f}s"
+                  f"{result['column']:>9.2f}s{result['city']:>8.2f}s{result['peak_rss_growth_mb']:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compare the dashboard's legacy per-rerun chart drawing with ChartRenderer.
+
+Simulates dashboard reruns: each picks a random filter selection from a
+small pool (users keep returning to the same selections) and draws the three
+bar charts. The legacy path draws with pyplot + seaborn and never closes its
+figures, as app.py used to; the new path serves PNGs from the LRU cache.
+
+Usage: python -m benchmarks.bench_charts --reruns 200
+"""
+import argparse
+import io
+import random
+import time
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import seaborn as sns
+from chart_renderer import ChartRenderer
+from data_processor import DataProcessor
+from benchmarks.profiling import PeakRSS
+from benchmarks.synthetic_data import generate_sales
+
+CHARTS = (
+    ("city_revenue", "by_city", "city", "revenue", "magma", "City", "Revenue ($)"),
+    ("product_profit", "by_product", "product", "profit", "crest", "Product", "Profit ($)"),
+    ("product_units", "by_product", "product", "units_sold", "plasma", "Product", "Units Sold"),
+)
+
+
+def legacy_charts(filtered, key):
+    for _, frame, x, y, palette, xlabel, ylabel in CHARTS:
+        data = filtered[frame][[x, y]].sort_values(y, ascending=False)
+        fig, ax = plt.subplots(figsize=(10, 6))
+        sns.barplot(x=x, y=y, data=data, palette=palette, ax=ax)
+        ax.set_ylabel(ylabel)
+        ax.set_xlabel(xlabel)
+        plt.tight_layout()
+        # st.pyplot saves the figure to PNG
+        fig.savefig(io.BytesIO(), format="png")
+
+
+def make_cached_charts(renderer):
+    def cached_charts(filtered, key):
+        for name, frame, x, y, palette, xlabel, ylabel in CHARTS:
+            data = filtered[frame][[x, y]].sort_values(y, ascending=False)
+            renderer.bar_chart((name,) + key, data, x, y, palette, xlabel, ylabel)
+    return cached_charts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--reruns", type=int, default=200)
+    parser.add_argument("--selections", type=int, default=20, help="distinct filter selections")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    processor = DataProcessor()
+    data = processor.calculate_metrics(processor.apply_schema(generate_sales(args.rows, seed=args.seed),
+                                                              report=False), copy=False)
+    cube = processor.partial_aggregate(data)
+    cities = list(cube.index.unique("city"))
+    products = list(cube.index.unique("product"))
+
+    rng = random.Random(args.seed)
+    selections = [(tuple(sorted(rng.sample(cities, rng.randint(1, len(cities))))),
+                   tuple(sorted(rng.sample(products, rng.randint(1, len(products))))))
+                  for _ in range(args.selections)]
+    reruns = [rng.choice(selections) for _ in range(args.reruns)]
+
+    renderer = ChartRenderer()
+    version = renderer.data_version(cube)
+    print(f"{args.reruns} reruns over {args.selections} filter selections\n")
+    print(f"{'charts':<10}{'ms/rerun':>10}{'RSS growth MB':>15}{'open figures':>14}")
+    for name, draw in (("legacy", legacy_charts), ("cached", make_cached_charts(renderer))):
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            for selected_cities, selected_products in reruns:
+                filtered = processor.slice_cube(cube, selected_cities, selected_products)
+                draw(filtered, (version, selected_cities, selected_products))
+            seconds = time.perf_counter() - start
+        print(f"{name:<10}{seconds / args.reruns * 1000:>10.1f}{rss.growth_mb:>15.1f}"
+              f"{len(plt.get_fignums()):>14}")
+
+    print(f"\nChart cache: {renderer.hits} hits, {renderer.misses} misses")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compare per-city daily reports run one at a time with the batch fan-out.
+
+The per-city path repeats what a separate run_daily_report per city costs:
+it loads the report day's rows and the window history, aggregates them and
+renders one city's reports, once per city. The batch path loads both once,
+splits rows and aggregates by city in single groupby passes (city_variants)
+and renders all cities in one batch per worker (render_variants). Both read a
+local Parquet backup, so no database is needed.
+
+Usage: python -m benchmarks.bench_city_reports --rows 2000000 --days 60
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from data_processor import DataProcessor, SALES_SCHEMA
+from report_generator import ReportGenerator
+from daily_report import city_variants, render_reports, render_variants
+from config import REPORT_WORKERS
+from benchmarks.synthetic_data import generate_sales
+
+
+def load_day_and_history(processor, generator, report_date):
+    """Report day rows with metrics, and per-day aggregates covering the windows"""
+    day = processor.calculate_metrics(processor.load_data_from_backup(
+        start=report_date, end=report_date + timedelta(days=1)), copy=False)
+    start, end = generator.windows_range(report_date)
+    history = processor.load_data_from_backup(list(SALES_SCHEMA) + [processor.date_column], start=start, end=end)
+    return day, processor.daily_aggregate(processor.calculate_metrics(history, copy=False))
+
+
+def per_city(processor, generator, report_date, cities):
+    for city in cities:
+        day, daily = load_day_and_history(processor, generator, report_date)
+        day = processor.filter_frame(day, cities=[city])
+        daily = daily.xs(city, level="city", drop_level=False)
+        windows = generator.summarize_windows(processor, report_date, daily)
+        render_reports(day, processor.get_summary_stats(day), windows, report_date=report_date)
+
+
+def batch(processor, generator, report_date):
+    day, daily = load_day_and_history(processor, generator, report_date)
+    return render_variants(city_variants(processor, day, report_date, daily), report_date=report_date)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    report_date = date.today() - timedelta(days=1)
+    with tempfile.TemporaryDirectory() as workdir:
+        # Reports are written to ./reports, in the worker processes too
+        os.chdir(workdir)
+        processor = DataProcessor()
+        processor.backup_path = os.path.join(workdir, "sales.parquet")
+        print(f"Generating {args.rows:,} synthetic rows over {args.days} days...")
+        processor.write_backup(processor.apply_schema(
+            generate_sales(args.rows, seed=args.seed, days=args.days, end_date=report_date), report=False))
+
+        generator = ReportGenerator()
+        cities = sorted(processor.load_data_from_backup(["city"])["city"].unique())
+
+        start = time.perf_counter()
+        per_city(processor, generator, report_date, cities)
+        one_at_a_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        reports = batch(processor, generator, report_date)
+        batched = time.perf_counter() - start
+
+        start = time.perf_counter()
+        load_day_and_history(processor, generator, report_date)
+        load = time.perf_counter() - start
+
+        print(f"\n{len(reports)} cities, {REPORT_WORKERS} workers")
+        print(f"{'path':<16}{'seconds':>9}")
+        print(f"{'one per city':<16}{one_at_a_time:>9.2f}")
+        print(f"{'batch':<16}{batched:>9.2f}")
+        print(f"{'(one load)':<16}{load:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Compare COPY-based extraction with pd.read_sql_query on a local PostgreSQL.
+
+Seeds a scratch table with synthetic sales rows for each size, then loads it
+with both extraction methods, each in its own subprocess so peak RSS is
+measured independently. Uses the DB_* settings from the environment / .env.
+
+Usage: python -m benchmarks.bench_db_extract --sizes 100000 1000000 10000000
+"""
+import argparse
+import io
+import json
+import subprocess
+import sys
+import time
+from benchmarks.profiling import PeakRSS
+from benchmarks.synthetic_data import generate_sales
+
+METHODS = ("query", "copy")
+BENCH_TABLE = "sales_extract_bench"
+SEED_CHUNK_ROWS = 500_000
+
+
+def seed_table(processor, rows, seed):
+    """(Re)create the scratch table and bulk-load synthetic rows into it"""
+    conn = processor.connect_to_db()
+    if conn is None:
+        sys.exit("Database not available; check the DB_* settings")
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+            cursor.execute(f"""
+                CREATE TABLE {BENCH_TABLE} (
+                    id bigint PRIMARY KEY,
+                    city text,
+                    product text,
+                    units_sold integer,
+                    unit_price numeric(10, 2),
+                    cost_per_unit numeric(10, 2)
+                )
+            """)
+            data = generate_sales(rows, seed=seed)
+            for start in range(0, rows, SEED_CHUNK_ROWS):
+                buffer = io.StringIO()
+                data.iloc[start:start + SEED_CHUNK_ROWS].to_csv(buffer, index=False, header=False)
+                buffer.seek(0)
+                cursor.copy_expert(f"COPY {BENCH_TABLE} FROM STDIN WITH (FORMAT csv)", buffer)
+            cursor.execute(f"ANALYZE {BENCH_TABLE}")
+        conn.commit()
+    finally:
+        processor.release_connection(conn)
+
+
+def drop_table(processor):
+    conn = processor.connect_to_db()
+    if conn is None:
+        return
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {BENCH_TABLE}")
+        conn.commit()
+    finally:
+        processor.release_connection(conn)
+
+
+def run_method(method):
+    """Load the scratch table with one method; prints a JSON result line"""
+    from data_processor import DataProcessor
+
+    processor = DataProcessor()
+    processor.sales_table = BENCH_TABLE
+    processor.extract_method = method
+
+    with PeakRSS() as rss:
+        start = time.perf_counter()
+        data = processor.load_data_from_db()
+        seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        "method": method,
+        "rows": len(data),
+        "seconds": seconds,
+        "rows_per_sec": len(data) / seconds,
+        "peak_rss_growth_mb": rss.growth_mb,
+        "frame_mb": data.memory_usage(deep=True).sum() / 1024 ** 2,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", choices=METHODS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_method(args.worker)
+        return
+
+    from data_processor import DataProcessor
+    processor = DataProcessor()
+
+    print(f"{'rows':>12}  {'method':<8}{'seconds':>10}{'rows/sec':>13}{'peak RSS MB':>14}{'frame MB':>10}")
+    try:
+        for rows in args.sizes:
+            seed_table(processor, rows, args.seed)
+            for method in args.methods:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_db_extract", "--worker", method],
+                    check=True, capture_output=True, text=True,
+                ).stdout
+                result = json.loads(output.strip().splitlines()[-1])
+                print(f"{rows:>12,}  {method:<8}{result['seconds']:>10.2f}{result['rows_per_sec']:>13,.0f}"
+                      f"{result['peak_rss_growth_mb']:>14,.1f}{result['frame_mb']:>10.1f}")
+    finally:
+        drop_table(processor)
+
+
+if __name__ == "__main__":
+    main()
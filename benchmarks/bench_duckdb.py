@@ -0,0 +1,67 @@
+"""Compare the pandas and DuckDB engines for analytics over the local backup.
+
+Each operation runs with the database unreachable, as the dashboard and the
+report do when they fall back to local data: the pandas engine loads the
+backup into a DataFrame and aggregates it, DuckDB runs the SQL queries on the
+Parquet file. Peak RSS growth is measured per engine over all operations.
+
+Usage: python -m benchmarks.bench_duckdb --rows 10000000 --days 365
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from benchmarks.check_duckdb_parity import make_processor
+from benchmarks.profiling import PeakRSS
+from benchmarks.synthetic_data import generate_sales
+
+
+def operations(report_date):
+    month = (report_date.replace(day=1), report_date + timedelta(days=1))
+    return [
+        ("summary", lambda p: p.get_summary_stats()),
+        ("cube slice, 2 cities", lambda p: p.slice_cube(p.get_sales_cube(), ["Dhaka", "Sylhet"])),
+        ("aggregate cube", lambda p: p.get_sales_cube()),
+        ("daily aggregates, MTD", lambda p: p.get_daily_aggregates(*month)),
+        ("page by revenue", lambda p: p.get_page(["Dhaka"], None, "revenue", False, 0, 50)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    report_date = date.today() - timedelta(days=1)
+    with tempfile.TemporaryDirectory() as workdir:
+        backup_path = os.path.join(workdir, "sales.parquet")
+        writer = make_processor(workdir, backup_path, "pandas")
+        print(f"Generating {args.rows:,} synthetic rows over {args.days} days...")
+        writer.write_backup(writer.apply_schema(
+            generate_sales(args.rows, seed=args.seed, days=args.days, end_date=report_date), report=False))
+        del writer
+
+        print(f"\n{'operation':<24}{'pandas s':>10}{'duckdb s':>10}{'speedup':>9}")
+        timings = {}
+        memory = {}
+        for engine in ("duckdb", "pandas"):
+            processor = make_processor(workdir, backup_path, engine)
+            with PeakRSS() as rss:
+                for name, run in operations(report_date):
+                    start = time.perf_counter()
+                    run(processor)
+                    timings[name, engine] = time.perf_counter() - start
+            memory[engine] = rss.growth_mb
+
+        for name, _ in operations(report_date):
+            pandas_time, duckdb_time = timings[name, "pandas"], timings[name, "duckdb"]
+            print(f"{name:<24}{pandas_time:>10.2f}{duckdb_time:>10.3f}{pandas_time / duckdb_time:>8.1f}x")
+        print(f"{'peak RSS growth MB':<24}{memory['pandas']:>10.0f}{memory['duckdb']:>10.0f}")
+        print(f"\n{os.cpu_count()} CPU cores; DuckDB uses all of them unless DUCKDB_THREADS is set")
+
+
+if __name__ == "__main__":
+    main()
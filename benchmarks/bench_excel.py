@@ -0,0 +1,88 @@
+"""Compare the streaming Excel writer with pandas' in-memory openpyxl writer.
+
+Each writer runs in its own subprocess so peak RSS is not polluted by the
+other run. Reports rows/sec and peak RSS growth while writing.
+
+Usage: python -m benchmarks.bench_excel --rows 200000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+from benchmarks.profiling import PeakRSS
+from benchmarks.synthetic_data import generate_sales
+
+WRITERS = ("pandas", "streaming")
+
+
+def write_with_pandas(data, summary, reports_dir):
+    """The Raw_Data/Summary export as it was before the streaming writer"""
+    filename = os.path.join(reports_dir, "pandas_report.xlsx")
+    with pd.ExcelWriter(filename, engine="openpyxl") as writer:
+        data.to_excel(writer, sheet_name="Raw_Data", index=False)
+        pd.DataFrame([summary]).to_excel(writer, sheet_name="Summary", index=False)
+    return filename
+
+
+def write_with_streaming(data, summary, reports_dir):
+    from report_generator import ReportGenerator
+    return ReportGenerator(reports_dir).generate_excel_report(data, summary)
+
+
+def run_writer(writer, rows, seed):
+    """Generate data and time a single writer; prints a JSON result line"""
+    from data_processor import DataProcessor
+
+    processor = DataProcessor()
+    data = processor.calculate_metrics(processor.apply_schema(generate_sales(rows, seed=seed)), copy=False)
+    summary = processor.get_summary_stats(data)
+    write = write_with_pandas if writer == "pandas" else write_with_streaming
+
+    with tempfile.TemporaryDirectory() as reports_dir:
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            filename = write(data, summary, reports_dir)
+            seconds = time.perf_counter() - start
+        size_mb = os.path.getsize(filename) / 1024 ** 2
+
+    print(json.dumps({
+        "writer": writer,
+        "rows": rows,
+        "seconds": seconds,
+        "rows_per_sec": rows / seconds,
+        "peak_rss_growth_mb": rss.growth_mb,
+        "file_mb": size_mb,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--writers", nargs="+", choices=WRITERS, default=list(WRITERS))
+    parser.add_argument("--worker", choices=WRITERS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_writer(args.worker, args.rows, args.seed)
+        return
+
+    print(f"Writing {args.rows:,} synthetic rows per writer...\n")
+    print(f"{'writer':<12}{'seconds':>10}{'rows/sec':>12}{'peak RSS MB':>14}{'file MB':>10}")
+    for writer in args.writers:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_excel", "--worker", writer,
+             "--rows", str(args.rows), "--seed", str(args.seed)],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{writer:<12}{result['seconds']:>10.2f}{result['rows_per_sec']:>12,.0f}"
+              f"{result['peak_rss_growth_mb']:>14,.1f}{result['file_mb']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
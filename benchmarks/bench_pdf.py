@@ -0,0 +1,129 @@
+"""Compare the legacy PDF report code with the cached, batch-capable engine.
+
+Part one renders one PDF per city variant three ways: the previous
+generate_pdf_report code in a loop (fresh stylesheet, TableStyle and
+template per file), ReportGenerator.generate_pdf_batch, and one process per
+report, which is what rendering variants with the old entry point took.
+Part two appends raw rows to a report, first as one platypus Table holding
+every row, then as the streamed TransactionAppendix, with peak RSS growth.
+
+Usage: python -m benchmarks.bench_pdf --variants 50 --appendix-rows 20000
+"""
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+from data_processor import DataProcessor
+from report_generator import ReportGenerator
+from benchmarks.profiling import PeakRSS
+from benchmarks.synthetic_data import generate_sales
+
+SUMMARY = {"total_revenue": 306182.14, "total_profit": 135415.81, "avg_unit_price": 6.29,
+           "top_city": "Dhaka", "top_product": "Muffin", "total_transactions": 2002,
+           "lowest_margin_city": "Sylhet"}
+
+# Rendering a variant in a fresh interpreter, as a separate report run would
+SUBPROCESS_RENDER = (
+    "import sys; from report_generator import ReportGenerator; from benchmarks.bench_pdf import SUMMARY; "
+    "ReportGenerator(sys.argv[1]).generate_pdf_report(None, SUMMARY, variant=sys.argv[2])"
+)
+
+
+def legacy_pdf(filename, summary, rows=None):
+    """generate_pdf_report as it was, optionally with every row in one Table"""
+    doc = SimpleDocTemplate(filename, pagesize=letter)
+    styles = getSampleStyleSheet()
+    story = [
+        Paragraph("Daily Bakery Sales Report", styles["Title"]), Spacer(1, 12),
+        Paragraph(f"Date: {date.today():%Y-%m-%d}", styles["Normal"]), Spacer(1, 12),
+        Paragraph("Key Performance Indicators", styles["Heading2"]), Spacer(1, 6),
+    ]
+    table = Table([
+        ['Metric', 'Value'],
+        ['Total Revenue', f"${summary.get('total_revenue', 0):.2f}"],
+        ['Total Profit', f"${summary.get('total_profit', 0):.2f}"],
+        ['Average Unit Price', f"${summary.get('avg_unit_price', 0):.2f}"],
+        ['Top Performing City', summary.get('top_city', 'N/A')],
+        ['Most Profitable Product', summary.get('top_product', 'N/A')],
+        ['Total Transactions', str(summary.get('total_transactions', 0))]
+    ])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ]))
+    story += [table, Spacer(1, 12), Paragraph("Business Insights", styles["Heading2"]), Spacer(1, 6)]
+    for insight in (f"• {summary.get('top_city', 'N/A')} generates the highest revenue",
+                    f"• {summary.get('top_product', 'N/A')} is the most profitable product",
+                    f"• Consider promotions in {summary.get('lowest_margin_city', 'N/A')} to improve margins"):
+        story += [Paragraph(insight, styles["Normal"]), Spacer(1, 3)]
+    if rows is not None:
+        body = [list(rows.columns)] + [[str(value) for value in row]
+                                       for row in rows.itertuples(index=False, name=None)]
+        story += [PageBreak(), Table(body, repeatRows=1, style=[("FONTSIZE", (0, 0), (-1, -1), 7)])]
+    doc.build(story)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--variants", type=int, default=50)
+    parser.add_argument("--process-variants", type=int, default=5,
+                        help="variants rendered one process each (slow)")
+    parser.add_argument("--appendix-rows", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        generator = ReportGenerator(workdir)
+        names = [f"City {i}" for i in range(args.variants)]
+
+        start = time.perf_counter()
+        for name in names:
+            legacy_pdf(f"{workdir}/legacy_{name}.pdf", SUMMARY)
+        legacy = (time.perf_counter() - start) / args.variants
+
+        start = time.perf_counter()
+        generator.generate_pdf_batch({name: (None, SUMMARY, None) for name in names})
+        batch = (time.perf_counter() - start) / args.variants
+
+        start = time.perf_counter()
+        for name in names[:args.process_variants]:
+            subprocess.run([sys.executable, "-c", SUBPROCESS_RENDER, workdir, name],
+                           check=True, capture_output=True)
+        per_process = (time.perf_counter() - start) / args.process_variants
+
+        print(f"{'variants':<22}{'ms/report':>10}")
+        print(f"{'legacy, in a loop':<22}{legacy * 1000:>10.1f}")
+        print(f"{'generate_pdf_batch':<22}{batch * 1000:>10.1f}")
+        print(f"{'one process each':<22}{per_process * 1000:>10.1f}")
+
+        processor = DataProcessor()
+        rows = processor.calculate_metrics(processor.apply_schema(
+            generate_sales(args.appendix_rows, seed=args.seed), report=False))
+        print(f"\nAppendix of {args.appendix_rows:,} rows")
+        print(f"{'appendix':<22}{'seconds':>10}{'peak RSS MB':>13}")
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            generator.generate_pdf_report(rows, SUMMARY, appendix_rows=args.appendix_rows, variant="appendix")
+            seconds = time.perf_counter() - start
+        print(f"{'streamed':<22}{seconds:>10.2f}{rss.growth_mb:>13.1f}")
+        with PeakRSS() as rss:
+            start = time.perf_counter()
+            legacy_pdf(f"{workdir}/legacy_appendix.pdf", SUMMARY, rows)
+            seconds = time.perf_counter() - start
+        print(f"{'one table':<22}{seconds:>10.2f}{rss.growth_mb:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
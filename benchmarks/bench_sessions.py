@@ -0,0 +1,122 @@
+"""RSS of the dashboard's data with 1, 10 and 50 simulated sessions.
+
+Each session is one viewer's script run in progress while the database is
+unavailable. "cache_data" is the former `load_cached_data`: the full
+DataFrame behind st.cache_data, which stores it pickled and unpickles a copy
+for every caller (done here directly, as the caches need a running server).
+"shared store" is the DatasetStore behind st.cache_resource: sessions hold a
+reference to the one Arrow table and take their page from it. Each count
+runs in a fresh process; RSS growth is measured from after the imports.
+For the store, the backup is then replaced and the sessions move to the new
+version on their next run, showing memory while both versions are held and
+after the old one is released (Arrow's allocator may keep freed pages, so
+its allocated bytes are shown too).
+
+Usage: python -m benchmarks.bench_sessions --rows 1000000 --format feather
+"""
+import argparse
+import gc
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+from benchmarks.check_duckdb_parity import make_processor
+from benchmarks.profiling import current_rss_mb, PeakRSS
+from benchmarks.synthetic_data import generate_sales
+
+SESSION_COUNTS = (1, 10, 50)
+MODES = ("cache_data", "shared store")
+
+
+def run_sessions(mode, sessions, backup_path, workdir):
+    """Open `sessions` simulated sessions in this process and measure RSS"""
+    import pyarrow as pa
+    from dataset_store import DatasetStore
+
+    processor = make_processor(workdir, backup_path, "pandas")
+    result = {}
+    baseline = current_rss_mb()
+    held = []
+    with PeakRSS() as rss:
+        if mode == "cache_data":
+            cached = pickle.dumps(processor.calculate_metrics(processor.load_data_from_backup(), copy=False))
+        else:
+            store = DatasetStore(processor, refresh_seconds=0)
+            processor.dataset_store = store
+        for _ in range(sessions):
+            if mode == "cache_data":
+                data = pickle.loads(cached)
+                page = data.sort_values("revenue", ascending=False, kind="stable").iloc[:50]
+                held.append((data, page))
+            else:
+                page = processor.get_page(sort_by="revenue", ascending=False)
+                held.append((store.current(), page))
+    result["rss_mb"] = current_rss_mb() - baseline
+    result["peak_mb"] = rss.peak_mb - baseline
+
+    if mode == "shared store":
+        result["version_mb"] = held[0][0].nbytes / 1024 ** 2
+        # A refresh: the backup is rewritten and sessions pick up the new
+        # version on their next run, half of them first
+        os.utime(backup_path, ns=(0, os.stat(backup_path).st_mtime_ns + 1))
+        for index in range(sessions // 2 or 1):
+            held[index] = (store.current(), held[index][1])
+        result["versions"] = len({id(version) for version, _ in held})
+        result["during_swap_mb"] = current_rss_mb() - baseline
+        result["during_swap_arrow_mb"] = pa.total_allocated_bytes() / 1024 ** 2
+        held = [(store.current(), page) for _, page in held]
+        gc.collect()
+        pa.default_memory_pool().release_unused()
+        result["after_swap_mb"] = current_rss_mb() - baseline
+        result["after_swap_arrow_mb"] = pa.total_allocated_bytes() / 1024 ** 2
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--format", choices=["parquet", "feather"], default="parquet")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--worker", nargs=4, metavar=("MODE", "SESSIONS", "BACKUP", "WORKDIR"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, sessions, backup_path, workdir = args.worker
+        print(json.dumps(run_sessions(mode, int(sessions), backup_path, workdir)))
+        return
+
+    with tempfile.TemporaryDirectory() as workdir:
+        backup_path = os.path.join(workdir, f"sales.{args.format}")
+        writer = make_processor(workdir, backup_path, "pandas")
+        print(f"Generating {args.rows:,} synthetic rows ({args.format} backup)...")
+        writer.write_backup(writer.apply_schema(generate_sales(args.rows, seed=args.seed, days=365), report=False))
+        del writer
+
+        results = {}
+        for mode in MODES:
+            for sessions in SESSION_COUNTS:
+                worker = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.bench_sessions", "--worker",
+                     mode, str(sessions), backup_path, workdir],
+                    capture_output=True, text=True, check=True)
+                results[mode, sessions] = json.loads(worker.stdout.splitlines()[-1])
+
+    print(f"\nRSS growth MB (peak MB){'':<4}" + "".join(f"{n:>5} session{'s' if n > 1 else ' '}    "
+                                                     for n in SESSION_COUNTS))
+    for mode in MODES:
+        print(f"{mode:<28}" + "".join(f"{results[mode, n]['rss_mb']:>8.0f} ({results[mode, n]['peak_mb']:>4.0f})    "
+                                      for n in SESSION_COUNTS))
+
+    swap = results["shared store", SESSION_COUNTS[-1]]
+    print(f"\nShared Arrow table: {swap['version_mb']:.0f} MB. Refresh with {SESSION_COUNTS[-1]} sessions:")
+    print(f"  {swap['versions']} versions held: RSS growth {swap['during_swap_mb']:.0f} MB, "
+          f"Arrow allocated {swap['during_swap_arrow_mb']:.0f} MB")
+    print(f"  old version released: RSS growth {swap['after_swap_mb']:.0f} MB, "
+          f"Arrow allocated {swap['after_swap_arrow_mb']:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
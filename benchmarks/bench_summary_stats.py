@@ -0,0 +1,89 @@
+"""Compare the copy-free summary engine with the previous copy-based one.
+
+Usage: python -m benchmarks.bench_summary_stats --rows 10000000
+"""
+import argparse
+import time
+import tracemalloc
+import pandas as pd
+from data_processor import DataProcessor
+from benchmarks.synthetic_data import generate_sales
+
+
+def legacy_calculate_metrics(data):
+    """calculate_metrics as it was before the copy-free engine"""
+    data = data.copy()
+    data["revenue"] = data["units_sold"] * data["unit_price"]
+    data["profit"] = (data["unit_price"] - data["cost_per_unit"]) * data["units_sold"]
+    return data
+
+
+def legacy_summary_stats(data):
+    """get_summary_stats as it was before the copy-free engine"""
+    data_with_margin = data.copy()
+    data_with_margin['profit_margin'] = (data_with_margin['profit'] / data_with_margin['revenue']) * 100
+
+    summary = {
+        "total_revenue": data["revenue"].sum(),
+        "total_profit": data["profit"].sum(),
+        "avg_unit_price": data["unit_price"].mean(),
+        "top_city": data.groupby("city")["revenue"].sum().idxmax(),
+        "top_product": data.groupby("product")["profit"].sum().idxmax(),
+        "total_transactions": len(data)
+    }
+    summary["lowest_margin_city"] = data_with_margin.groupby("city")["profit_margin"].mean().idxmin()
+    return summary
+
+
+def measure(func, *args, repeat=1):
+    """Return (result, best wall time in seconds, peak traced memory in MB)"""
+    best = float("inf")
+    peak = 0
+    result = None
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return result, best, peak / 1024 ** 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows:,} synthetic rows...")
+    raw = generate_sales(args.rows, seed=args.seed)
+    processor = DataProcessor()
+
+    legacy_data, legacy_metrics_time, legacy_metrics_mem = measure(legacy_calculate_metrics, raw)
+    del legacy_data
+    data, metrics_time, metrics_mem = measure(
+        lambda frame: processor.calculate_metrics(frame.copy(deep=False), copy=False), raw
+    )
+
+    legacy, legacy_time, legacy_mem = measure(legacy_summary_stats, data, repeat=args.repeat)
+    summary, summary_time, summary_mem = measure(processor.get_summary_stats, data, repeat=args.repeat)
+
+    print(f"\n{'stage':<22}{'legacy s':>10}{'new s':>10}{'speedup':>9}{'legacy MB':>11}{'new MB':>9}")
+    for stage, old_t, new_t, old_m, new_m in [
+        ("calculate_metrics", legacy_metrics_time, metrics_time, legacy_metrics_mem, metrics_mem),
+        ("get_summary_stats", legacy_time, summary_time, legacy_mem, summary_mem),
+    ]:
+        print(f"{stage:<22}{old_t:>10.3f}{new_t:>10.3f}{old_t / new_t:>8.1f}x{old_m:>11.0f}{new_m:>9.0f}")
+
+    identical = pd.Series(legacy).equals(pd.Series(summary))
+    print(f"\nResults identical: {identical}")
+    if not identical:
+        for key in legacy:
+            if legacy[key] != summary.get(key):
+                print(f"  {key}: legacy={legacy[key]!r} new={summary.get(key)!r}")
+
+
+if __name__ == "__main__":
+    main()
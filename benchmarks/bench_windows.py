@@ -0,0 +1,63 @@
+"""Compare a full-history report summary with the date-windowed one.
+
+The full-history path loads every row of the backup and summarizes it, as
+the daily report did before sale dates. The windowed path loads the report
+day's rows and builds the daily/weekly/month-to-date summaries from per-day
+aggregates. Both read the local Parquet backup, so no database is needed.
+
+Usage: python -m benchmarks.bench_windows --rows 5000000 --days 365
+"""
+import argparse
+import os
+import tempfile
+from datetime import date, timedelta
+from data_processor import DataProcessor, SALES_SCHEMA
+from report_generator import ReportGenerator
+from benchmarks.bench_dtypes import best_time
+from benchmarks.synthetic_data import generate_sales
+
+
+def full_history(processor):
+    data = processor.calculate_metrics(processor.load_data_from_backup(), copy=False)
+    return processor.get_summary_stats(data)
+
+
+def windowed(processor, generator, report_date):
+    start, end = generator.windows_range(report_date)
+    data = processor.load_data_from_backup(list(SALES_SCHEMA) + [processor.date_column], start=start, end=end)
+    daily = processor.daily_aggregate(processor.calculate_metrics(data, copy=False))
+    windows = generator.summarize_windows(processor, report_date, daily)
+    day = processor.load_data_from_backup(start=report_date, end=report_date + timedelta(days=1))
+    return windows, processor.calculate_metrics(day, copy=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    report_date = date.today() - timedelta(days=1)
+    with tempfile.TemporaryDirectory() as workdir:
+        processor = DataProcessor()
+        processor.backup_path = os.path.join(workdir, "sales.parquet")
+        print(f"Generating {args.rows:,} synthetic rows over {args.days} days...")
+        processor.write_backup(processor.apply_schema(
+            generate_sales(args.rows, seed=args.seed, days=args.days, end_date=report_date), report=False))
+
+        generator = ReportGenerator(workdir)
+        windows, day = windowed(processor, generator, report_date)
+        full = best_time(lambda: full_history(processor), args.repeat)
+        window = best_time(lambda: windowed(processor, generator, report_date), args.repeat)
+
+        print(f"\n{'path':<14}{'seconds':>9}{'rows loaded':>13}")
+        print(f"{'full history':<14}{full:>9.2f}{args.rows:>13,}")
+        window_rows = max(w["summary"].get("total_transactions", 0) for w in windows)
+        print(f"{'windowed':<14}{window:>9.2f}{len(day):>13,}  "
+              f"(plus {window_rows:,} window rows reduced to per-day aggregates)")
+
+
+if __name__ == "__main__":
+    main()
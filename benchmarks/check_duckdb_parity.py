@@ -0,0 +1,129 @@
+"""Check that QUERY_BACKEND=duckdb answers the same as the pandas path.
+
+Writes a synthetic Parquet backup, points two processors at it with the
+database unreachable - one with the pandas engine, one with DuckDB - and
+compares the summary, the dashboard's cube slices for several filters, the
+aggregate cube, daily aggregates and sorted pages. Sums may differ in the
+last bits (DuckDB adds in parallel), so floats are compared with a relative
+tolerance. Exits with status 1 if anything differs.
+
+Usage: python -m benchmarks.check_duckdb_parity --rows 200000
+"""
+import argparse
+import math
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+import pandas as pd
+from data_processor import DataProcessor, SORT_COLUMNS
+from benchmarks.synthetic_data import generate_sales
+
+RELATIVE_TOLERANCE = 1e-9
+
+
+def make_processor(workdir, backup_path, engine):
+    processor = DataProcessor()
+    processor.backup_path = backup_path
+    processor.snapshot_dir = os.path.join(workdir, "snapshot")
+    # No database, so both engines work on the local backup
+    processor.db_config = {**processor.db_config, "host": os.path.join(workdir, "no-database")}
+    processor.rollup_backend = "off"
+    processor.query_backend = engine
+    return processor
+
+
+def same_value(a, b):
+    if isinstance(a, str) or isinstance(b, str):
+        return a == b
+    return math.isclose(float(a), float(b), rel_tol=RELATIVE_TOLERANCE, abs_tol=1e-9)
+
+
+def compare_dicts(expected, actual):
+    if set(expected) != set(actual):
+        return f"keys differ: {sorted(expected)} vs {sorted(actual)}"
+    for key in expected:
+        if not same_value(expected[key], actual[key]):
+            return f"{key}: {expected[key]!r} vs {actual[key]!r}"
+    return None
+
+
+def compare_frames(expected, actual, key=None):
+    if key is not None:
+        expected = expected.sort_values(key, ignore_index=True)
+        actual = actual.sort_values(key, ignore_index=True)
+    else:
+        expected, actual = expected.sort_index(), actual.sort_index()
+    try:
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False, check_index_type=False,
+                                      check_categorical=False, rtol=RELATIVE_TOLERANCE)
+    except AssertionError as e:
+        return str(e).splitlines()[0]
+    return None
+
+
+def compare_aggregates(expected, actual):
+    return (compare_dicts(expected["kpis"], actual["kpis"])
+            or compare_frames(expected["by_city"].astype({"city": str}), actual["by_city"], "city")
+            or compare_frames(expected["by_product"].astype({"product": str}), actual["by_product"], "product"))
+
+
+def string_index(frame):
+    """Categorical index levels as plain strings, so both engines' results line up"""
+    frame = frame.copy()
+    frame.index = pd.MultiIndex.from_frame(frame.index.to_frame().astype(
+        {name: str for name in ("city", "product") if name in frame.index.names}))
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    report_date = date.today() - timedelta(days=1)
+    failures = 0
+    with tempfile.TemporaryDirectory() as workdir:
+        backup_path = os.path.join(workdir, "sales.parquet")
+        pandas_path = make_processor(workdir, backup_path, "pandas")
+        duckdb_path = make_processor(workdir, backup_path, "duckdb")
+        pandas_path.write_backup(pandas_path.apply_schema(
+            generate_sales(args.rows, seed=args.seed, days=args.days, end_date=report_date), report=False))
+
+        week = (report_date - timedelta(days=6), report_date + timedelta(days=1))
+        checks = [
+            ("summary", lambda p: p.get_summary_stats(), compare_dicts),
+            ("summary, last 7 days", lambda p: p.get_summary_stats(None, *week), compare_dicts),
+            ("cube slice", lambda p: p.slice_cube(p.get_sales_cube()), compare_aggregates),
+            ("cube slice, 2 cities", lambda p: p.slice_cube(p.get_sales_cube(), ["Dhaka", "Sylhet"]),
+             compare_aggregates),
+            ("cube slice, 3 products",
+             lambda p: p.slice_cube(p.get_sales_cube(), None, ["Cake", "Bread", "Muffin"]), compare_aggregates),
+            ("cube slice, city and product", lambda p: p.slice_cube(p.get_sales_cube(), ["Khulna"], ["Donut"]),
+             compare_aggregates),
+            ("aggregate cube", lambda p: string_index(p.get_sales_cube()), compare_frames),
+            ("daily aggregates", lambda p: string_index(p.get_daily_aggregates(*week)), compare_frames),
+        ]
+        # Ties may come back in a different order, so only the sort key is compared
+        for column in SORT_COLUMNS:
+            for ascending in (True, False):
+                checks.append((
+                    f"page sorted by {column} {'asc' if ascending else 'desc'}",
+                    lambda p, column=column, ascending=ascending: p.get_page(
+                        ["Dhaka"], None, column, ascending, 100, 50)[[column]].astype(str),
+                    lambda expected, actual: None if expected.equals(actual) else "sort keys differ",
+                ))
+
+        for name, run, compare in checks:
+            difference = compare(run(pandas_path), run(duckdb_path))
+            failures += difference is not None
+            print(f"{'FAIL' if difference else 'ok':<6}{name}" + (f": {difference}" if difference else ""))
+
+    print(f"\n{len(checks) - failures}/{len(checks)} checks match")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Check EmailQueue delivery against a local aiosmtpd server.
+
+Starts an aiosmtpd server on 127.0.0.1 whose handler can refuse
+recipients with 4xx codes and reject messages with a 5xx code, then checks:
+a spooled message with an attachment is delivered intact and leaves the
+spool; a recipient refused with 4xx is retried with exponential backoff
+while the others get the message once; a message rejected with 5xx is moved
+to failed/; mail spooled while the server was down is replayed by a new
+queue on the same spool (a restart). Exits with status 1 if a check fails.
+
+Needs aiosmtpd (pip install aiosmtpd).
+
+Usage: python -m benchmarks.check_email_queue --backoff 0.2
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from email_queue import EmailQueue
+
+SENDER = "reports@bakery.test"
+REJECTED_SENDER = "rejected@bakery.test"
+
+
+class ScriptedHandler:
+    """aiosmtpd handler that records deliveries and fails on request"""
+
+    def __init__(self):
+        self.messages = []
+        self.rcpt_times = defaultdict(list)
+        # Address: number of RCPT attempts still answered with 451
+        self.temporary_failures = {}
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        self.rcpt_times[address].append(time.monotonic())
+        if self.temporary_failures.get(address, 0) > 0:
+            self.temporary_failures[address] -= 1
+            return "451 4.3.0 Try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        if envelope.mail_from == REJECTED_SENDER:
+            return "554 5.7.1 Message rejected"
+        self.messages.append(envelope)
+        return "250 Message accepted for delivery"
+
+    def received(self, address):
+        return [envelope for envelope in self.messages if address in envelope.rcpt_tos]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def email_config(port):
+    return {"smtp_server": "127.0.0.1", "smtp_port": port, "email_user": SENDER,
+            "email_password": "", "starttls": False, "timeout": 5}
+
+
+def make_message(subject, recipients, sender=SENDER):
+    msg = EmailMessage()
+    msg["From"] = sender
+    msg["To"] = ", ".join(recipients)
+    msg["Subject"] = subject
+    msg.set_content(f"{subject}\n.line starting with a dot\n")
+    return msg
+
+
+def wait_until(condition, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def spooled(spool_dir, directory=""):
+    try:
+        return sorted(os.listdir(os.path.join(spool_dir, directory)))
+    except FileNotFoundError:
+        return []
+
+
+def check_delivery(handler, port, workdir, args):
+    """Spool -> send: the message and its attachment arrive intact, the spool is emptied"""
+    spool_dir = os.path.join(workdir, "delivery")
+    attachment = os.path.join(workdir, "report.bin")
+    payload = os.urandom(args.attachment_kb * 1024)
+    with open(attachment, "wb") as f:
+        f.write(payload)
+
+    queue = EmailQueue(email_config(port), spool_dir, backoff=args.backoff)
+    try:
+        queue.enqueue(make_message("Delivery check", ["boss@bakery.test"]), ["boss@bakery.test"],
+                      [{"path": attachment, "maintype": "application", "subtype": "octet-stream",
+                        "filename": "report.bin"}])
+        if not queue.drain(timeout=args.timeout):
+            return f"spool not emptied: {spooled(spool_dir)}"
+    finally:
+        queue.stop(timeout=args.timeout)
+
+    received = handler.received("boss@bakery.test")
+    if len(received) != 1:
+        return f"{len(received)} messages received, expected 1"
+    message = message_from_bytes(received[0].content, policy=policy.default)
+    parts = {part.get_filename(): part for part in message.walk()}
+    if "report.bin" not in parts or parts["report.bin"].get_payload(decode=True) != payload:
+        return "attachment missing or corrupted"
+    if ".line starting with a dot" not in message.get_body().get_content():
+        return "dot-stuffed line not restored"
+    return None
+
+
+def check_retry(handler, port, workdir, args):
+    """4xx: the refused recipient is retried with backoff, the other gets the message once"""
+    spool_dir = os.path.join(workdir, "retry")
+    recipients = ["team@bakery.test", "busy@bakery.test"]
+    handler.temporary_failures["busy@bakery.test"] = 2
+
+    queue = EmailQueue(email_config(port), spool_dir, backoff=args.backoff)
+    try:
+        queue.enqueue(make_message("Retry check", recipients), recipients)
+        if not wait_until(lambda: handler.received("busy@bakery.test") and not spooled(spool_dir),
+                          args.timeout + 6 * args.backoff):
+            return f"not delivered after retries, spool: {spooled(spool_dir)}"
+    finally:
+        queue.stop(timeout=args.timeout)
+
+    if len(handler.received("team@bakery.test")) != 1:
+        return f"accepted recipient got {len(handler.received('team@bakery.test'))} copies, expected 1"
+    attempts = handler.rcpt_times["busy@bakery.test"]
+    if len(attempts) != 3:
+        return f"{len(attempts)} attempts for the refused recipient, expected 3"
+    # Retries after backoff, then 2 * backoff
+    gaps = [later - earlier for earlier, later in zip(attempts, attempts[1:])]
+    for gap, expected in zip(gaps, (args.backoff, 2 * args.backoff)):
+        if gap < expected * 0.9:
+            return f"retry after {gap:.2f}s, expected at least {expected:g}s"
+    return None
+
+
+def check_rejected(handler, port, workdir, args):
+    """5xx: the message is moved to failed/ with the server's reply, not retried"""
+    spool_dir = os.path.join(workdir, "rejected")
+    queue = EmailQueue(email_config(port), spool_dir, backoff=args.backoff)
+    try:
+        message_id = queue.enqueue(make_message("Rejection check", ["boss@bakery.test"], REJECTED_SENDER),
+                                   ["boss@bakery.test"])
+        if not wait_until(lambda: spooled(spool_dir, "failed"), args.timeout):
+            return "message not moved to failed/"
+    finally:
+        queue.stop(timeout=args.timeout)
+
+    if spooled(spool_dir, "failed") != [f"{message_id}.eml", f"{message_id}.json"]:
+        return f"failed/ holds {spooled(spool_dir, 'failed')}"
+    if spooled(spool_dir) != ["failed"]:
+        return f"spool still holds {spooled(spool_dir)}"
+    with open(os.path.join(spool_dir, "failed", f"{message_id}.json")) as f:
+        entry = json.load(f)
+    if not str(entry["last_error"]).startswith("554") or entry["attempts"] != 0:
+        return f"unexpected failed entry: attempts={entry['attempts']}, last_error={entry['last_error']!r}"
+    return None
+
+
+def check_replay(handler, port, workdir, args):
+    """Restart: mail spooled while the server was down is sent by a new queue on the same spool"""
+    spool_dir = os.path.join(workdir, "replay")
+    # Nothing listens on this port, so the first run can only spool and retry
+    down = EmailQueue(email_config(free_port()), spool_dir, backoff=args.backoff)
+    try:
+        message_id = down.enqueue(make_message("Replay check", ["owner@bakery.test"]), ["owner@bakery.test"])
+
+        def attempted():
+            try:
+                with open(os.path.join(spool_dir, f"{message_id}.json")) as f:
+                    return json.load(f)["attempts"] >= 1
+            except (FileNotFoundError, ValueError):
+                return False
+
+        if not wait_until(attempted, args.timeout):
+            return "no failed attempt recorded while the server was down"
+    finally:
+        down.stop(timeout=args.timeout)
+    if handler.received("owner@bakery.test"):
+        return "delivered while the server was down"
+
+    restarted = EmailQueue(email_config(port), spool_dir, backoff=args.backoff)
+    try:
+        restarted.start()
+        if not wait_until(lambda: handler.received("owner@bakery.test") and not spooled(spool_dir),
+                          args.timeout + args.backoff):
+            return f"spool not replayed: {spooled(spool_dir)}"
+    finally:
+        restarted.stop(timeout=args.timeout)
+    if len(handler.received("owner@bakery.test")) != 1:
+        return f"{len(handler.received('owner@bakery.test'))} copies after the restart, expected 1"
+    return None
+
+
+CHECKS = {
+    "spool -> send": check_delivery,
+    "4xx retry with backoff": check_retry,
+    "5xx moved to failed/": check_rejected,
+    "spool replayed on restart": check_replay,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backoff", type=float, default=0.2, help="first retry delay in seconds")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for each delivery")
+    parser.add_argument("--attachment-kb", type=int, default=512)
+    args = parser.parse_args()
+
+    # Imported here: a test server, not a dependency of the dashboard or report job
+    from aiosmtpd.controller import Controller
+
+    handler = ScriptedHandler()
+    port = free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    failures = 0
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for name, check in CHECKS.items():
+                try:
+                    difference = check(handler, port, workdir, args)
+                except Exception as e:
+                    difference = f"{type(e).__name__}: {e}"
+                failures += difference is not None
+                print(f"{'FAIL' if difference else 'ok':<6}{name}" + (f": {difference}" if difference else ""))
+    finally:
+        controller.stop()
+
+    print(f"\n{len(CHECKS) - failures}/{len(CHECKS)} checks pass")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Import-time budget check for the report job and the dashboard modules.
+
+Imports each target in fresh interpreters with `python -X importtime` and
+takes the median total import time. Fails (exit 1) when a target is over
+its budget or loads a library that must stay deferred until first use,
+e.g. reportlab in the dashboard or seaborn in the report job. The module
+check is exact; the budgets leave room for machine noise and can be scaled
+with --budget-scale on slower hosts.
+
+Usage: python -m benchmarks.check_import_time --repeat 5
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+# Import statement: (budget in ms, top-level packages it must not load)
+TARGETS = {
+    "import daily_report": (
+        1000, ("reportlab", "openpyxl", "matplotlib", "seaborn", "streamlit", "duckdb", "psycopg2", "schedule")),
+    "import data_processor, chart_renderer": (
+        800, ("reportlab", "openpyxl", "matplotlib", "seaborn", "duckdb", "psycopg2")),
+}
+
+
+def import_profile(statement):
+    """Total import time in ms and the top-level packages loaded by one fresh interpreter"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            capture_output=True, text=True, check=True)
+    total_us = 0
+    packages = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        packages.add(name.strip().split(".")[0])
+        # Entries without indentation are the ones the statement imported itself
+        if not name[1:].startswith(" "):
+            total_us += int(cumulative)
+    return total_us / 1000, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget-scale", type=float, default=1.0)
+    args = parser.parse_args()
+
+    failures = 0
+    print(f"{'target':<40}{'median ms':>10}{'budget ms':>11}")
+    for statement, (budget, deferred) in TARGETS.items():
+        # The first run warms the file cache and is discarded
+        import_profile(statement)
+        runs = [import_profile(statement) for _ in range(args.repeat)]
+        median = statistics.median(ms for ms, _ in runs)
+        budget *= args.budget_scale
+        loaded = sorted(set(deferred) & runs[0][1])
+
+        over = median > budget
+        failures += over + bool(loaded)
+        print(f"{statement:<40}{median:>10.0f}{budget:>11.0f}{'  OVER BUDGET' if over else ''}")
+        if loaded:
+            print(f"{'':<4}loads deferred libraries: {', '.join(loaded)}")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
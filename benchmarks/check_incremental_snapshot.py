@@ -0,0 +1,123 @@
+"""Check that incrementally fetched rows can be read back by date range.
+
+Feeds a processor from a stand-in database connection that answers COPY
+like PostgreSQL does, with sale_date as a 'YYYY-MM-DD' string. The first
+load writes the initial snapshot part; rows for two more days are then
+added and fetched by two incremental loads, each written as a new part.
+A date-range load over the new days must return exactly the new rows, and
+every part must store sale_date with the same type. Exits with status 1 if
+a check fails.
+
+Usage: python -m benchmarks.check_incremental_snapshot --rows 20000
+"""
+import argparse
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+import pyarrow.parquet as pq
+from data_processor import DataProcessor
+from benchmarks.synthetic_data import generate_sales
+
+
+class CopyCursor:
+    """Cursor answering COPY with the rows after the watermark parameter, if any"""
+
+    def __init__(self, table, watermark_column):
+        self.table = table
+        self.watermark_column = watermark_column
+        self.params = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def mogrify(self, query, params=None):
+        self.params = params
+        return query.encode()
+
+    def copy_expert(self, sql, buffer):
+        rows = self.table
+        if f"{self.watermark_column} >" in sql:
+            rows = rows[rows[self.watermark_column] > self.params[0]]
+        # PostgreSQL writes a date column as plain text
+        buffer.write(rows.to_csv(index=False, date_format="%Y-%m-%d").encode())
+
+
+class CopyConnection:
+    def __init__(self, database):
+        self.database = database
+
+    def cursor(self):
+        return CopyCursor(self.database.table, self.database.watermark_column)
+
+
+class StandInDatabase:
+    """The sales table behind a processor's connect_to_db/release_connection"""
+
+    def __init__(self, table, watermark_column):
+        self.table = table
+        self.watermark_column = watermark_column
+
+    def attach(self, processor):
+        processor.connect_to_db = lambda: CopyConnection(self)
+        processor.release_connection = lambda conn: None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--days", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    last_day = date.today() - timedelta(days=1)
+    sales = generate_sales(args.rows, seed=args.seed, days=args.days, end_date=last_day)
+    new_days = (last_day - timedelta(days=1), last_day + timedelta(days=1))
+    is_new = sales["sale_date"] >= str(new_days[0])
+
+    with tempfile.TemporaryDirectory() as workdir:
+        processor = DataProcessor()
+        processor.snapshot_dir = os.path.join(workdir, "snapshot")
+        processor.backup_path = os.path.join(workdir, "no-backup.parquet")
+        processor.rollup_backend = "off"
+        processor.query_backend = "pandas"
+        processor.extract_method = "copy"
+        processor.watermark_column = "id"
+        database = StandInDatabase(sales[~is_new], "id")
+        database.attach(processor)
+
+        checks = []
+        initial = processor.load_data_incremental()
+        checks.append(("initial load", None if len(initial) == (~is_new).sum()
+                       else f"{len(initial)} rows, expected {(~is_new).sum()}"))
+
+        # Two incremental loads, one new day each
+        for day in new_days[0], last_day:
+            database.table = sales[sales["sale_date"] <= str(day)]
+            processor.load_data_incremental()
+        state = processor.read_snapshot_state()
+        checks.append(("one part per load", None if len(state["parts"]) == 3 else f"parts: {state['parts']}"))
+
+        types = {str(pq.read_schema(os.path.join(processor.snapshot_dir, part)).field("sale_date").type)
+                 for part in state["parts"]}
+        checks.append(("sale_date type of every part", None if len(types) == 1 else f"types differ: {types}"))
+
+        loaded = processor.load_data(*new_days)
+        expected_ids = sorted(sales.loc[is_new, "id"])
+        loaded_ids = sorted(loaded["id"]) if "id" in loaded.columns else []
+        checks.append(("date-range load returns the new rows", None if loaded_ids == expected_ids
+                       else f"{len(loaded_ids)} rows, expected {len(expected_ids)}"))
+
+    failures = 0
+    for name, difference in checks:
+        failures += difference is not None
+        print(f"{'FAIL' if difference else 'ok':<6}{name}" + (f": {difference}" if difference else ""))
+    print(f"\n{len(checks) - failures}/{len(checks)} checks pass")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# profiling.py
+import os
+import resource
+import threading
+import time
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except OSError:
+        # No /proc (e.g. macOS): fall back to the lifetime peak
+        return peak_rss_mb()
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process over its lifetime in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    return peak / 1024 ** 2 if peak > 1 << 32 else peak / 1024
+
+
+class PeakRSS:
+    """Context manager sampling RSS in a thread to find the peak of a block"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.start_mb = self.peak_mb = current_rss_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+    @property
+    def growth_mb(self):
+        """Peak RSS above the level at the start of the block"""
+        return self.peak_mb - self.start_mb
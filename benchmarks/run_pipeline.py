@@ -0,0 +1,187 @@
+"""Time and memory-profile every stage of the sales pipeline on synthetic data.
+
+Stages: backup load, calculate_metrics, get_summary_stats, streaming summary,
+Excel and PDF generation, and the dashboard's cube build and filter slicing.
+Results are written as JSON (tagged with the git commit) so runs can be
+compared across commits with --compare.
+
+Usage:
+    python -m benchmarks.run_pipeline --rows 1000000 --output before.json
+    python -m benchmarks.run_pipeline --rows 1000000 --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from benchmarks.profiling import PeakRSS
+from benchmarks.synthetic_data import generate_sales, CITIES, PRODUCTS
+
+STAGES = ("load_backup", "calculate_metrics", "summary_stats", "summary_streaming",
+          "excel_report", "pdf_report", "dashboard_cube", "dashboard_filter")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Pipeline:
+    """Runs the pipeline stages in order, recording time and peak RSS"""
+
+    def __init__(self, args, workdir):
+        from data_processor import DataProcessor
+        from report_generator import ReportGenerator
+
+        self.args = args
+        self.processor = DataProcessor()
+        self.processor.backup_path = os.path.join(workdir, "sales.parquet")
+        self.reports = ReportGenerator(workdir)
+        self.results = {}
+        self.data = None
+        self.summary = None
+        self.cube = None
+
+    def measure(self, stage, func, rows):
+        """Run a stage `repeat` times, keeping the best time and the worst peak RSS"""
+        seconds = float("inf")
+        growth_mb = 0.0
+        for _ in range(self.args.repeat):
+            with PeakRSS() as rss:
+                start = time.perf_counter()
+                result = func()
+                seconds = min(seconds, time.perf_counter() - start)
+            growth_mb = max(growth_mb, rss.growth_mb)
+
+        self.results[stage] = {
+            "seconds": round(seconds, 4),
+            "rows": rows,
+            "rows_per_sec": round(rows / seconds) if seconds else None,
+            "peak_rss_growth_mb": round(growth_mb, 1),
+        }
+        print(f"  {stage:<20}{seconds:>9.3f}s{growth_mb:>10.1f} MB")
+        return result
+
+    def run(self, stages):
+        args = self.args
+        self.processor.write_backup(self.processor.apply_schema(
+            generate_sales(args.rows, args.cities, args.products, args.seed), report=False))
+        rows = args.rows
+
+        self.data = self.measure("load_backup", self.processor.load_data_from_backup, rows)
+        self.data = self.measure(
+            "calculate_metrics", lambda: self.processor.calculate_metrics(self.data, copy=False), rows)
+        self.summary = self.measure(
+            "summary_stats", lambda: self.processor.get_summary_stats(self.data), rows)
+
+        if "summary_streaming" in stages:
+            self.measure("summary_streaming", self.summary_streaming, rows)
+        if "excel_report" in stages:
+            excel_rows = min(rows, args.excel_rows)
+            self.measure("excel_report", lambda: self.reports.generate_excel_report(
+                self.data.iloc[:excel_rows], self.summary), excel_rows)
+        if "pdf_report" in stages:
+            self.measure("pdf_report", lambda: self.reports.generate_pdf_report(self.data, self.summary), rows)
+        if "dashboard_cube" in stages or "dashboard_filter" in stages:
+            self.cube = self.measure("dashboard_cube", lambda: self.processor.partial_aggregate(self.data), rows)
+        if "dashboard_filter" in stages:
+            self.measure("dashboard_filter", self.dashboard_filters, rows)
+
+        return self.results
+
+    def summary_streaming(self):
+        partial = None
+        for chunk in self.processor.stream_from_backup(self.processor.chunk_size):
+            chunk = self.processor.calculate_metrics(chunk, copy=False)
+            partial = self.processor.merge_partials([partial, self.processor.partial_aggregate(chunk)])
+        return self.processor.get_summary_from_partial(partial)
+
+    def dashboard_filters(self):
+        """Answer a batch of random sidebar filter selections from the cube"""
+        rng = random.Random(self.args.seed)
+        cities = list(self.cube.index.unique("city"))
+        products = list(self.cube.index.unique("product"))
+        for _ in range(self.args.filter_queries):
+            self.processor.slice_cube(
+                self.cube,
+                rng.sample(cities, rng.randint(1, len(cities))),
+                rng.sample(products, rng.randint(1, len(products))),
+            )
+
+
+def compare(results, baseline_path, threshold, min_seconds):
+    """Print per-stage time ratios against a baseline results file"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+
+    print(f"\nCompared with {baseline_path} (commit {baseline.get('commit')}):")
+    if baseline.get("params") != results["params"]:
+        print(f"  warning: baseline params differ: {baseline.get('params')}")
+    regressions = 0
+    for stage, current in results["stages"].items():
+        previous = baseline["stages"].get(stage)
+        if not previous:
+            continue
+        ratio = current["seconds"] / previous["seconds"] if previous["seconds"] else float("inf")
+        flag = ""
+        # Stages faster than min_seconds are too noisy to flag
+        if ratio > 1 + threshold and current["seconds"] >= min_seconds:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(f"  {stage:<20}{previous['seconds']:>9.3f}s ->{current['seconds']:>9.3f}s  ({ratio:.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--cities", type=int, default=len(CITIES))
+    parser.add_argument("--products", type=int, default=len(PRODUCTS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage; the best time is kept")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--excel-rows", type=int, default=100_000,
+                        help="cap on rows written to the Excel report (it dominates run time)")
+    parser.add_argument("--filter-queries", type=int, default=100)
+    parser.add_argument("--output", help="write results JSON to this file")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="relative slowdown above which a stage counts as a regression")
+    parser.add_argument("--min-seconds", type=float, default=0.05,
+                        help="stages faster than this are never flagged as regressions")
+    args = parser.parse_args()
+
+    print(f"Pipeline benchmark: {args.rows:,} rows, {args.cities} cities, {args.products} products")
+    with tempfile.TemporaryDirectory() as workdir:
+        stages = Pipeline(args, workdir).run(args.stages)
+
+    results = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "params": {"rows": args.rows, "cities": args.cities, "products": args.products,
+                   "seed": args.seed, "excel_rows": args.excel_rows, "repeat": args.repeat},
+        "stages": stages,
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    else:
+        print(json.dumps(results))
+
+    if args.compare and compare(results, args.compare, args.threshold, args.min_seconds):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# synthetic_data.py
+import argparse
+import numpy as np
+import pandas as pd
+
+CITIES = ["Dhaka", "Chittagong", "Sylhet", "Khulna", "Rajshahi",
+          "Barisal", "Rangpur", "Mymensingh", "Comilla", "Gazipur"]
+PRODUCTS = ["Croissant", "Muffin", "Cake", "Bread", "Donut",
+            "Bagel", "Cookie", "Brownie", "Scone", "Danish"]
+
+
+def make_names(base_names, count, prefix):
+    """Return `count` names, extending the base list with numbered names"""
+    names = list(base_names[:count])
+    names += [f"{prefix} {i}" for i in range(len(names) + 1, count + 1)]
+    return names
+
+
+def generate_sales(n_rows, n_cities=len(CITIES), n_products=len(PRODUCTS), seed=42, days=0, end_date=None):
+    """Generate a reproducible sales table matching the `sales` schema
+
+    With `days`, rows get a sale_date spread evenly over the `days` days
+    ending on end_date (default yesterday), in date order like a live table.
+    """
+    rng = np.random.default_rng(seed)
+    cities = np.array(make_names(CITIES, n_cities, "City"), dtype=object)
+    products = np.array(make_names(PRODUCTS, n_products, "Product"), dtype=object)
+
+    # Each product has a list price and a cost ratio; rows jitter around them
+    base_price = rng.uniform(1.0, 10.0, n_products).round(2)
+    cost_ratio = rng.uniform(0.4, 0.7, n_products)
+
+    product_idx = rng.integers(0, n_products, n_rows)
+    unit_price = (base_price[product_idx] * rng.uniform(0.9, 1.1, n_rows)).round(2)
+    cost_per_unit = (base_price[product_idx] * cost_ratio[product_idx]).round(2)
+
+    data = pd.DataFrame({
+        "id": np.arange(1, n_rows + 1),
+        "city": cities[rng.integers(0, n_cities, n_rows)],
+        "product": products[product_idx],
+        "units_sold": rng.integers(1, 50, n_rows),
+        "unit_price": unit_price,
+        "cost_per_unit": cost_per_unit,
+    })
+    if days:
+        end_date = pd.Timestamp(end_date) if end_date else pd.Timestamp.today().normalize() - pd.Timedelta(days=1)
+        day_offsets = np.arange(n_rows) * days // max(n_rows, 1)
+        data.insert(1, "sale_date", end_date - pd.to_timedelta(days - 1 - day_offsets, unit="D"))
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic sales CSV")
+    parser.add_argument("output", help="CSV file to write")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--cities", type=int, default=len(CITIES))
+    parser.add_argument("--products", type=int, default=len(PRODUCTS))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=0, help="add a sale_date spread over this many days")
+    args = parser.parse_args()
+
+    data = generate_sales(args.rows, args.cities, args.products, args.seed, args.days)
+    data.to_csv(args.output, index=False)
+    print(f"Wrote {len(data):,} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# chart_renderer.py
+import io
+import threading
+from collections import OrderedDict
+import pandas as pd
+from config import CHART_CACHE_SIZE
+from instrumentation import instrumented
+
+
+class ChartRenderer:
+    """Renders dashboard charts to PNG bytes, with an LRU cache shared by all sessions
+
+    Figures are created without pyplot, so they are never registered in
+    pyplot's global figure list, and are cleared as soon as they are saved.
+    """
+
+    def __init__(self, max_entries=CHART_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def data_version(self, data):
+        """Content hash identifying a version of the (small) aggregate data"""
+        return int(pd.util.hash_pandas_object(data, index=True).sum())
+
+    def get(self, key):
+        with self.lock:
+            png = self.cache.get(key)
+            if png is None:
+                self.misses += 1
+            else:
+                self.cache.move_to_end(key)
+                self.hits += 1
+            return png
+
+    def put(self, key, png):
+        with self.lock:
+            self.cache[key] = png
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    @instrumented()
+    def render_bar_chart(self, data, x, y, palette, xlabel, ylabel):
+        """Draw a bar chart of pre-aggregated points and return it as PNG bytes"""
+        # Imported on the first render: cached charts and the native chart
+        # backend never need matplotlib or seaborn
+        import seaborn as sns
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        fig = Figure(figsize=(10, 6))
+        FigureCanvasAgg(fig)
+        try:
+            ax = fig.subplots()
+            ax.bar(data[x].astype(str), data[y], color=sns.color_palette(palette, len(data)))
+            ax.set_ylabel(ylabel)
+            ax.set_xlabel(xlabel)
+            fig.tight_layout()
+
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format="png")
+            return buffer.getvalue()
+        finally:
+            fig.clear()
+
+    def bar_chart(self, key, data, x, y, palette, xlabel, ylabel):
+        """Cached bar chart PNG; `key` must identify the data version and filters"""
+        png = self.get(key)
+        if png is None:
+            png = self.render_bar_chart(data, x, y, palette, xlabel, ylabel)
+            self.put(key, png)
+        return png
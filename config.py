@@ -10,8 +10,20 @@ DB_CONFIG = {
     'port': os.getenv('DB_PORT', '5432'),
     'database': os.getenv('DB_NAME', 'bakery_sales'),
     'user': os.getenv('DB_USER', 'your_username'),
-    'password': os.getenv('DB_PASSWORD', 'your_db_pass')
+    'password': os.getenv('DB_PASSWORD', 'your_db_pass'),
+    'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+    # Connection pool settings (not passed to psycopg2.connect)
+    'pool_min_size': int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+    'pool_max_size': int(os.getenv('DB_POOL_MAX_SIZE', 5)),
+    'retry_cooldown': int(os.getenv('DB_RETRY_COOLDOWN', 30))
 }
+SALES_TABLE = os.getenv('SALES_TABLE', 'sales')
+
+# How raw rows are extracted: 'copy' (COPY ... TO STDOUT, parsed as CSV) or
+# 'query' (pd.read_sql_query over a regular cursor)
+DB_EXTRACT_METHOD = os.getenv('DB_EXTRACT_METHOD', 'copy')
+# COPY output is kept in memory up to this many bytes, then spooled to disk
+COPY_SPOOL_SIZE = int(os.getenv('COPY_SPOOL_SIZE', 64 * 1024 * 1024))
 
 # Email Configuration
 EMAIL_CONFIG = {
@@ -19,7 +31,49 @@ EMAIL_CONFIG = {
     'smtp_port': int(os.getenv('SMTP_PORT', 587)),
     'email_user': os.getenv('EMAIL_USER', 'your_email@gmail.com'),
     'email_password': os.getenv('EMAIL_PASSWORD', 'your_app_password'),
-    'to_email': os.getenv('TO_EMAIL', 'to_your_boss@gmail.com')
+    # Comma-separated; every address receives the report
+    'to_email': os.getenv('TO_EMAIL', 'to_your_boss@gmail.com'),
+    'starttls': os.getenv('SMTP_STARTTLS', 'true').lower() == 'true',
+    'timeout': int(os.getenv('SMTP_TIMEOUT', 30))
+}
+
+# Outgoing mail is spooled to disk and delivered by a background worker that
+# keeps one SMTP session open and retries with exponential backoff
+EMAIL_SPOOL_DIR = os.getenv('EMAIL_SPOOL_DIR', os.path.join('data', 'email_spool'))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 8))
+EMAIL_RETRY_BACKOFF = float(os.getenv('EMAIL_RETRY_BACKOFF', 30))
+EMAIL_RETRY_BACKOFF_MAX = float(os.getenv('EMAIL_RETRY_BACKOFF_MAX', 3600))
+# Seconds an unused SMTP session is kept open
+SMTP_IDLE_TIMEOUT = float(os.getenv('SMTP_IDLE_TIMEOUT', 60))
+
+# Attachments above EMAIL_COMPRESS_MIN_BYTES are zipped (unless already
+# compressed, like .xlsx); a report still above EMAIL_ATTACHMENT_MAX_BYTES is
+# replaced by its summary-only variant
+EMAIL_COMPRESS_MIN_BYTES = int(os.getenv('EMAIL_COMPRESS_MIN_BYTES', 1024 * 1024))
+EMAIL_ATTACHMENT_MAX_BYTES = int(os.getenv('EMAIL_ATTACHMENT_MAX_BYTES', 10 * 1024 * 1024))
+
+# Report Rendering
+REPORT_FORMATS = [fmt.strip() for fmt in os.getenv('REPORT_FORMATS', 'excel,pdf').split(',')]
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', os.cpu_count() or 1))
+# Raw rows appended to the PDF report as a paginated table (0 = no appendix)
+PDF_APPENDIX_MAX_ROWS = int(os.getenv('PDF_APPENDIX_MAX_ROWS', 0))
+
+# Reports are fingerprinted by their input data and reused (and not emailed
+# again) while the fingerprint is unchanged. Old report files are evicted by
+# age and by total size (0 = no limit)
+REPORT_CACHE = os.getenv('REPORT_CACHE', 'true').lower() == 'true'
+REPORT_RETENTION_DAYS = float(os.getenv('REPORT_RETENTION_DAYS', 30))
+REPORT_MAX_BYTES = int(os.getenv('REPORT_MAX_BYTES', 1024 * 1024 * 1024))
+
+# Per-city reports: when enabled, the scheduler also renders one report per
+# city from a single load of the data. Recipients are given per city, e.g.
+# "Dhaka=dhaka@example.com,ops@example.com;Sylhet=sylhet@example.com";
+# reports of cities without an entry are kept on the report server only
+CITY_REPORTS = os.getenv('CITY_REPORTS', 'false').lower() == 'true'
+CITY_REPORT_RECIPIENTS = {
+    city.strip(): recipients
+    for city, _, recipients in (entry.partition('=') for entry in os.getenv('CITY_REPORT_RECIPIENTS', '').split(';'))
+    if city.strip() and recipients.strip()
 }
 
 # File Paths
@@ -27,6 +81,73 @@ REPORTS_DIR = 'reports'
 LOGS_DIR = 'logs'
 CSV_BACKUP_PATH = 'bakery_sales.csv'
 
-# Create necessary directories
-os.makedirs(REPORTS_DIR, exist_ok=True)
-os.makedirs(LOGS_DIR, exist_ok=True)
\ No newline at end of file
+# Local backup used when the database is unavailable. It is stored columnar:
+# Parquet, or Arrow IPC (Feather) for a '.feather' / '.arrow' path. The CSV
+# above is only an import/export format and seeds the backup if it is missing
+BACKUP_PATH = os.getenv('BACKUP_PATH', 'bakery_sales.parquet')
+BACKUP_MEMORY_MAP = os.getenv('BACKUP_MEMORY_MAP', 'true').lower() == 'true'
+# Smaller row groups let city/product filters skip more of a Parquet backup
+BACKUP_ROW_GROUP_SIZE = int(os.getenv('BACKUP_ROW_GROUP_SIZE', 100000))
+
+# Incremental snapshot of the sales table (Parquet part files + watermark)
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', os.path.join('data', 'sales_snapshot'))
+WATERMARK_COLUMN = os.getenv('WATERMARK_COLUMN', 'id')
+SNAPSHOT_MAX_PARTS = int(os.getenv('SNAPSHOT_MAX_PARTS', 20))
+
+# Daily rollup of the sales table (per day, city and product), refreshed
+# incrementally and read by the dashboard and reports: 'auto' keeps it in
+# PostgreSQL, or in a local SQLite file when the database is unreachable;
+# 'postgres', 'sqlite' or 'off' force one or disable it
+ROLLUP_BACKEND = os.getenv('ROLLUP_BACKEND', 'auto')
+ROLLUP_TABLE = os.getenv('ROLLUP_TABLE', 'sales_daily_rollup')
+ROLLUP_DB_PATH = os.getenv('ROLLUP_DB_PATH', os.path.join('data', 'sales_rollup.sqlite'))
+# The writers (report job, snapshot appends, `python rollup.py refresh`) fold
+# new sales in; reads only do so when this process has not refreshed the
+# rollup for this many seconds
+ROLLUP_REFRESH_SECONDS = int(os.getenv('ROLLUP_REFRESH_SECONDS', 300))
+
+# Engine for aggregating the local snapshot / backup when PostgreSQL cannot
+# answer: 'pandas' loads the rows into a DataFrame, 'duckdb' runs the same SQL
+# queries in embedded DuckDB directly on the files (threads: 0 = all cores)
+QUERY_BACKEND = os.getenv('QUERY_BACKEND', 'pandas')
+DUCKDB_THREADS = int(os.getenv('DUCKDB_THREADS', 0))
+
+# The dashboard keeps one read-only Arrow copy of the local data per process,
+# shared by every session, for when it falls back from the database. The files
+# are checked for changes (a new version) at most this often, in seconds
+DATASET_STORE = os.getenv('DATASET_STORE', 'true').lower() == 'true'
+DATASET_REFRESH_SECONDS = int(os.getenv('DATASET_REFRESH_SECONDS', 60))
+
+# Sale date column for date-range loading and the report windows. Data without
+# it (like the bundled sample) is reported on as a whole
+DATE_COLUMN = os.getenv('DATE_COLUMN', 'sale_date')
+# Windows ending on the report date: 'daily', 'weekly' (last 7 days) and 'mtd'
+REPORT_WINDOWS = [window.strip() for window in os.getenv('REPORT_WINDOWS', 'daily,weekly,mtd').split(',')]
+# The daily run reports on the day this many days back (1 = yesterday, the
+# last complete day)
+REPORT_LAG_DAYS = int(os.getenv('REPORT_LAG_DAYS', 1))
+
+# Streaming mode processes the data in chunks instead of loading it all at once
+STREAMING_MODE = os.getenv('STREAMING_MODE', 'false').lower() == 'true'
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', 100000))
+
+# Storage dtype for unit_price / cost_per_unit. float32 halves their memory but
+# only keeps ~7 significant digits, so large revenue totals lose cents
+MONEY_DTYPE = os.getenv('MONEY_DTYPE', 'float64')
+
+# Dashboard charts: 'matplotlib' serves cached PNG renders, 'native' sends the
+# aggregated points to Streamlit's built-in charts instead
+CHART_BACKEND = os.getenv('CHART_BACKEND', 'matplotlib')
+# Rendered charts kept in the process-wide LRU cache (a few dozen KB each)
+CHART_CACHE_SIZE = int(os.getenv('CHART_CACHE_SIZE', 256))
+
+# Stage instrumentation, written as JSON lines
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+METRICS_LOG_PATH = os.path.join(LOGS_DIR, 'metrics.jsonl')
+# Past this size the log is moved to metrics.jsonl.1 (replacing the older one)
+METRICS_LOG_MAX_BYTES = int(os.getenv('METRICS_LOG_MAX_BYTES', 10 * 1024 * 1024))
+# Optional profiling: comma-separated 'cprofile' and/or 'tracemalloc'
+PROFILE_MODE = {mode.strip() for mode in os.getenv('PROFILE_MODE', '').lower().split(',') if mode.strip()}
+PROFILES_DIR = os.path.join(LOGS_DIR, 'profiles')
+
+# Directories are created by the code that writes to them, not on import
\ No newline at end of file
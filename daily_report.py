@@ -1,20 +1,194 @@
-import schedule
 import time
-import subprocess
 import logging
 import os
-from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
 from data_processor import DataProcessor
 from report_generator import ReportGenerator
 from email_sender import EmailSender
+from email_queue import get_email_queue
+from report_cache import ReportCache
+from config import (STREAMING_MODE, REPORT_FORMATS, REPORT_WORKERS, EMAIL_CONFIG, REPORT_LAG_DAYS,
+                    CITY_REPORTS, CITY_REPORT_RECIPIENTS, LOGS_DIR)
+from instrumentation import instrumented
 
 # Configure logging
+os.makedirs(LOGS_DIR, exist_ok=True)
 logging.basicConfig(
-    filename="logs/report_log.txt",
+    filename=os.path.join(LOGS_DIR, "report_log.txt"),
     level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s"
 )
 
+def log_stage(stage, seconds):
+    """Record how long a pipeline stage took"""
+    logging.info(f"Stage '{stage}' took {seconds:.2f}s")
+
+
+def render_report(report_format, data, summary, windows=None, date_range=(None, None), report_date=None):
+    """Render one report format; runs in a worker process"""
+    start = time.perf_counter()
+    generator = ReportGenerator()
+    if data is None and generator.needs_rows(report_format):
+        # Streaming mode: chunk iterators cannot be sent to a worker, so
+        # the worker streams its own copy of the data
+        data = DataProcessor().iter_metric_chunks(start=date_range[0], end=date_range[1])
+
+    filename = generator.render(report_format, data, summary, windows, report_date=report_date)
+    return filename, time.perf_counter() - start
+
+
+def cached_reports(report_cache, fingerprint, variant=None, report_date=None):
+    """{format: filename} of the report date's reports that can be reused for this fingerprint"""
+    generator = ReportGenerator()
+    cached = {}
+    for fmt in REPORT_FORMATS:
+        filename = report_cache.lookup(generator.report_filename(fmt, variant, report_date), fingerprint)
+        if filename:
+            logging.info(f"Data unchanged, reusing {filename}")
+            cached[fmt] = filename
+    return cached
+
+
+def render_reports(data, summary, windows=None, date_range=(None, None), fingerprint=None, report_date=None):
+    """Render all report formats concurrently, returning {format: filename}
+
+    Formats whose report for `fingerprint` is already on disk are reused.
+    Files are named after `report_date`, the day they cover (default today).
+    Only formats that render the raw rows are sent them, so a worker for
+    any other format is not handed a pickled copy of the report day.
+    """
+    report_cache = ReportCache()
+    cached = cached_reports(report_cache, fingerprint, report_date=report_date)
+    formats = [fmt for fmt in REPORT_FORMATS if fmt not in cached]
+    workers = min(REPORT_WORKERS, len(formats))
+    generator = ReportGenerator()
+    args = {fmt: (data if generator.needs_rows(fmt) else None, summary, windows, date_range, report_date)
+            for fmt in formats}
+
+    if workers <= 1:
+        results = {fmt: render_report(fmt, *args[fmt]) for fmt in formats}
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {fmt: pool.submit(render_report, fmt, *args[fmt]) for fmt in formats}
+            results = {fmt: future.result() for fmt, future in futures.items()}
+
+    for fmt, (filename, seconds) in results.items():
+        log_stage(f"render_{fmt}", seconds)
+        report_cache.store(filename, fingerprint, format=fmt)
+
+    reports = {**cached, **{fmt: filename for fmt, (filename, _) in results.items()}}
+    return {fmt: reports[fmt] for fmt in REPORT_FORMATS}
+
+
+def render_variant_batch(tasks, report_date=None):
+    """Render the formats of several variants (e.g. cities); runs in a worker process
+
+    `tasks` maps a variant name to (data, summary, windows, formats). The
+    batch's PDFs go through ReportGenerator.generate_pdf_batch, so they
+    share one set of PDF styles and page templates.
+    """
+    start = time.perf_counter()
+    generator = ReportGenerator()
+    pdfs = generator.generate_pdf_batch(
+        {name: (data, summary, windows) for name, (data, summary, windows, formats) in tasks.items()
+         if "pdf" in formats},
+        report_date=report_date)
+    filenames = {
+        name: {fmt: pdfs[name] if fmt == "pdf" else
+               generator.render(fmt, data, summary, windows, variant=name, report_date=report_date)
+               for fmt in formats}
+        for name, (data, summary, windows, formats) in tasks.items()
+    }
+    return filenames, time.perf_counter() - start
+
+
+def render_variants(variants, fingerprints=None, report_date=None):
+    """Render {name: (data, summary, windows)} in parallel, returning {name: {format: filename}}
+
+    The variants are split into one batch per worker, so each variant's rows
+    are sent to a worker once for all formats (and not at all when none of
+    its missing formats renders them). Reports already on disk for the
+    variant's entry in `fingerprints` are reused. Files are named after
+    `report_date` (default today).
+    """
+    report_cache = ReportCache()
+    fingerprints = fingerprints or {}
+    generator = ReportGenerator()
+    cached = {name: cached_reports(report_cache, fingerprints.get(name), name, report_date) for name in variants}
+    missing = {name: [fmt for fmt in REPORT_FORMATS if fmt not in cached[name]] for name in variants}
+    tasks = [(name, (data if any(generator.needs_rows(fmt) for fmt in missing[name]) else None,
+                     summary, windows, missing[name]))
+             for name, (data, summary, windows) in variants.items() if missing[name]]
+    workers = max(min(REPORT_WORKERS, len(tasks)), 1)
+    batches = [dict(tasks[index::workers]) for index in range(workers)] if tasks else []
+
+    if workers == 1:
+        results = [render_variant_batch(batch, report_date) for batch in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_variant_batch, batch, report_date) for batch in batches]
+            results = [future.result() for future in futures]
+
+    reports = {name: dict(cached[name]) for name in variants}
+    for index, (filenames, seconds) in enumerate(results):
+        log_stage(f"render_variants_batch_{index}", seconds)
+        for name, files in filenames.items():
+            for fmt, filename in files.items():
+                report_cache.store(filename, fingerprints.get(name), format=fmt, variant=name)
+            reports[name].update(files)
+
+    return {name: {fmt: files[fmt] for fmt in REPORT_FORMATS} for name, files in reports.items()}
+
+
+def city_variants(data_processor, data, report_date=None, daily=None):
+    """Per-city (rows, summary, windows) from one pass over the loaded rows
+
+    The rows and their partial aggregate are each split by city in a single
+    groupby. With a report date, each city's windows come from one read of
+    the daily aggregates (or `daily`, covering the windows), split the same
+    way.
+    """
+    partitions, summaries, windows = {}, {}, {}
+    if not data.empty:
+        partitions = data_processor.partition(data, "city")
+        partial = data_processor.partial_aggregate(data)
+        summaries = {city: data_processor.get_summary_from_partial(part)
+                     for city, part in data_processor.partition(partial, "city").items()}
+
+    if report_date is not None:
+        generator = ReportGenerator()
+        if daily is None:
+            daily = data_processor.get_daily_aggregates(*generator.windows_range(report_date))
+        if daily is not None:
+            windows = {city: generator.summarize_windows(data_processor, report_date, part)
+                       for city, part in data_processor.partition(daily, "city").items()}
+
+    # Cities with window history but no sales on the report day still get a report
+    empty = data.iloc[:0]
+    return {
+        city: (partitions.get(city, empty), summaries.get(city, {}), windows.get(city))
+        for city in sorted(set(partitions) | set(windows))
+    }
+
+
+def summarize_windows(data_processor, report_date):
+    """Report window summaries and the report day's summary from per-day aggregates
+
+    Returns (None, None) when the data has no sale dates or the aggregates
+    cannot be loaded.
+    """
+    generator = ReportGenerator()
+    daily = data_processor.get_daily_aggregates(*generator.windows_range(report_date))
+    if daily is None:
+        return None, None
+
+    windows = generator.summarize_windows(data_processor, report_date, daily)
+    day = data_processor.window_partial(daily, report_date, report_date + timedelta(days=1))
+    return windows, data_processor.get_summary_from_partial(day)
+
+
+@instrumented("daily_report")
 def run_daily_report():
     """Main function to run the daily report pipeline"""
     logging.info("Daily report execution started")
@@ -22,29 +196,62 @@ def run_daily_report():
     try:
         # Initialize components
         data_processor = DataProcessor()
-        report_generator = ReportGenerator()
         email_sender = EmailSender()
 
         # Load and process data
-        data = data_processor.load_data()
-        if data.empty:
+        start = time.perf_counter()
+        windows, summary = None, None
+        report_date, date_range = None, (None, None)
+        if data_processor.has_date_column():
+            # Only the report day's rows are loaded; its summary and the
+            # weekly / month-to-date windows come from per-day aggregates
+            report_date = date.today() - timedelta(days=REPORT_LAG_DAYS)
+            date_range = (report_date, report_date + timedelta(days=1))
+            data_processor.refresh_rollup()
+            windows, summary = summarize_windows(data_processor, report_date)
+            logging.info(f"Reporting on {report_date}")
+        else:
+            logging.warning("No sale date column, reporting on the full history")
+
+        if STREAMING_MODE:
+            # Summary from per-chunk partial aggregates; the raw data sheet is
+            # written from a second pass over the chunks
+            if summary is None:
+                summary = data_processor.get_summary_stats_streaming(start=date_range[0], end=date_range[1])
+            data = None
+        else:
+            data = data_processor.calculate_metrics(data_processor.load_data(*date_range), copy=False)
+            if summary is None:
+                summary = data_processor.get_summary_stats(data)
+
+        if not summary and not any(window["summary"] for window in windows or []):
             logging.error("No data available for report generation")
             return
-
-        data = data_processor.calculate_metrics(data)
-        summary = data_processor.get_summary_stats(data)
+        log_stage("load_and_summarize", time.perf_counter() - start)
 
         print("Summary Statistics:")
         for key, value in summary.items():
             print(f"  {key}: {value}")
 
-        # Generate reports
-        excel_file = report_generator.generate_excel_report(data, summary)
-        pdf_file = report_generator.generate_pdf_report(data, summary)
+        # Generate reports, reusing the report date's if the data is unchanged
+        start = time.perf_counter()
+        report_cache = ReportCache()
+        fingerprint = report_cache.fingerprint(summary, windows, data, date_range)
+        reports = render_reports(data, summary, windows, date_range, fingerprint, report_date)
+        log_stage("render_all", time.perf_counter() - start)
+        excel_file = reports.get("excel")
+        pdf_file = reports.get("pdf")
 
-        # Send email with attachments
-        if excel_file or pdf_file:
-            email_sender.send_report(excel_file, pdf_file)
+        # Queue email with attachments; delivery happens in the background
+        if report_cache.was_sent(reports.values(), email_sender.recipients):
+            logging.info("Reports unchanged since they were last sent, not emailing them again")
+        elif excel_file or pdf_file:
+            start = time.perf_counter()
+            if email_sender.send_report(excel_file, pdf_file, summary=summary, report_date=report_date):
+                report_cache.mark_sent(reports.values(), email_sender.recipients)
+            log_stage("email", time.perf_counter() - start)
+
+        report_cache.evict(keep=reports.values())
 
         logging.info("Daily report completed successfully")
 
@@ -53,19 +260,86 @@ def run_daily_report():
         print(f"Error: {e}")
 
 
+@instrumented("city_reports")
+def run_city_reports():
+    """Render and send one report per city from a single load of the data
+
+    The report day's rows (the full history without a date column) are
+    loaded once, in memory even in STREAMING_MODE, and split by city; see
+    city_variants. The cities are rendered in one batch per worker process
+    (see render_variants) and each city's reports are queued to its
+    CITY_REPORT_RECIPIENTS entry.
+    """
+    logging.info("City reports started")
+
+    try:
+        data_processor = DataProcessor()
+        email_sender = EmailSender()
+
+        start = time.perf_counter()
+        report_date, date_range = None, (None, None)
+        if data_processor.has_date_column():
+            report_date = date.today() - timedelta(days=REPORT_LAG_DAYS)
+            date_range = (report_date, report_date + timedelta(days=1))
+            data_processor.refresh_rollup()
+
+        data = data_processor.calculate_metrics(data_processor.load_data(*date_range), copy=False)
+        variants = city_variants(data_processor, data, report_date)
+        if not variants:
+            logging.error("No data available for city reports")
+            return
+        log_stage("city_load_and_partition", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        report_cache = ReportCache()
+        fingerprints = {city: report_cache.fingerprint(summary, windows, rows, date_range, variant=city)
+                        for city, (rows, summary, windows) in variants.items()}
+        reports = render_variants(variants, fingerprints, report_date)
+        log_stage("city_render_all", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for city, files in reports.items():
+            recipients = email_sender.parse_recipients(CITY_REPORT_RECIPIENTS.get(city, ""))
+            if not recipients:
+                logging.info(f"No recipients configured for {city}; its report is kept on the server")
+            elif report_cache.was_sent(files.values(), recipients):
+                logging.info(f"{city} reports unchanged since they were last sent, not emailing them again")
+            elif email_sender.send_report(files.get("excel"), files.get("pdf"), recipients=recipients,
+                                          summary=variants[city][1], variant=city, report_date=report_date):
+                report_cache.mark_sent(files.values(), recipients)
+        log_stage("city_email", time.perf_counter() - start)
+
+        report_cache.evict(keep=[filename for files in reports.values() for filename in files.values()])
+
+        logging.info(f"City reports completed for {len(reports)} cities")
+
+    except Exception as e:
+        logging.error(f"Error in city reports: {e}")
+        print(f"Error: {e}")
+
+
 def main():
     """Main function with scheduler"""
+    import schedule
     print("Bakery Analytics System - Daily Report Generator")
 
     # Create necessary directories
     os.makedirs("reports", exist_ok=True)
     os.makedirs("logs", exist_ok=True)
 
-    # Run immediately on start
+    # Deliver any mail still spooled from earlier runs
+    get_email_queue(EMAIL_CONFIG).start()
+
+    # Run immediately on start; if the data has not changed since the last
+    # run, today's reports are reused and not emailed again
     run_daily_report()
+    if CITY_REPORTS:
+        run_city_reports()
 
-    # Schedule daily execution at 4:30 PM
+    # Schedule daily execution at 9:00 AM
     schedule.every().day.at("09:00").do(run_daily_report)
+    if CITY_REPORTS:
+        schedule.every().day.at("09:00").do(run_city_reports)
 
     print("Scheduler started. Press Ctrl+C to stop.")
     print("Next report scheduled for 9:00 AM daily.")
@@ -82,113 +82,1135 @@
 #
 #         return summary
 
+import numpy as np
 import pandas as pd
-import psycopg2
-from config import DB_CONFIG, CSV_BACKUP_PATH
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import argparse
+import functools
+import io
+import json
+import operator
+import os
+import tempfile
+from config import (DB_CONFIG, CSV_BACKUP_PATH, SALES_TABLE, SNAPSHOT_DIR,
+                    WATERMARK_COLUMN, SNAPSHOT_MAX_PARTS, CHUNK_SIZE, MONEY_DTYPE,
+                    DB_EXTRACT_METHOD, COPY_SPOOL_SIZE, BACKUP_PATH, BACKUP_MEMORY_MAP,
+                    BACKUP_ROW_GROUP_SIZE, DATE_COLUMN, ROLLUP_BACKEND, QUERY_BACKEND)
+from db_pool import get_connection_pool
+from instrumentation import instrumented, annotate
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Per-row revenue/profit expressions, shared by every aggregate query
+REVENUE_SQL = "units_sold * unit_price"
+PROFIT_SQL = "(unit_price - cost_per_unit) * units_sold"
+MARGIN_SQL = f"({PROFIT_SQL}) * 100.0 / NULLIF({REVENUE_SQL}, 0)"
+
+GROUP_KEYS = ("city", "product")
+
+# Columns the raw data view can be sorted by, and their SQL expressions
+SORT_COLUMNS = {
+    "city": "city",
+    "product": "product",
+    "units_sold": "units_sold",
+    "unit_price": "unit_price",
+    "cost_per_unit": "cost_per_unit",
+    "revenue": REVENUE_SQL,
+    "profit": PROFIT_SQL,
+}
+
+# Compact dtypes for the sales columns. City and product have only a handful
+# of distinct values, so categorical codes replace a Python string per row
+SALES_SCHEMA = {
+    "city": "category",
+    "product": "category",
+    "units_sold": "int32",
+    "unit_price": MONEY_DTYPE,
+    "cost_per_unit": MONEY_DTYPE,
+}
+
+# Columns of a partial aggregate. They are all plain sums/counts per
+# (city, product), so partials from different chunks merge by addition
+PARTIAL_AGGREGATIONS = {
+    "units_sold": ("units_sold", "sum"),
+    "revenue": ("revenue", "sum"),
+    "profit": ("profit", "sum"),
+    "unit_price_sum": ("unit_price", "sum"),
+    "unit_price_count": ("unit_price", "count"),
+    "margin_sum": ("profit_margin", "sum"),
+    "margin_count": ("profit_margin", "count"),
+    "transactions": ("revenue", "size"),
+}
+
+# SQL for the PARTIAL_AGGREGATIONS columns, used by the cube and daily queries
+PARTIAL_AGGREGATIONS_SQL = f"""
+    SUM(units_sold)::bigint AS units_sold,
+    SUM({REVENUE_SQL})::double precision AS revenue,
+    SUM({PROFIT_SQL})::double precision AS profit,
+    SUM(unit_price)::double precision AS unit_price_sum,
+    COUNT(unit_price) AS unit_price_count,
+    COALESCE(SUM({MARGIN_SQL}), 0)::double precision AS margin_sum,
+    COUNT({MARGIN_SQL}) AS margin_count,
+    COUNT(*) AS transactions
+"""
+
+# Columns recomputed by calculate_metrics, so they are not stored in the backup
+DERIVED_COLUMNS = ["revenue", "profit"]
+
+# Snapshot metadata; the leading underscore keeps it out of Parquet dataset scans
+SNAPSHOT_STATE_FILE = "_state.json"
+
 class DataProcessor:
     def __init__(self):
         self.db_config = DB_CONFIG
         self.csv_backup_path = CSV_BACKUP_PATH
+        self.backup_path = BACKUP_PATH
+        self.backup_memory_map = BACKUP_MEMORY_MAP
+        self.backup_row_group_size = BACKUP_ROW_GROUP_SIZE
+        self.date_column = DATE_COLUMN
+        self.rollup_backend = ROLLUP_BACKEND
+        self.query_backend = QUERY_BACKEND
+        self.sales_table = SALES_TABLE
+        self.snapshot_dir = SNAPSHOT_DIR
+        self.watermark_column = WATERMARK_COLUMN
+        self.snapshot_max_parts = SNAPSHOT_MAX_PARTS
+        self.chunk_size = CHUNK_SIZE
+        self.extract_method = DB_EXTRACT_METHOD
+        self.copy_spool_size = COPY_SPOOL_SIZE
+        # Shared read-only copy of the local data (dataset_store.DatasetStore),
+        # set by the dashboard; None reads the files on every fallback
+        self.dataset_store = None
+        # has_date_column() answer, once the database or local data gave one
+        self.date_column_present = None
+        # QUERY_BACKEND engine, created on first use and kept with its connection
+        self.query_engine = None
 
     def connect_to_db(self):
-        """Establish connection to PostgreSQL database"""
-        try:
-            conn = psycopg2.connect(**self.db_config)
-            return conn
-        except Exception as e:
-            logger.error(f"Database connection failed: {e}")
+        """Check out a pooled connection to the PostgreSQL database"""
+        return get_connection_pool(self.db_config).getconn()
+
+    def release_connection(self, conn):
+        """Return a connection to the pool"""
+        get_connection_pool(self.db_config).putconn(conn)
+
+    @instrumented()
+    def load_data_from_db(self, start=None, end=None):
+        """Load data from PostgreSQL database, optionally for a [start, end) date range"""
+        where, params = self.build_filter_clause(start=start, end=end)
+        data = self.extract_rows(f"SELECT * FROM {self.sales_table} {where}", params)
+        if data is None:
             return None
 
-    def load_data_from_db(self):
-        """Load data from PostgreSQL database"""
+        logger.info("Data loaded successfully from database")
+        return self.apply_schema(data)
+
+    def extract_rows(self, query, params=None):
+        """Fetch the rows of a query with the configured extraction method"""
+        if self.extract_method == "copy":
+            return self.copy_query(query, params)
+        return self.run_query(query, params)
+
+    def copy_query(self, query, params=None):
+        """Run a query through COPY ... TO STDOUT and parse it into typed columns
+
+        The server streams CSV, which is spooled (to disk once it is large)
+        and parsed by pandas' C reader straight into the SALES_SCHEMA dtypes,
+        instead of converting every value through a Python object.
+        """
         conn = self.connect_to_db()
         if conn:
             try:
-                query = "SELECT * FROM sales"
-                data = pd.read_sql_query(query, conn)
-                conn.close()
-                logger.info("Data loaded successfully from database")
-                return data
+                with conn.cursor() as cursor, \
+                        tempfile.SpooledTemporaryFile(max_size=self.copy_spool_size) as buffer:
+                    sql = cursor.mogrify(query, params).decode()
+                    cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+                    buffer.seek(0)
+                    return self.read_typed_csv(buffer)
             except Exception as e:
-                logger.error(f"Error loading data from database: {e}")
-                if conn:
-                    conn.close()
+                logger.error(f"Error copying data from database: {e}")
                 return None
+            finally:
+                self.release_connection(conn)
         return None
 
-    def load_data_from_csv(self):
-        """Load data from CSV backup"""
+    def read_typed_csv(self, source):
+        """Parse CSV directly into the SALES_SCHEMA dtypes"""
+        try:
+            return pd.read_csv(source, dtype=SALES_SCHEMA)
+        except ValueError:
+            # e.g. NULL units_sold cannot be parsed as int32
+            source.seek(0)
+            return self.apply_schema(pd.read_csv(source), report=False)
+
+    # --- COLUMNAR BACKUP ---
+
+    def backup_format(self):
+        """'feather' for an Arrow IPC backup path, otherwise 'parquet'"""
+        extension = os.path.splitext(self.backup_path)[1].lower()
+        return "feather" if extension in (".feather", ".arrow", ".ipc") else "parquet"
+
+    def date_bounds(self, start=None, end=None):
+        """(operator, timestamp) pairs for a half-open [start, end) date range"""
+        bounds = []
+        if start is not None:
+            bounds.append((">=", pd.Timestamp(start)))
+        if end is not None:
+            bounds.append(("<", pd.Timestamp(end)))
+        return bounds
+
+    def backup_filter(self, cities=None, products=None, start=None, end=None):
+        """Arrow filter expression for the city/product/date filters (None if unfiltered)"""
+        conditions = []
+        for column, values in (("city", cities), ("product", products)):
+            if values is not None:
+                # Chained equalities rather than isin(): only these are matched
+                # against the Parquet row group statistics
+                conditions.append(functools.reduce(
+                    operator.or_, [pc.field(column) == value for value in values], pc.scalar(False)))
+        for op, bound in self.date_bounds(start, end):
+            field = pc.field(self.date_column)
+            conditions.append(field >= pa.scalar(bound) if op == ">=" else field < pa.scalar(bound))
+        return functools.reduce(operator.and_, conditions) if conditions else None
+
+    def read_backup_table(self, columns=None, cities=None, products=None, start=None, end=None):
+        """Read the backup as an Arrow table with column projection and filters
+
+        Parquet skips row groups whose city/product/date statistics cannot
+        match the filters; an Arrow IPC file is memory-mapped and filtered in
+        place.
+        """
+        expression = self.backup_filter(cities, products, start, end)
+        if self.backup_format() == "parquet":
+            if expression is None:
+                # Decode city/product straight from the Parquet dictionary pages
+                return pq.read_table(self.backup_path, columns=columns, memory_map=self.backup_memory_map,
+                                     read_dictionary=list(GROUP_KEYS))
+            # Row group pruning needs the plain string columns, so only the
+            # surviving rows are dictionary-encoded
+            table = pq.read_table(self.backup_path, columns=columns, filters=expression,
+                                  memory_map=self.backup_memory_map)
+            for key in GROUP_KEYS:
+                index = table.schema.get_field_index(key)
+                if index >= 0:
+                    table = table.set_column(index, key, table[key].dictionary_encode())
+            return table
+
+        read_columns = columns
+        if columns is not None and expression is not None:
+            # Filter columns must be read even when they are not requested
+            filter_columns = [column for column, values in (("city", cities), ("product", products),
+                                                            (self.date_column, start), (self.date_column, end))
+                              if values is not None]
+            read_columns = list(dict.fromkeys(columns + filter_columns))
+        table = feather.read_table(self.backup_path, columns=read_columns,
+                                   memory_map=self.backup_memory_map)
+        if expression is not None:
+            table = table.filter(expression)
+        return table.select(columns) if columns is not None else table
+
+    @instrumented()
+    def load_data_from_backup(self, columns=None, cities=None, products=None, start=None, end=None):
+        """Load data from the columnar backup, optionally projected and filtered"""
+        if not os.path.exists(self.backup_path):
+            logger.warning(f"Backup file not found: {self.backup_path} "
+                           f"(run `python data_processor.py import-csv` to create it)")
+            return None
+
         try:
-            data = pd.read_csv(self.csv_backup_path)
-            logger.info("Data loaded successfully from CSV backup")
+            table = self.read_backup_table(columns, cities, products, start, end)
+            # Dictionary columns become categoricals, and numeric columns
+            # without nulls are handed over without copying
+            data = table.to_pandas(split_blocks=True, self_destruct=True)
+            logger.info("Data loaded successfully from backup")
+            return self.apply_schema(data)
+        except Exception as e:
+            logger.error(f"Error loading data from backup: {e}")
+            return None
+
+    def write_backup(self, data):
+        """Atomically replace the backup with the given rows
+
+        Rows are sorted by sale date, city and product so that each Parquet
+        row group covers few of them and filtered reads can skip the rest.
+        With a date column the file is partitioned by day: no row group spans
+        two days, so a date-range read only decodes the days it asks for.
+        """
+        keys = [key for key in GROUP_KEYS if key in data.columns]
+        has_dates = self.date_column in data.columns
+        if has_dates:
+            data = data.sort_values([self.date_column] + keys, ignore_index=True)
+        elif keys:
+            data = data.sort_values(keys, ignore_index=True)
+        table = pa.Table.from_pandas(data, preserve_index=False)
+
+        tmp_path = f"{self.backup_path}.tmp"
+        if self.backup_format() == "parquet":
+            # Stored as plain (still dictionary-encoded on disk) strings: Arrow
+            # does not prune row groups on dictionary-typed columns
+            for key in keys:
+                index = table.schema.get_field_index(key)
+                table = table.set_column(index, key, table[key].cast(pa.string()))
+            days = self.day_slices(data[self.date_column]) if has_dates else [(0, len(data))]
+            with pq.ParquetWriter(tmp_path, table.schema) as writer:
+                for offset, length in days:
+                    writer.write_table(table.slice(offset, length), row_group_size=self.backup_row_group_size)
+        else:
+            # Uncompressed, so memory-mapped reads need no decoding
+            feather.write_feather(table, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, self.backup_path)
+
+    def day_slices(self, dates):
+        """(offset, length) of each day's rows in a date-sorted column"""
+        days = dates.dt.normalize().to_numpy()
+        if not len(days):
+            return [(0, 0)]
+        starts = np.concatenate([[0], np.flatnonzero(days[1:] != days[:-1]) + 1, [len(days)]])
+        return [(int(offset), int(next_offset - offset)) for offset, next_offset in zip(starts[:-1], starts[1:])]
+
+    def load_data_from_csv(self, csv_path=None):
+        """Load a CSV export as typed sales rows, without touching the backup"""
+        csv_path = csv_path or self.csv_backup_path
+        if not os.path.exists(csv_path):
+            logger.warning(f"CSV file not found: {csv_path}")
+            return None
+
+        try:
+            data = pd.read_csv(csv_path)
+            # Drop the index column of CSVs written with to_csv(index=True)
+            data = data.loc[:, ~data.columns.str.startswith("Unnamed:")]
+            data = data.drop(columns=DERIVED_COLUMNS, errors="ignore")
+            logger.info(f"Data loaded successfully from {csv_path}")
+            return self.apply_schema(data)
+        except Exception as e:
+            logger.error(f"Error loading CSV file: {e}")
+            return None
+
+    def import_csv_backup(self, csv_path=None):
+        """Convert a CSV export into the columnar backup (False if it cannot be read)"""
+        csv_path = csv_path or self.csv_backup_path
+        data = self.load_data_from_csv(csv_path)
+        if data is None:
+            return False
+
+        try:
+            self.write_backup(data)
+            logger.info(f"Imported {len(data)} rows from {csv_path} into {self.backup_path}")
+            return True
+        except Exception as e:
+            logger.error(f"Error importing CSV backup: {e}")
+            return False
+
+    def export_csv_backup(self, csv_path=None):
+        """Write the backup out as CSV (returns the path, or None on failure)"""
+        csv_path = csv_path or self.csv_backup_path
+        data = self.load_data_from_backup()
+        if data is None:
+            return None
+
+        try:
+            data.to_csv(csv_path, index=False)
+            logger.info(f"Exported {len(data)} rows to {csv_path}")
+            return csv_path
+        except Exception as e:
+            logger.error(f"Error exporting backup to CSV: {e}")
+            return None
+
+    def apply_schema(self, data, report=True):
+        """Convert the sales columns to the compact dtypes in SALES_SCHEMA"""
+        if data is None or data.empty:
             return data
+
+        before = data.memory_usage(deep=True).sum() if report else 0
+        for column, dtype in SALES_SCHEMA.items():
+            if column not in data.columns or data[column].dtype == dtype:
+                continue
+            try:
+                data[column] = data[column].astype(dtype)
+            except (TypeError, ValueError) as e:
+                # e.g. missing units_sold values cannot be stored as int32
+                logger.warning(f"Keeping {column} as {data[column].dtype}: {e}")
+        if self.date_column in data.columns and not pd.api.types.is_datetime64_any_dtype(data[self.date_column]):
+            # CSV and COPY hand over dates as strings, the database driver as datetime.date
+            data[self.date_column] = pd.to_datetime(data[self.date_column])
+
+        if report:
+            after = data.memory_usage(deep=True).sum()
+            logger.info(f"Memory usage: {before / 1024 ** 2:.2f} MB -> {after / 1024 ** 2:.2f} MB "
+                        f"({after / before:.0%}, {len(data)} rows)")
+        return data
+
+    def load_data_from_db_since(self, watermark):
+        """Load rows added to the database after the given watermark"""
+        query = (f"SELECT * FROM {self.sales_table} "
+                 f"WHERE {self.watermark_column} > %s ORDER BY {self.watermark_column}")
+        # Typed like load_data_from_db, so every snapshot part has the same
+        # schema (COPY hands over sale_date as a string)
+        return self.apply_schema(self.extract_rows(query, [watermark]), report=False)
+
+    # --- INCREMENTAL SNAPSHOT ---
+
+    def read_snapshot_state(self):
+        """Read the snapshot metadata (None if no snapshot exists)"""
+        path = os.path.join(self.snapshot_dir, SNAPSHOT_STATE_FILE)
+        try:
+            with open(path) as f:
+                return json.load(f)
         except FileNotFoundError:
-            logger.warning(f"CSV backup file not found: {self.csv_backup_path}")
             return None
         except Exception as e:
-            logger.error(f"Error loading data from CSV: {e}")
+            logger.warning(f"Could not read snapshot state: {e}")
+            return None
+
+    def write_snapshot_state(self, state):
+        """Atomically replace the snapshot metadata"""
+        path = os.path.join(self.snapshot_dir, SNAPSHOT_STATE_FILE)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, default=str)
+        os.replace(tmp_path, path)
+
+    @instrumented()
+    def load_snapshot(self, columns=None, start=None, end=None):
+        """Load the local columnar snapshot (None if there is none)"""
+        state = self.read_snapshot_state()
+        if not state or not state["parts"]:
+            return None
+
+        try:
+            filters = [(self.date_column, op, bound) for op, bound in self.date_bounds(start, end)] or None
+            parts = [pd.read_parquet(os.path.join(self.snapshot_dir, part), columns=columns, filters=filters)
+                     for part in state["parts"]]
+            data = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+            # Parts may carry different categories, which concat turns back into objects
+            return self.apply_schema(data)
+        except Exception as e:
+            logger.error(f"Error loading snapshot: {e}")
             return None
 
-    def load_data(self):
-        """Load data with fallback mechanism"""
-        # Try database first
-        data = self.load_data_from_db()
+    def append_to_snapshot(self, data, state=None):
+        """Write new rows as a Parquet part file and advance the watermark"""
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        state = state or {"watermark_column": self.watermark_column, "watermark": None,
+                          "parts": [], "rows": 0, "next_part": 0}
+
+        part = f"part-{state['next_part']:06d}.parquet"
+        data.to_parquet(os.path.join(self.snapshot_dir, part), index=False)
+
+        # The state file is only updated once the part is fully written, so a
+        # crash in between leaves an orphan part that is never read
+        state["parts"].append(part)
+        state["next_part"] += 1
+        state["rows"] += len(data)
+        watermark = data[self.watermark_column].max()
+        state["watermark"] = watermark.item() if hasattr(watermark, "item") else watermark
+        self.write_snapshot_state(state)
+
+        if len(state["parts"]) > self.snapshot_max_parts:
+            self.compact_snapshot()
+
+        self.refresh_rollup()
+        return state
+
+    def compact_snapshot(self):
+        """Merge all snapshot parts into a single part file"""
+        state = self.read_snapshot_state()
+        data = self.load_snapshot()
+        if data is None:
+            return
+
+        old_parts = state["parts"]
+        part = f"part-{state['next_part']:06d}.parquet"
+        data.to_parquet(os.path.join(self.snapshot_dir, part), index=False)
+
+        state["parts"] = [part]
+        state["next_part"] += 1
+        self.write_snapshot_state(state)
+
+        for old_part in old_parts:
+            try:
+                os.remove(os.path.join(self.snapshot_dir, old_part))
+            except OSError:
+                pass
+        logger.info(f"Compacted {len(old_parts)} snapshot parts")
+
+    @instrumented()
+    def load_data_incremental(self, start=None, end=None):
+        """Load data from the local snapshot, fetching only new rows from the database"""
+        state = self.read_snapshot_state()
+        if state and state.get("watermark_column") != self.watermark_column:
+            logger.info("Watermark column changed, rebuilding snapshot")
+            state = None
+
+        if state is None or state["watermark"] is None:
+            data = self.load_data_from_db()
+            if data is None or data.empty:
+                return data
+            if self.watermark_column not in data.columns:
+                logger.warning(f"Column '{self.watermark_column}' not found, snapshot disabled")
+                return self.filter_frame(data, start=start, end=end)
+            try:
+                self.append_to_snapshot(data)
+            except Exception as e:
+                logger.error(f"Error writing snapshot: {e}")
+            return self.filter_frame(data, start=start, end=end)
+
+        new_rows = self.load_data_from_db_since(state["watermark"])
+        if new_rows is None:
+            logger.warning("Database unavailable, using local snapshot")
+        elif not new_rows.empty:
+            try:
+                self.append_to_snapshot(new_rows, state)
+                logger.info(f"Appended {len(new_rows)} new rows to snapshot")
+            except Exception as e:
+                # The new rows were fetched, so they are still returned with
+                # the existing snapshot; the next run fetches them again
+                logger.error(f"Error writing snapshot: {e}")
+                snapshot = self.load_snapshot(start=start, end=end)
+                new_rows = self.filter_frame(new_rows, start=start, end=end)
+                if snapshot is None:
+                    return new_rows
+                return self.apply_schema(pd.concat([snapshot, new_rows], ignore_index=True), report=False)
+        else:
+            logger.info("Snapshot is up to date")
+
+        return self.load_snapshot(start=start, end=end)
+
+    def load_local_data(self, columns=None, cities=None, products=None, start=None, end=None):
+        """Load data without touching the database (shared dataset, else snapshot, then backup)"""
+        if self.dataset_store is not None:
+            data = self.dataset_store.load(columns, cities, products, start, end)
+            if data is not None:
+                return data
 
-        # If database fails or returns empty, try CSV
+        data = self.load_snapshot(columns, start, end)
         if data is None or data.empty:
-            logger.info("Trying CSV backup...")
-            data = self.load_data_from_csv()
+            return self.load_data_from_backup(columns, cities, products, start, end)
+        if cities is not None or products is not None:
+            data = self.filter_frame(data, cities, products)
+        return data
+
+    @instrumented()
+    def load_data(self, start=None, end=None):
+        """Load data with fallback mechanism, optionally for a [start, end) date range"""
+        # Try the incrementally refreshed snapshot / database first
+        data = self.load_data_incremental(start, end)
+
+        # If database fails or returns empty, try the local backup
+        if data is None or data.empty:
+            logger.info("Trying local backup...")
+            data = self.load_data_from_backup(start=start, end=end)
 
         # If both methods fail, return empty DataFrame
         if data is None:
-            logger.error("Both database and CSV backup failed to load data")
+            logger.error("Both database and local backup failed to load data")
             return pd.DataFrame()
 
         return data
 
-    def calculate_metrics(self, data):
-        """Calculate revenue and profit metrics"""
+    @instrumented()
+    def calculate_metrics(self, data, copy=True):
+        """Calculate revenue and profit metrics
+
+        Pass copy=False when the caller owns the frame, to add the columns
+        in place instead of copying the whole frame first.
+        """
         if data.empty:
             return data
 
-        data = data.copy()
+        if copy:
+            data = data.copy()
+        return self.add_metrics(data)
+
+    def add_metrics(self, data):
+        """Add the revenue and profit columns in place (not recorded as a stage, e.g. per chunk)"""
         data["revenue"] = data["units_sold"] * data["unit_price"]
         data["profit"] = (data["unit_price"] - data["cost_per_unit"]) * data["units_sold"]
-
         return data
 
-    def get_summary_stats(self, data):
-        """Generate summary statistics"""
+    @instrumented()
+    def get_summary_stats(self, data=None, start=None, end=None):
+        """Generate summary statistics
+
+        Without data the summary comes from the daily rollup (for an optional
+        [start, end) date range), or with QUERY_BACKEND 'duckdb' from the cube
+        query in PostgreSQL, else DuckDB; otherwise the rows are loaded.
+        """
+        if data is None:
+            rollup = self.get_rollup()
+            daily = rollup.read(start, end) if rollup is not None else None
+            if daily is not None:
+                return self.get_summary_from_partial(self.window_partial(daily))
+            engine = self.get_query_engine()
+            if engine is not None:
+                partial = self.get_sales_cube_from_db(start, end)
+                if partial is None:
+                    partial = engine.get_sales_cube_from_db(start, end)
+                if partial is not None:
+                    return self.get_summary_from_partial(partial)
+            data = self.calculate_metrics(self.load_data(start, end), copy=False)
+
         if data.empty:
             return {}
 
         try:
-            # Calculate profit margin per row first
-            data_with_margin = data.copy()
-            data_with_margin['profit_margin'] = (data_with_margin['profit'] / data_with_margin['revenue']) * 100
+            # Per-row profit margin as a standalone Series rather than a new
+            # column on a copy of the whole frame
+            profit_margin = (data["profit"] / data["revenue"]) * 100
+
+            # One grouped pass per key, with all of its aggregations together
+            by_city = pd.DataFrame(
+                {"revenue": data["revenue"], "profit_margin": profit_margin}, copy=False
+            ).groupby(data["city"], observed=True).agg(
+                revenue=("revenue", "sum"),
+                profit_margin=("profit_margin", "mean"),
+            )
+            by_product = data.groupby("product", observed=True).agg(profit=("profit", "sum"))
 
             summary = {
                 "total_revenue": data["revenue"].sum(),
                 "total_profit": data["profit"].sum(),
                 "avg_unit_price": data["unit_price"].mean(),
-                "top_city": data.groupby("city")["revenue"].sum().idxmax(),
-                "top_product": data.groupby("product")["profit"].sum().idxmax(),
+                "top_city": by_city["revenue"].idxmax(),
+                "top_product": by_product["profit"].idxmax(),
                 "total_transactions": len(data)
             }
 
             # Safely calculate lowest margin city
             try:
-                city_margins = data_with_margin.groupby("city")["profit_margin"].mean()
+                summary["lowest_margin_city"] = by_city["profit_margin"].idxmin()
+            except Exception:
+                summary["lowest_margin_city"] = "N/A"
+
+            return summary
+
+        except Exception as e:
+            logger.error(f"Error calculating summary stats: {e}")
+            return {}
+
+    # --- AGGREGATION QUERY LAYER ---
+
+    def build_filter_clause(self, cities=None, products=None, start=None, end=None):
+        """Build a WHERE clause and its parameters for the city/product/date filters"""
+        conditions = []
+        params = []
+        if cities is not None:
+            conditions.append("city = ANY(%s)")
+            params.append(list(cities))
+        if products is not None:
+            conditions.append("product = ANY(%s)")
+            params.append(list(products))
+        # Plain range predicates on the column itself, so an index or day
+        # partitions on it can be used
+        for op, bound in self.date_bounds(start, end):
+            conditions.append(f"{self.date_column} {op} %s")
+            params.append(bound.date())
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+
+    def run_query(self, query, params=None):
+        """Run a query against the database and return a DataFrame (None on failure)"""
+        conn = self.connect_to_db()
+        if conn:
+            try:
+                return pd.read_sql_query(query, conn, params=params)
+            except Exception as e:
+                logger.error(f"Error running query: {e}")
+                return None
+            finally:
+                self.release_connection(conn)
+        return None
+
+    def get_page_from_db(self, cities=None, products=None, sort_by=None, ascending=True,
+                         offset=0, limit=50):
+        """Fetch one sorted page of raw rows with revenue and profit from PostgreSQL"""
+        where, params = self.build_filter_clause(cities, products)
+        # Rows have no defined order without ORDER BY, so pages could overlap
+        # or skip rows; the watermark column is the (tie-breaking) row order
+        order = f"ORDER BY {self.watermark_column}"
+        if sort_by is not None:
+            direction = "ASC" if ascending else "DESC"
+            order = f"ORDER BY {SORT_COLUMNS[sort_by]} {direction}, {self.watermark_column}"
+        query = f"""
+            SELECT *,
+                ({REVENUE_SQL})::double precision AS revenue,
+                ({PROFIT_SQL})::double precision AS profit
+            FROM {self.sales_table}
+            {where}
+            {order}
+            LIMIT %s OFFSET %s
+        """
+        data = self.extract_rows(query, params + [limit, offset])
+        if data is None:
+            return None
+        # CSV parsing would give whole-number pages integer columns
+        return self.apply_schema(data.astype({"revenue": "float64", "profit": "float64"}), report=False)
+
+    def filter_frame(self, data, cities=None, products=None, start=None, end=None):
+        """Apply the city/product/date filters to a DataFrame"""
+        mask = pd.Series(True, index=data.index)
+        if cities is not None:
+            mask &= data["city"].isin(list(cities))
+        if products is not None:
+            mask &= data["product"].isin(list(products))
+        for op, bound in self.date_bounds(start, end):
+            dates = data[self.date_column]
+            mask &= dates >= bound if op == ">=" else dates < bound
+        return data[mask]
+
+    def partition(self, data, key="city"):
+        """Split rows or aggregates into {key value: part} in one groupby pass
+
+        `key` may be a column or an index level, e.g. the city level of a
+        partial_aggregate or get_daily_aggregates result.
+        """
+        return dict(tuple(data.groupby(key, sort=False, observed=True)))
+
+    @instrumented()
+    def get_page(self, cities=None, products=None, sort_by=None, ascending=True, offset=0, limit=50):
+        """Fetch one page of raw rows for the given filters, sorted in the data layer
+
+        Only the requested rows leave the database; without it the local
+        data is filtered, sorted and sliced by the QUERY_BACKEND engine, or
+        in the shared dataset when one is set.
+        """
+        if sort_by is not None and sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Unsupported sort column: {sort_by}")
+
+        data = self.get_page_from_db(cities, products, sort_by, ascending, offset, limit)
+        if data is not None:
+            return data
+
+        engine = self.get_query_engine()
+        if engine is not None:
+            data = engine.get_page_from_db(cities, products, sort_by, ascending, offset, limit)
+            if data is not None:
+                return data
+
+        if self.dataset_store is not None:
+            data = self.dataset_store.get_page(cities, products, sort_by, ascending, offset, limit)
+            if data is not None:
+                return data
+
+        data = self.load_local_data(cities=cities, products=products)
+        if data is None:
+            return pd.DataFrame()
+        data = self.calculate_metrics(data, copy=False)
+        if sort_by is not None:
+            data = data.sort_values(sort_by, ascending=ascending, kind="stable")
+        return data.iloc[offset:offset + limit].reset_index(drop=True)
+
+    @instrumented()
+    def export_csv(self, cities=None, products=None, chunksize=None):
+        """Build a CSV export of the filtered rows, streaming them in chunks
+
+        The rows come from the same source as get_page: the database, else the
+        local data in load_local_data's order. Returns the encoded bytes; only
+        one chunk is held as a DataFrame at a time.
+        """
+        buffer = io.BytesIO()
+        header = True
+        for chunk in self.iter_metric_chunks(chunksize, cities, products):
+            buffer.write(chunk.to_csv(index=False, header=header).encode())
+            header = False
+        if header:
+            # No rows matched, or there is no data: still a CSV with its header line
+            columns = self.local_columns() or list(SALES_SCHEMA)
+            columns += [column for column in DERIVED_COLUMNS if column not in columns]
+            buffer.write(pd.DataFrame(columns=columns).to_csv(index=False).encode())
+        annotate(bytes=buffer.tell())
+        return buffer.getvalue()
+
+    # --- STREAMING PIPELINE ---
+
+    def stream_from_db(self, conn, chunksize, cities=None, products=None, start=None, end=None):
+        """Yield chunks of the sales table through a server-side cursor"""
+        rows_streamed = 0
+        try:
+            # A named cursor keeps the result set on the server and only
+            # transfers `itersize` rows per round trip
+            with conn.cursor(name="sales_stream") as cursor:
+                cursor.itersize = chunksize
+                where, params = self.build_filter_clause(cities, products, start, end)
+                # In watermark order, so exports list the rows the same way every time
+                cursor.execute(f"SELECT * FROM {self.sales_table} {where} ORDER BY {self.watermark_column}",
+                               params)
+                while True:
+                    rows = cursor.fetchmany(chunksize)
+                    if not rows:
+                        break
+                    columns = [column.name for column in cursor.description]
+                    rows_streamed += len(rows)
+                    yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+            logger.info(f"Streamed {rows_streamed} rows from database")
+        except Exception as e:
+            if rows_streamed:
+                raise
+            logger.error(f"Error streaming data from database: {e}")
+            yield from self.stream_local_data(chunksize, cities, products, start, end)
+        finally:
+            self.release_connection(conn)
+
+    def stream_from_backup(self, chunksize, cities=None, products=None, start=None, end=None):
+        """Yield chunks of the columnar backup"""
+        if not os.path.exists(self.backup_path):
+            logger.warning(f"Backup file not found: {self.backup_path} "
+                           f"(run `python data_processor.py import-csv` to create it)")
+            return
+
+        try:
+            expression = self.backup_filter(cities, products, start, end)
+            if expression is not None:
+                # The dataset scanner applies the filter (and row group pruning) per batch
+                backup_format = "parquet" if self.backup_format() == "parquet" else "ipc"
+                batches = ds.dataset(self.backup_path, format=backup_format).to_batches(
+                    filter=expression, batch_size=chunksize)
+            elif self.backup_format() == "parquet":
+                backup = pq.ParquetFile(self.backup_path, memory_map=self.backup_memory_map,
+                                        read_dictionary=list(GROUP_KEYS))
+                batches = backup.iter_batches(batch_size=chunksize)
+            else:
+                batches = feather.read_table(self.backup_path, memory_map=self.backup_memory_map
+                                             ).to_batches(max_chunksize=chunksize)
+        except Exception as e:
+            logger.error(f"Error loading data from backup: {e}")
+            return
+
+        for batch in batches:
+            yield batch.to_pandas(split_blocks=True, self_destruct=True)
+
+    def stream_from_snapshot(self, chunksize, cities=None, products=None, start=None, end=None):
+        """Yield chunks of the local snapshot, part by part (nothing if there is none)"""
+        state = self.read_snapshot_state()
+        if not state or not state["parts"]:
+            return
+
+        expression = self.backup_filter(cities, products, start, end)
+        for part in state["parts"]:
+            batches = ds.dataset(os.path.join(self.snapshot_dir, part), format="parquet").to_batches(
+                filter=expression, batch_size=chunksize)
+            for batch in batches:
+                if batch.num_rows:
+                    yield self.apply_schema(batch.to_pandas(split_blocks=True, self_destruct=True), report=False)
+
+    def stream_local_data(self, chunksize, cities=None, products=None, start=None, end=None):
+        """Yield chunks of the local data from the same source as load_local_data
+
+        That is the shared dataset when the dashboard set one, else the
+        snapshot, else the backup.
+        """
+        if self.dataset_store is not None and self.dataset_store.current() is not None:
+            yield from self.dataset_store.stream(chunksize, cities, products, start, end)
+            return
+
+        rows_streamed = 0
+        try:
+            for chunk in self.stream_from_snapshot(chunksize, cities, products, start, end):
+                rows_streamed += len(chunk)
+                yield chunk
+        except Exception as e:
+            if rows_streamed:
+                raise
+            logger.error(f"Error streaming snapshot: {e}")
+        if rows_streamed:
+            logger.info(f"Streamed {rows_streamed} rows from snapshot")
+            return
+
+        logger.info("Streaming local backup...")
+        yield from self.stream_from_backup(chunksize, cities, products, start, end)
+
+    def iter_data_chunks(self, chunksize=None, cities=None, products=None, start=None, end=None):
+        """Iterate over the sales data in chunks, with snapshot and backup fallback"""
+        chunksize = chunksize or self.chunk_size
+        conn = self.connect_to_db()
+        if conn:
+            yield from self.stream_from_db(conn, chunksize, cities, products, start, end)
+            return
+
+        yield from self.stream_local_data(chunksize, cities, products, start, end)
+
+    def iter_metric_chunks(self, chunksize=None, cities=None, products=None, start=None, end=None):
+        """Iterate over the sales data in chunks with revenue and profit added
+
+        The consuming stage (e.g. export_csv) is recorded once, with the
+        number of chunks and rows streamed, instead of one record per chunk.
+        """
+        chunks = rows = 0
+        for chunk in self.iter_data_chunks(chunksize, cities, products, start, end):
+            if not chunk.empty:
+                chunks += 1
+                rows += len(chunk)
+                yield self.add_metrics(chunk)
+        annotate(chunks=chunks, streamed_rows=rows)
+
+    def partial_aggregate(self, data, keys=GROUP_KEYS):
+        """Reduce a chunk with metrics to per-(city, product) partial sums"""
+        margins = data["profit"] / data["revenue"] * 100
+        return data.assign(profit_margin=margins).groupby(
+            list(keys), dropna=False, sort=False, observed=True
+        ).agg(**PARTIAL_AGGREGATIONS)
+
+    def merge_partials(self, partials):
+        """Merge partial aggregates by summing them per index key"""
+        partials = [partial for partial in partials if partial is not None]
+        if not partials:
+            return None
+        if len(partials) == 1:
+            return partials[0]
+        return pd.concat(partials).groupby(
+            level=list(partials[0].index.names), dropna=False, sort=False, observed=True
+        ).sum()
+
+    def get_summary_from_partial(self, partial):
+        """Build the get_summary_stats dictionary from a partial aggregate"""
+        if partial is None or partial["transactions"].sum() == 0:
+            return {}
+
+        try:
+            totals = partial.sum()
+            by_city = partial.groupby(level="city", observed=True).sum()
+            by_product = partial.groupby(level="product", observed=True).sum()
+
+            summary = {
+                "total_revenue": totals["revenue"],
+                "total_profit": totals["profit"],
+                "avg_unit_price": totals["unit_price_sum"] / totals["unit_price_count"],
+                "top_city": by_city["revenue"].idxmax(),
+                "top_product": by_product["profit"].idxmax(),
+                "total_transactions": int(totals["transactions"])
+            }
+
+            # Safely calculate lowest margin city
+            try:
+                city_margins = by_city["margin_sum"] / by_city["margin_count"]
                 summary["lowest_margin_city"] = city_margins.idxmin()
-            except:
+            except Exception:
                 summary["lowest_margin_city"] = "N/A"
 
             return summary
 
         except Exception as e:
             logger.error(f"Error calculating summary stats: {e}")
-            return {}
\ No newline at end of file
+            return {}
+
+    @instrumented()
+    def get_summary_stats_streaming(self, chunksize=None, start=None, end=None):
+        """Generate summary statistics chunk by chunk with bounded memory"""
+        partial = None
+        for chunk in self.iter_metric_chunks(chunksize, start=start, end=end):
+            partial = self.merge_partials([partial, self.partial_aggregate(chunk)])
+
+        return self.get_summary_from_partial(partial)
+
+    # --- AGGREGATE CUBE ---
+
+    def get_sales_cube_from_db(self, start=None, end=None):
+        """Compute the (city x product) aggregate cube in PostgreSQL, optionally for a [start, end) date range"""
+        where, params = self.build_filter_clause(start=start, end=end)
+        query = f"""
+            SELECT city, product, {PARTIAL_AGGREGATIONS_SQL}
+            FROM {self.sales_table}
+            {where}
+            GROUP BY city, product
+        """
+        cube = self.run_query(query, params)
+        if cube is None:
+            return None
+        return cube.set_index(["city", "product"])
+
+    @instrumented()
+    def get_sales_cube(self):
+        """Get per-(city, product) sums and counts for the whole dataset.
+
+        The cube has the same columns as partial_aggregate, so any filter
+        combination can be answered by slicing it with slice_cube.
+        """
+        rollup = self.get_rollup()
+        daily = rollup.read() if rollup is not None else None
+        if daily is not None and not daily.empty:
+            logger.info(f"Aggregate cube built from the daily rollup ({len(daily)} cells)")
+            return daily.groupby(level=list(GROUP_KEYS), sort=False).sum()
+
+        cube = self.get_sales_cube_from_db()
+        if cube is not None and not cube.empty:
+            logger.info(f"Aggregate cube built in database ({len(cube)} cells)")
+            return cube
+
+        engine = self.get_query_engine()
+        cube = engine.get_sales_cube_from_db() if engine is not None else None
+        if cube is not None and not cube.empty:
+            logger.info(f"Aggregate cube built from local data in DuckDB ({len(cube)} cells)")
+            return cube
+
+        logger.info("Building aggregate cube from local data...")
+        data = self.load_local_data(list(SALES_SCHEMA))
+        if data is None or data.empty:
+            return None
+        return self.partial_aggregate(self.calculate_metrics(data, copy=False))
+
+    def slice_cube(self, cube, cities=None, products=None):
+        """Answer KPI totals and per-city/per-product rollups from the cube"""
+        mask = pd.Series(True, index=cube.index)
+        if cities is not None:
+            mask &= cube.index.get_level_values("city").isin(list(cities))
+        if products is not None:
+            mask &= cube.index.get_level_values("product").isin(list(products))
+        cells = cube[mask.values]
+
+        totals = cells.sum()
+        kpis = {
+            "total_revenue": totals["revenue"],
+            "total_profit": totals["profit"],
+            "avg_unit_price": (totals["unit_price_sum"] / totals["unit_price_count"]
+                               if totals["unit_price_count"] else None),
+            "total_units": int(totals["units_sold"]),
+            "total_transactions": int(totals["transactions"]),
+        }
+
+        def rollup(key):
+            grouped = cells.groupby(level=key, observed=True).sum()
+            grouped["avg_profit_margin"] = grouped["margin_sum"] / grouped["margin_count"]
+            grouped = grouped[["units_sold", "revenue", "profit", "avg_profit_margin", "transactions"]]
+            return grouped.reset_index().sort_values("revenue", ascending=False, ignore_index=True)
+
+        return {"kpis": kpis, "by_city": rollup("city"), "by_product": rollup("product")}
+
+    # --- DAILY AGGREGATES ---
+
+    def get_rollup(self):
+        """The daily rollup of this processor's sales data (None when ROLLUP_BACKEND is 'off')"""
+        if self.rollup_backend == "off":
+            return None
+        # Imported here: the rollup module builds on this one
+        from rollup import SalesRollup
+        return SalesRollup(self, self.rollup_backend)
+
+    def get_query_engine(self):
+        """Processor running the SQL queries over the local data (None unless QUERY_BACKEND is 'duckdb')"""
+        if self.query_backend != "duckdb":
+            return None
+        if self.query_engine is None:
+            # Imported here: duckdb is only needed for this backend
+            from duckdb_backend import DuckDBProcessor
+            self.query_engine = DuckDBProcessor(self)
+        return self.query_engine
+
+    def local_columns(self):
+        """Column names of the local data (snapshot, else backup), read from file metadata"""
+        state = self.read_snapshot_state()
+        try:
+            if state and state["parts"]:
+                return pq.read_schema(os.path.join(self.snapshot_dir, state["parts"][0])).names
+            if not os.path.exists(self.backup_path):
+                return []
+            if self.backup_format() == "parquet":
+                return pq.read_schema(self.backup_path).names
+            with pa.memory_map(self.backup_path) as source:
+                return pa.ipc.open_file(source).schema.names
+        except Exception as e:
+            logger.warning(f"Could not read local data schema: {e}")
+            return []
+
+    def has_date_column(self):
+        """Whether the sales data has the sale date column (database, else local data)
+
+        Cached per processor once a source answered.
+        """
+        if self.date_column_present is not None:
+            return self.date_column_present
+        columns = self.run_query(f"SELECT * FROM {self.sales_table} LIMIT 0")
+        names = list(columns.columns) if columns is not None else self.local_columns()
+        if names:
+            self.date_column_present = self.date_column in names
+        return self.date_column in names
+
+    def refresh_rollup(self):
+        """Fold new sales into the daily rollup; called by the writers of sales data"""
+        rollup = self.get_rollup()
+        if rollup is not None and self.has_date_column():
+            rollup.refresh()
+
+    def daily_aggregate(self, data):
+        """Reduce a chunk with metrics to per-(day, city, product) partial sums"""
+        data = data.assign(**{self.date_column: data[self.date_column].dt.normalize()})
+        return self.partial_aggregate(data, (self.date_column,) + GROUP_KEYS)
+
+    def get_daily_aggregates_from_db(self, start=None, end=None):
+        """Compute per-(day, city, product) partial sums in PostgreSQL"""
+        where, params = self.build_filter_clause(start=start, end=end)
+        query = f"""
+            SELECT {self.date_column}::date AS {self.date_column}, city, product, {PARTIAL_AGGREGATIONS_SQL}
+            FROM {self.sales_table}
+            {where}
+            GROUP BY 1, city, product
+        """
+        daily = self.run_query(query, params)
+        if daily is None:
+            return None
+        daily[self.date_column] = pd.to_datetime(daily[self.date_column])
+        return daily.set_index([self.date_column, "city", "product"])
+
+    @instrumented()
+    def get_daily_aggregates(self, start=None, end=None):
+        """Get per-(day, city, product) sums and counts for a [start, end) date range.
+
+        Each day is reduced to a few cells with the partial_aggregate columns,
+        so any window of days is answered by summing its days (see
+        window_partial) instead of rescanning the rows. They are read from
+        the daily rollup, else aggregated from the raw rows. Requires the date
+        column; check has_date_column first.
+        """
+        rollup = self.get_rollup()
+        daily = rollup.read(start, end) if rollup is not None else None
+        if daily is not None:
+            return daily
+
+        daily = self.get_daily_aggregates_from_db(start, end)
+        if daily is not None:
+            logger.info(f"Daily aggregates computed in database ({len(daily)} cells)")
+            return daily
+
+        engine = self.get_query_engine()
+        daily = engine.get_daily_aggregates_from_db(start, end) if engine is not None else None
+        if daily is not None:
+            logger.info(f"Daily aggregates computed from local data in DuckDB ({len(daily)} cells)")
+            return daily
+
+        logger.info("Computing daily aggregates from local data...")
+        data = self.load_local_data(list(SALES_SCHEMA) + [self.date_column], start=start, end=end)
+        if data is None:
+            return None
+        if data.empty:
+            index = pd.MultiIndex.from_arrays([[], [], []], names=[self.date_column, *GROUP_KEYS])
+            return pd.DataFrame(0, index=index, columns=list(PARTIAL_AGGREGATIONS))
+        return self.daily_aggregate(self.calculate_metrics(data, copy=False))
+
+    def window_partial(self, daily, start=None, end=None):
+        """Merge the days of a [start, end) range into a per-(city, product) partial"""
+        dates = daily.index.get_level_values(self.date_column)
+        mask = np.ones(len(daily), dtype=bool)
+        for op, bound in self.date_bounds(start, end):
+            mask &= dates >= bound if op == ">=" else dates < bound
+        return daily[mask].groupby(level=list(GROUP_KEYS), dropna=False, sort=False, observed=True).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between the CSV export and the columnar backup")
+    parser.add_argument("command", choices=["import-csv", "export-csv"])
+    parser.add_argument("csv_path", nargs="?", help=f"CSV file (default {CSV_BACKUP_PATH})")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    processor = DataProcessor()
+    if args.command == "import-csv":
+        return 0 if processor.import_csv_backup(args.csv_path) else 1
+    return 0 if processor.export_csv_backup(args.csv_path) is not None else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,171 @@
+# dataset_store.py
+import hashlib
+import logging
+import os
+import threading
+import time
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from config import DATASET_REFRESH_SECONDS
+from data_processor import GROUP_KEYS, SORT_COLUMNS
+from instrumentation import instrumented, annotate
+
+logger = logging.getLogger(__name__)
+
+
+class DatasetVersion:
+    """One immutable version of the local sales data as an Arrow table"""
+
+    def __init__(self, version, table, source):
+        self.version = version
+        self.table = table
+        self.source = source
+        self.loaded_at = time.time()
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+
+class DatasetStore:
+    """Process-wide, read-only copy of the local sales data shared by every session
+
+    Sessions get the current DatasetVersion by reference, so the rows are held
+    once per process however many sessions are open; only the filtered rows
+    or the page a session asks for are converted to pandas. A memory-mapped
+    Arrow IPC backup is not even read into memory: the table points into the
+    file. When the snapshot or backup files change, the next call after
+    `refresh_seconds` loads a new version and swaps it in with one assignment;
+    sessions still reading the old version finish on it, and it is freed
+    when the last of them lets go.
+    """
+
+    def __init__(self, processor, refresh_seconds=DATASET_REFRESH_SECONDS):
+        self.processor = processor
+        self.refresh_seconds = refresh_seconds
+        self.current_version = None
+        self.checked_at = 0.0
+        # One session loads a new version while the others keep reading the old one
+        self.lock = threading.Lock()
+
+    def source_files(self):
+        """The snapshot parts, else the backup file (empty if there is no local data)"""
+        processor = self.processor
+        state = processor.read_snapshot_state()
+        if state and state["parts"]:
+            return [os.path.join(processor.snapshot_dir, part) for part in state["parts"]]
+        if not os.path.exists(processor.backup_path):
+            return []
+        return [processor.backup_path]
+
+    def source_version(self, files):
+        """Version id of the local data: a hash of its files' names, sizes and mtimes"""
+        digest = hashlib.sha256()
+        for path in files:
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+        return digest.hexdigest()[:16]
+
+    def read_table(self, files):
+        """Read the local data as one Arrow table"""
+        processor = self.processor
+        if files == [processor.backup_path]:
+            return processor.read_backup_table()
+        table = pa.concat_tables([pq.read_table(path) for path in files], promote_options="default")
+        return table.unify_dictionaries()
+
+    def current(self):
+        """The current version, refreshed when the files changed (None if there is no local data)"""
+        version = self.current_version
+        if version is not None and time.monotonic() - self.checked_at < self.refresh_seconds:
+            return version
+        with self.lock:
+            if self.current_version is version:
+                self.refresh()
+            return self.current_version
+
+    @instrumented("dataset_refresh")
+    def refresh(self):
+        """Load the local data if its files changed since the current version was read"""
+        self.checked_at = time.monotonic()
+        try:
+            files = self.source_files()
+            if not files:
+                logger.warning("No local data for the shared dataset")
+                return self.current_version
+            version = self.source_version(files)
+            if self.current_version is not None and self.current_version.version == version:
+                return self.current_version
+
+            table = self.read_table(files)
+            # Swapped in whole: readers see either the old or the new version
+            self.current_version = DatasetVersion(version, table, files)
+            logger.info(f"Shared dataset version {version} loaded "
+                        f"({table.num_rows} rows, {table.nbytes / 1024 ** 2:.1f} MB)")
+            annotate(rows=table.num_rows, bytes=table.nbytes)
+        except Exception as e:
+            logger.error(f"Error loading the shared dataset: {e}")
+        return self.current_version
+
+    def filtered_table(self, version, cities=None, products=None, start=None, end=None):
+        expression = self.processor.backup_filter(cities, products, start, end)
+        return version.table if expression is None else version.table.filter(expression)
+
+    def load(self, columns=None, cities=None, products=None, start=None, end=None):
+        """Filtered rows of the current version as a DataFrame (None if there is no local data)"""
+        version = self.current()
+        if version is None:
+            return None
+        table = self.filtered_table(version, cities, products, start, end)
+        if columns is not None:
+            table = table.select([column for column in columns if column in table.column_names])
+        return self.processor.apply_schema(table.to_pandas(), report=False)
+
+    def stream(self, chunksize, cities=None, products=None, start=None, end=None):
+        """Yield the filtered rows of the current version as DataFrame chunks"""
+        version = self.current()
+        if version is None:
+            return
+        table = self.filtered_table(version, cities, products, start, end)
+        for batch in table.to_batches(max_chunksize=chunksize):
+            if batch.num_rows:
+                yield self.processor.apply_schema(batch.to_pandas(), report=False)
+
+    def sort_key(self, table, sort_by):
+        """Array the rows are ordered by for a SORT_COLUMNS column"""
+        if sort_by == "revenue":
+            return pc.multiply(table["units_sold"], table["unit_price"])
+        if sort_by == "profit":
+            return pc.multiply(pc.subtract(table["unit_price"], table["cost_per_unit"]), table["units_sold"])
+        if sort_by in GROUP_KEYS:
+            # Sort by the names, not the dictionary codes
+            return table[sort_by].cast(pa.string())
+        return table[sort_by]
+
+    @instrumented("dataset_page")
+    def get_page(self, cities=None, products=None, sort_by=None, ascending=True, offset=0, limit=50):
+        """One sorted page of rows with revenue and profit (None if there is no local data)
+
+        Filtering and sorting run on the shared Arrow table; only the page is
+        converted to pandas.
+        """
+        if sort_by is not None and sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Unsupported sort column: {sort_by}")
+        version = self.current()
+        if version is None:
+            return None
+
+        table = self.filtered_table(version, cities, products)
+        if sort_by is None:
+            page = table.slice(offset, limit)
+        else:
+            # A stable sort, so rows with equal keys keep their file order
+            indices = pc.array_sort_indices(self.sort_key(table, sort_by),
+                                            order="ascending" if ascending else "descending")
+            page = table.take(indices[offset:offset + limit])
+        annotate(rows=page.num_rows, version=version.version)
+
+        for metric in ("revenue", "profit"):
+            page = page.append_column(metric, pc.cast(self.sort_key(page, metric), pa.float64()))
+        return self.processor.apply_schema(page.to_pandas(), report=False)
@@ -0,0 +1,119 @@
+# db_pool.py
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# DB_CONFIG keys that configure the pool rather than psycopg2.connect
+POOL_OPTIONS = {
+    "pool_min_size": 1,
+    "pool_max_size": 5,
+    "retry_cooldown": 30,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Pool of health-checked PostgreSQL connections"""
+
+    def __init__(self, db_config):
+        config = dict(db_config)
+        options = {key: config.pop(key, default) for key, default in POOL_OPTIONS.items()}
+        self.min_size = int(options["pool_min_size"])
+        self.max_size = int(options["pool_max_size"])
+        self.retry_cooldown = float(options["retry_cooldown"])
+        self.checkout_timeout = float(config.get("connect_timeout") or 10)
+        self.connect_kwargs = config
+
+        self.pool = None
+        self.lock = threading.Lock()
+        # psycopg2 raises instead of waiting when the pool is exhausted
+        self.slots = threading.BoundedSemaphore(self.max_size)
+        self.unavailable_until = 0.0
+
+    def get_pool(self):
+        """Create the underlying psycopg2 pool on first use"""
+        if self.pool is None:
+            # Imported here, so processes that never query PostgreSQL skip it
+            from psycopg2 import pool
+            with self.lock:
+                if self.pool is None:
+                    self.pool = pool.ThreadedConnectionPool(
+                        self.min_size, self.max_size, **self.connect_kwargs
+                    )
+        return self.pool
+
+    def is_healthy(self, conn):
+        """Check that a pooled connection is still usable"""
+        import psycopg2
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def checkout(self):
+        """Get a healthy connection, discarding any that have gone stale"""
+        import psycopg2
+        db_pool = self.get_pool()
+        # Every idle connection may be dead after a server restart
+        for _ in range(self.max_size + 1):
+            conn = db_pool.getconn()
+            if self.is_healthy(conn):
+                return conn
+            db_pool.putconn(conn, close=True)
+        raise psycopg2.OperationalError("No healthy database connection available")
+
+    def getconn(self):
+        """Check out a connection (None if the database is unreachable)"""
+        if time.monotonic() < self.unavailable_until:
+            # The database failed recently; fail fast instead of waiting on connect
+            return None
+
+        if not self.slots.acquire(timeout=self.checkout_timeout):
+            logger.error("Timed out waiting for a pooled database connection")
+            return None
+
+        try:
+            return self.checkout()
+        except Exception as e:
+            self.slots.release()
+            self.unavailable_until = time.monotonic() + self.retry_cooldown
+            logger.error(f"Database connection failed: {e}")
+            return None
+
+    def putconn(self, conn):
+        """Return a connection to the pool"""
+        try:
+            self.get_pool().putconn(conn, close=bool(conn.closed))
+        except Exception as e:
+            logger.warning(f"Error returning connection to pool: {e}")
+        finally:
+            self.slots.release()
+
+    def closeall(self):
+        """Close every pooled connection"""
+        if self.pool is not None:
+            self.pool.closeall()
+            self.pool = None
+
+
+def get_connection_pool(db_config):
+    """Return the connection pool for a DB configuration.
+
+    Pools are keyed by process id as well: connections must not be shared
+    with forked worker processes, so each process builds its own pool.
+    """
+    key = (os.getpid(), tuple(sorted(db_config.items())))
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(db_config)
+        return _pools[key]
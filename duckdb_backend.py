@@ -0,0 +1,126 @@
+# duckdb_backend.py
+import logging
+import os
+import threading
+import duckdb
+import pyarrow as pa
+from config import DUCKDB_THREADS
+from data_processor import DataProcessor
+from instrumentation import annotate
+
+logger = logging.getLogger(__name__)
+
+# Name of the DuckDB view over the local sales data
+LOCAL_SALES_VIEW = "local_sales"
+
+
+class DuckDBProcessor(DataProcessor):
+    """DataProcessor whose SQL queries run in embedded DuckDB over the local data
+
+    The sales table is a view over the snapshot parts, else the backup file
+    (Parquet, or a memory-mapped Arrow IPC file), so the *_from_db query
+    methods - the cube, daily aggregates, pages - run unchanged,
+    multi-threaded, without loading the rows into pandas. Only the
+    aggregated result is returned as a DataFrame. The connection is kept
+    between queries and reopened when the local files change.
+    """
+
+    def __init__(self, processor=None, threads=DUCKDB_THREADS):
+        super().__init__()
+        if processor is not None:
+            # Same files and settings as the processor it stands in for
+            self.__dict__.update(processor.__dict__)
+        self.sales_table = LOCAL_SALES_VIEW
+        # Queries never go back through the rollup or another engine
+        self.rollup_backend = "off"
+        self.query_backend = "pandas"
+        self.threads = threads
+        self.conn = None
+        # source_key() of the files the open connection's view reads
+        self.source = None
+        # One query at a time: a DuckDB connection is not safe to share across threads
+        self.lock = threading.Lock()
+
+    def source_key(self):
+        """Paths, sizes and mtimes of the local data files the view would read"""
+        state = self.read_snapshot_state()
+        if state and state["parts"]:
+            paths = [os.path.join(self.snapshot_dir, part) for part in state["parts"]]
+        else:
+            paths = [self.backup_path]
+        key = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                key.append((path, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                key.append((path, None, None))
+        return tuple(key)
+
+    def local_source(self):
+        """DuckDB table expression for the local data (None if there is none)"""
+        state = self.read_snapshot_state()
+        if state and state["parts"]:
+            parts = ", ".join(repr(os.path.join(self.snapshot_dir, part)) for part in state["parts"])
+            return f"read_parquet([{parts}], union_by_name = true)"
+
+        if not os.path.exists(self.backup_path):
+            return None
+        if self.backup_format() == "parquet":
+            return f"read_parquet({self.backup_path!r})"
+
+        # DuckDB scans the memory-mapped Arrow table in place
+        with pa.memory_map(self.backup_path) as source:
+            self.conn.register("arrow_backup", pa.ipc.open_file(source).read_all())
+        return "arrow_backup"
+
+    def connect(self):
+        """The DuckDB connection with the sales view (None if there is no local data)
+
+        Reused while the local files are unchanged, reopened when they change.
+        """
+        source = self.source_key()
+        if self.conn is not None:
+            if source == self.source:
+                return self.conn
+            logger.info("Local data changed, reopening DuckDB")
+            self.close()
+        try:
+            self.conn = duckdb.connect()
+            if self.threads:
+                self.conn.execute(f"SET threads TO {int(self.threads)}")
+            view_source = self.local_source()
+            if view_source is None:
+                logger.error("No local data for DuckDB to query")
+                self.close()
+                return None
+            self.conn.execute(f"CREATE VIEW {self.sales_table} AS SELECT * FROM {view_source}")
+            self.source = source
+            return self.conn
+        except Exception as e:
+            logger.error(f"Error opening DuckDB: {e}")
+            self.close()
+            return None
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+            self.source = None
+
+    def run_query(self, query, params=None):
+        """Run a query (PostgreSQL placeholders) in DuckDB and return a DataFrame (None on failure)"""
+        with self.lock:
+            conn = self.connect()
+            if conn is None:
+                return None
+            try:
+                result = conn.execute(query.replace("%s", "?"), params or []).df()
+                annotate(engine="duckdb")
+                return result
+            except Exception as e:
+                logger.error(f"Error running DuckDB query: {e}")
+                return None
+
+    def extract_rows(self, query, params=None):
+        return self.run_query(query, params)
@@ -0,0 +1,378 @@
+# email_queue.py
+import smtplib
+import base64
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from email.message import EmailMessage
+from email.policy import SMTP as SMTP_POLICY
+from config import (EMAIL_SPOOL_DIR, EMAIL_MAX_ATTEMPTS, EMAIL_RETRY_BACKOFF,
+                    EMAIL_RETRY_BACKOFF_MAX, SMTP_IDLE_TIMEOUT)
+
+logger = logging.getLogger(__name__)
+
+# Multiple of 57 bytes, so each chunk base64-encodes to whole 76-character lines
+ENCODE_CHUNK_SIZE = 57 * 16 * 1024
+# Bytes buffered per socket write while streaming a message to the server
+SEND_BUFFER_SIZE = 256 * 1024
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+class SMTPSession:
+    """One authenticated SMTP connection, reopened when it goes stale"""
+
+    def __init__(self, email_config, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self.email_config = email_config
+        self.idle_timeout = idle_timeout
+        self.smtp = None
+        self.last_used = 0.0
+
+    def is_healthy(self):
+        """Check that the open connection still answers"""
+        try:
+            return self.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def connect(self):
+        """Return a ready SMTP connection, logging in again only if needed"""
+        if self.smtp is not None and not self.is_healthy():
+            self.close()
+
+        if self.smtp is None:
+            config = self.email_config
+            smtp = smtplib.SMTP(config['smtp_server'], config['smtp_port'],
+                                timeout=config.get('timeout', 30))
+            try:
+                if config.get('starttls', True):
+                    smtp.starttls()
+                if config.get('email_password'):
+                    smtp.login(config['email_user'], config['email_password'])
+            except Exception:
+                smtp.close()
+                raise
+            self.smtp = smtp
+            logger.info("SMTP session opened")
+
+        self.last_used = time.monotonic()
+        return self.smtp
+
+    def close(self):
+        """Close the connection, ignoring errors from a dead one"""
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+        self.smtp = None
+
+    def close_if_idle(self):
+        """Close the connection once it has been unused for idle_timeout"""
+        if self.smtp is not None and time.monotonic() - self.last_used >= self.idle_timeout:
+            self.close()
+            logger.info("SMTP session closed after idling")
+
+
+class EmailQueue:
+    """Disk-backed outgoing mail queue delivered by a background thread.
+
+    Each message is spooled as <id>.eml (the raw message) plus <id>.json
+    (sender, pending recipients and retry state), so queued mail survives a
+    restart. Messages that still fail after max_attempts are moved to
+    spool_dir/failed instead of being dropped.
+    """
+
+    def __init__(self, email_config, spool_dir=EMAIL_SPOOL_DIR, max_attempts=EMAIL_MAX_ATTEMPTS,
+                 backoff=EMAIL_RETRY_BACKOFF, backoff_max=EMAIL_RETRY_BACKOFF_MAX):
+        self.session = SMTPSession(email_config)
+        self.spool_dir = spool_dir
+        self.failed_dir = os.path.join(spool_dir, "failed")
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.idle = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def path(self, message_id, suffix):
+        return os.path.join(self.spool_dir, f"{message_id}.{suffix}")
+
+    def write_entry(self, entry):
+        """Atomically replace the state file of a spooled message"""
+        path = self.path(entry["id"], "json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def write_attachment(self, f, boundary, path, maintype, subtype, filename):
+        """Append one base64 MIME part, encoding the file chunk by chunk"""
+        part = EmailMessage()
+        part["Content-Type"] = f"{maintype}/{subtype}"
+        part["Content-Transfer-Encoding"] = "base64"
+        part.add_header("Content-Disposition", "attachment", filename=filename)
+        f.write(f"--{boundary}\r\n".encode())
+        # A part without payload serializes to its headers and the blank line
+        f.write(part.as_bytes(policy=SMTP_POLICY))
+
+        with open(path, "rb") as source:
+            while chunk := source.read(ENCODE_CHUNK_SIZE):
+                f.write(base64.encodebytes(chunk).replace(b"\n", b"\r\n"))
+
+    def write_message(self, f, msg, attachments):
+        """Write msg (headers and text body) plus streamed attachments as CRLF MIME"""
+        if not attachments:
+            f.write(msg.as_bytes(policy=SMTP_POLICY))
+            return
+
+        boundary = f"==============={uuid.uuid4().hex}=="
+        msg.make_mixed()
+        msg.set_boundary(boundary)
+        head = msg.as_bytes(policy=SMTP_POLICY)
+        # Everything up to the closing delimiter; the attachments go there
+        f.write(head[:head.rindex(f"--{boundary}--".encode())])
+        for attachment in attachments:
+            self.write_attachment(f, boundary, **attachment)
+        f.write(f"\r\n--{boundary}--\r\n".encode())
+
+    def enqueue(self, msg, recipients, attachments=()):
+        """Spool a message for delivery to the given recipients and return its id
+
+        `attachments` are dicts with path, maintype, subtype and filename;
+        their files are encoded into the spool in chunks rather than being
+        loaded into the message in memory.
+        """
+        os.makedirs(self.spool_dir, exist_ok=True)
+        message_id = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+
+        # The message is written first: a state file without its .eml is
+        # never created, so a crash leaves at most an orphan message file
+        with open(self.path(message_id, "eml"), "wb") as f:
+            self.write_message(f, msg, list(attachments))
+        self.write_entry({
+            "id": message_id,
+            "from": msg["From"],
+            "recipients": list(recipients),
+            "subject": msg["Subject"],
+            "attempts": 0,
+            "next_attempt": time.time(),
+            "last_error": None,
+        })
+
+        logger.info(f"Queued email {message_id} for {len(recipients)} recipient(s)")
+        self.start()
+        self.wakeup.set()
+        return message_id
+
+    def pending(self):
+        """State of every spooled message, oldest first"""
+        try:
+            names = sorted(name for name in os.listdir(self.spool_dir) if name.endswith(".json"))
+        except FileNotFoundError:
+            return []
+
+        entries = []
+        for name in names:
+            try:
+                with open(os.path.join(self.spool_dir, name)) as f:
+                    entries.append(json.load(f))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable spool entry {name}: {e}")
+        return entries
+
+    def remove(self, entry, destination=None):
+        """Delete a message from the spool, or move it to `destination`"""
+        for suffix in ("json", "eml"):
+            path = self.path(entry["id"], suffix)
+            try:
+                if destination:
+                    os.makedirs(destination, exist_ok=True)
+                    os.replace(path, os.path.join(destination, os.path.basename(path)))
+                else:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def retry_later(self, entry, error):
+        """Schedule another attempt with exponential backoff, or give up"""
+        entry["attempts"] += 1
+        entry["last_error"] = error
+        if entry["attempts"] >= self.max_attempts:
+            logger.error(f"Giving up on email {entry['id']} after {entry['attempts']} attempts: {error}")
+            self.write_entry(entry)
+            self.remove(entry, self.failed_dir)
+            return
+
+        delay = min(self.backoff * 2 ** (entry["attempts"] - 1), self.backoff_max)
+        entry["next_attempt"] = time.time() + delay
+        self.write_entry(entry)
+        logger.warning(f"Email {entry['id']} failed (attempt {entry['attempts']}), "
+                       f"retrying in {delay:g}s: {error}")
+
+    def send_spooled(self, smtp, entry):
+        """Send a spooled message file, streaming it line by line.
+
+        Same protocol steps and errors as smtplib's sendmail, which needs
+        the whole message in memory. Returns the refused recipients.
+        """
+        smtp.ehlo_or_helo_if_needed()
+        code, response = smtp.mail(entry["from"])
+        if code != 250:
+            smtp.rset()
+            raise smtplib.SMTPSenderRefused(code, response, entry["from"])
+
+        refused = {}
+        for address in entry["recipients"]:
+            code, response = smtp.rcpt(address)
+            if code not in (250, 251):
+                refused[address] = (code, response)
+        if len(refused) == len(entry["recipients"]):
+            smtp.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+
+        smtp.putcmd("data")
+        code, response = smtp.getreply()
+        if code != 354:
+            smtp.rset()
+            raise smtplib.SMTPDataError(code, response)
+
+        with open(self.path(entry["id"], "eml"), "rb") as f:
+            buffer = []
+            buffered = 0
+            line = b"\r\n"
+            for line in f:
+                # Dot-stuffing, as in smtplib.quotedata
+                if line.startswith(b"."):
+                    line = b"." + line
+                buffer.append(line)
+                buffered += len(line)
+                if buffered >= SEND_BUFFER_SIZE:
+                    smtp.send(b"".join(buffer))
+                    buffer = []
+                    buffered = 0
+            if not line.endswith(b"\r\n"):
+                buffer.append(b"\r\n")
+            buffer.append(b".\r\n")
+            smtp.send(b"".join(buffer))
+
+        code, response = smtp.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, response)
+        return refused
+
+    def deliver(self, entry):
+        """Try to send one spooled message to its pending recipients"""
+        if not os.path.exists(self.path(entry["id"], "eml")):
+            logger.error(f"Message file of email {entry['id']} is missing, dropping it")
+            self.remove(entry)
+            return
+
+        start = time.perf_counter()
+        try:
+            smtp = self.session.connect()
+            refused = self.send_spooled(smtp, entry)
+        except smtplib.SMTPRecipientsRefused as e:
+            refused = e.recipients
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code >= 500:
+                # Permanent rejection of the whole message; retrying cannot help
+                entry["last_error"] = f"{e.smtp_code} {e.smtp_error!r}"
+                logger.error(f"Email {entry['id']} rejected: {entry['last_error']}")
+                self.write_entry(entry)
+                self.remove(entry, self.failed_dir)
+            else:
+                self.retry_later(entry, f"{e.smtp_code} {e.smtp_error!r}")
+            return
+        except (smtplib.SMTPException, OSError) as e:
+            self.session.close()
+            self.retry_later(entry, str(e))
+            return
+
+        # Recipients refused with a 4xx code are retried, 5xx ones are dropped
+        for address, (code, message) in refused.items():
+            if code >= 500:
+                logger.error(f"Recipient {address} rejected for email {entry['id']}: {code} {message!r}")
+        retry = [address for address, (code, _) in refused.items() if code < 500]
+        delivered = len(entry["recipients"]) - len(refused)
+        if delivered:
+            logger.info(f"Email {entry['id']} delivered to {delivered} recipient(s) "
+                        f"in {time.perf_counter() - start:.2f}s")
+
+        if retry:
+            entry["recipients"] = retry
+            self.retry_later(entry, f"{len(retry)} recipient(s) temporarily refused")
+        else:
+            self.remove(entry)
+
+    def run(self):
+        """Worker loop: deliver due messages, then sleep until the next one is due"""
+        while not self.stopping.is_set():
+            self.wakeup.clear()
+            entries = self.pending()
+            now = time.time()
+            due = [entry for entry in entries if entry["next_attempt"] <= now]
+            if due:
+                self.idle.clear()
+                for entry in due:
+                    if self.stopping.is_set():
+                        break
+                    self.deliver(entry)
+                continue
+
+            self.idle.set()
+            timeout = self.session.idle_timeout
+            if entries:
+                timeout = min(timeout, min(entry["next_attempt"] for entry in entries) - now)
+            self.wakeup.wait(max(timeout, 0.01))
+            self.session.close_if_idle()
+
+        self.session.close()
+
+    def start(self):
+        """Start the delivery thread (also picks up mail spooled by earlier runs)"""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.stopping.clear()
+                self.thread = threading.Thread(target=self.run, name="email-queue", daemon=True)
+                self.thread.start()
+
+    def drain(self, timeout=None):
+        """Wait until no message is due for delivery; True if the spool is empty"""
+        self.start()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            # Force a fresh scan, so an idle flag from before the call is not trusted
+            self.idle.clear()
+            self.wakeup.set()
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            if not self.idle.wait(remaining):
+                break
+            now = time.time()
+            if not any(entry["next_attempt"] <= now for entry in self.pending()):
+                break
+        return not self.pending()
+
+    def stop(self, timeout=None):
+        """Stop the delivery thread after its current message"""
+        self.stopping.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+
+def get_email_queue(email_config, spool_dir=EMAIL_SPOOL_DIR):
+    """Return the process-wide email queue for a mail configuration and spool"""
+    key = (os.getpid(), spool_dir, tuple(sorted(email_config.items())))
+    with _queues_lock:
+        if key not in _queues:
+            _queues[key] = EmailQueue(email_config, spool_dir)
+        return _queues[key]
@@ -1,33 +1,111 @@
-import smtplib
 from email.message import EmailMessage
 from email.utils import formatdate
 import os
+import tempfile
+import zipfile
 from datetime import date
-from config import EMAIL_CONFIG
+from config import EMAIL_CONFIG, EMAIL_COMPRESS_MIN_BYTES, EMAIL_ATTACHMENT_MAX_BYTES
+from email_queue import get_email_queue
+from report_generator import ReportGenerator
+from instrumentation import instrumented, annotate
 import logging
 
 logger = logging.getLogger(__name__)
 
+# MIME types of the report formats
+ATTACHMENT_TYPES = {
+    ".xlsx": ("application", "vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    ".pdf": ("application", "pdf"),
+    ".zip": ("application", "zip"),
+}
+# Formats that are already deflate-compressed and gain nothing from zipping
+COMPRESSED_EXTENSIONS = {".xlsx", ".zip", ".gz"}
+
 class EmailSender:
     def __init__(self):
         self.email_config = EMAIL_CONFIG
+        self.recipients = self.parse_recipients(self.email_config['to_email'])
+        self.queue = get_email_queue(self.email_config)
+        self.compress_min_bytes = EMAIL_COMPRESS_MIN_BYTES
+        self.attachment_max_bytes = EMAIL_ATTACHMENT_MAX_BYTES
+
+    def parse_recipients(self, recipients):
+        """Accept a comma-separated string or a list of addresses"""
+        if isinstance(recipients, str):
+            recipients = recipients.split(",")
+        return [address.strip() for address in recipients if address and address.strip()]
+
+    def attachment(self, path, filename=None):
+        """Describe a file for EmailQueue.enqueue"""
+        filename = filename or os.path.basename(path)
+        maintype, subtype = ATTACHMENT_TYPES.get(
+            os.path.splitext(filename)[1].lower(), ("application", "octet-stream"))
+        return {"path": path, "maintype": maintype, "subtype": subtype, "filename": filename}
+
+    def compress(self, path, workdir):
+        """Zip a file into workdir, streaming it through zipfile"""
+        zip_path = os.path.join(workdir, f"{os.path.basename(path)}.zip")
+        with zipfile.ZipFile(zip_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.write(path, arcname=os.path.basename(path))
+        return zip_path
+
+    def prepare_attachment(self, path, workdir, summary=None, variant=None, report_date=None):
+        """Pick what to attach for a report file: itself, a zip of it, or a summary-only variant
+
+        Returns (attachment or None, note for the email body or None).
+        """
+        name = os.path.basename(path)
+        size = os.path.getsize(path)
+        if size >= self.compress_min_bytes and os.path.splitext(path)[1].lower() not in COMPRESSED_EXTENSIONS:
+            zip_path = self.compress(path, workdir)
+            if os.path.getsize(zip_path) < size:
+                path, size = zip_path, os.path.getsize(zip_path)
 
-    def send_report(self, excel_file_path=None, pdf_file_path=None):
-        """Send daily report via email with attachments"""
-        today = date.today().strftime("%Y-%m-%d")
+        if size <= self.attachment_max_bytes:
+            return self.attachment(path), None
+
+        note = f"{name} ({size / 1024 ** 2:.1f} MB) is too large to email; it is kept on the report server"
+        if path.endswith(".xlsx") and summary:
+            summary_file = ReportGenerator(workdir).generate_excel_report(None, summary, summary_only=True,
+                                                                          variant=variant, report_date=report_date)
+            if summary_file:
+                logger.info(f"Attaching summary-only variant of {name}")
+                return self.attachment(summary_file), f"{note}. A summary-only version is attached"
+        logger.warning(f"Not attaching {name}: {size} bytes exceeds the attachment limit")
+        return None, note
+
+    @instrumented()
+    def send_report(self, excel_file_path=None, pdf_file_path=None, recipients=None, summary=None, variant=None,
+                    report_date=None):
+        """Queue the daily report with attachments for delivery.
+
+        Returns as soon as the message is spooled; the email queue's worker
+        sends it in the background and retries failures. `recipients`
+        overrides the configured TO_EMAIL list. Attachments are streamed
+        into the spool, and reports above the size limit are replaced by a
+        summary-only variant built from `summary`. `variant` (e.g. a city)
+        is named in the subject, with `report_date` (default today).
+        """
+        today = (report_date or date.today()).strftime("%Y-%m-%d")
+        recipients = self.parse_recipients(recipients) if recipients else self.recipients
+        if not recipients:
+            logger.error("No email recipients configured")
+            return False
 
         try:
             msg = EmailMessage()
-            msg["Subject"] = f"Daily Bakery Sales Report - {today}"
+            title = f"Daily Bakery Sales Report - {variant}" if variant else "Daily Bakery Sales Report"
+            msg["Subject"] = f"{title} - {today}"
             msg["From"] = self.email_config['email_user']
-            msg["To"] = self.email_config['to_email']
+            msg["To"] = ", ".join(recipients)
             msg["Date"] = formatdate(localtime=True)
 
             # Email body
-            body = """
+            for_variant = f" for {variant}" if variant else ""
+            body = f"""
             Hello,
 
-            Please find attached the daily bakery sales report.
+            Please find attached the daily bakery sales report{for_variant}.
 
             Key highlights:
             • Revenue and profit analysis
@@ -38,41 +116,31 @@ class EmailSender:
             Bakery Analytics System
             """
 
-            msg.set_content(body)
-
-            # Attach Excel file
-            if excel_file_path and os.path.exists(excel_file_path):
-                with open(excel_file_path, "rb") as f:
-                    file_data = f.read()
-                    msg.add_attachment(
-                        file_data,
-                        maintype="application",
-                        subtype="vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        filename=os.path.basename(excel_file_path)
-                    )
-
-            # Attach PDF file
-            if pdf_file_path and os.path.exists(pdf_file_path):
-                with open(pdf_file_path, "rb") as f:
-                    file_data = f.read()
-                    msg.add_attachment(
-                        file_data,
-                        maintype="application",
-                        subtype="pdf",
-                        filename=os.path.basename(pdf_file_path)
-                    )
-
-            # Send email
-            with smtplib.SMTP(self.email_config['smtp_server'], self.email_config['smtp_port']) as smtp:
-                smtp.starttls()
-                smtp.login(self.email_config['email_user'], self.email_config['email_password'])
-                smtp.send_message(msg)
-
-            logger.info("Report emailed successfully!")
-            print("Report emailed successfully!")
+            # Zips and summary variants only live until they are encoded into the spool
+            with tempfile.TemporaryDirectory() as workdir:
+                attachments = []
+                notes = []
+                for path in (excel_file_path, pdf_file_path):
+                    if path and os.path.exists(path):
+                        attachment, note = self.prepare_attachment(path, workdir, summary, variant, report_date)
+                        if attachment:
+                            attachments.append(attachment)
+                        if note:
+                            notes.append(note)
+
+                if notes:
+                    body += "\n" + "\n".join(f"Note: {note}." for note in notes) + "\n"
+                msg.set_content(body)
+                annotate(bytes=sum(os.path.getsize(attachment["path"]) for attachment in attachments))
+
+                # Spool for the background worker
+                self.queue.enqueue(msg, recipients, attachments)
+
+            logger.info("Report queued for email delivery")
+            print("Report queued for email delivery")
             return True
 
         except Exception as e:
-            logger.error(f"Error sending email: {e}")
-            print(f"Error sending email: {e}")
+            logger.error(f"Error queueing email: {e}")
+            print(f"Error queueing email: {e}")
             return False
\ No newline at end of file
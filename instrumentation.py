@@ -0,0 +1,208 @@
+# instrumentation.py
+import cProfile
+import functools
+import json
+import logging
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+from config import METRICS_ENABLED, METRICS_LOG_PATH, METRICS_LOG_MAX_BYTES, PROFILE_MODE, PROFILES_DIR
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_write_lock = threading.Lock()
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current_rss_mb():
+    """Resident set size of this process right now in MB"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except OSError:
+        # No /proc (e.g. macOS): the lifetime peak is the best available
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 ** 2 if peak > 1 << 32 else peak / 1024
+
+
+def rss_high_water_mb():
+    """Peak RSS since the last reset_rss_high_water() in MB (None without /proc)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_rss_high_water():
+    """Restart the peak RSS from the current RSS (Linux); False if unsupported"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def write_record(record):
+    """Append a stage record to the metrics log as one JSON line, rotating a full log"""
+    try:
+        os.makedirs(os.path.dirname(METRICS_LOG_PATH) or ".", exist_ok=True)
+        line = json.dumps(record, default=str)
+        with _write_lock:
+            if METRICS_LOG_MAX_BYTES and os.path.exists(METRICS_LOG_PATH) \
+                    and os.path.getsize(METRICS_LOG_PATH) >= METRICS_LOG_MAX_BYTES:
+                os.replace(METRICS_LOG_PATH, f"{METRICS_LOG_PATH}.1")
+            with open(METRICS_LOG_PATH, "a") as f:
+                f.write(line + "\n")
+    except Exception as e:
+        logger.warning(f"Could not write stage metrics: {e}")
+
+
+def annotate(**fields):
+    """Add fields (e.g. rows, bytes) to the record of the innermost running stage"""
+    stack = _stack()
+    if stack:
+        stack[-1]["record"].update(fields)
+
+
+def describe_result(record, result):
+    """Fill in row counts / output sizes from a stage's return value"""
+    if isinstance(result, pd.DataFrame):
+        record.setdefault("rows", len(result))
+    elif isinstance(result, str) and os.path.isfile(result):
+        record.setdefault("bytes", os.path.getsize(result))
+
+
+def profile_path(name, suffix):
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(PROFILES_DIR, f"{name}-{timestamp}-{os.getpid()}.{suffix}")
+
+
+@contextmanager
+def stage(name):
+    """Measure a pipeline stage and log it as a JSON line.
+
+    Records wall and CPU time, the RSS at the end of the stage and its change
+    over the stage (rss_delta_mb, memory the stage left allocated), its peak
+    RSS and how far that is above the RSS at its start (peak_rss_mb,
+    peak_rss_delta_mb), plus any fields set through the yielded dict or
+    annotate(). The peak is the kernel's RSS high-water mark, restarted at
+    each stage; where it cannot be restarted (e.g. macOS) it is the larger
+    of the start and end RSS. Stages running at once in several threads share the mark,
+    so their peaks may be attributed to each other. With PROFILE_MODE
+    containing 'tracemalloc' the stage's peak traced allocation above its
+    start (peak_traced_mb) is recorded too, and the outermost stage of a
+    process writes the allocation sites still live when it ends; with
+    'cprofile' the outermost stage writes a .prof file to PROFILES_DIR.
+    """
+    if not METRICS_ENABLED:
+        yield {}
+        return
+
+    stack = _stack()
+    outermost = not stack
+    record = {"stage": name, "pid": os.getpid()}
+    if stack:
+        record["parent"] = stack[-1]["record"]["stage"]
+    frame = {"record": record, "peak": 0, "rss_peak": 0.0}
+
+    profiler = None
+    if outermost and "cprofile" in PROFILE_MODE:
+        profiler = cProfile.Profile()
+    tracing = "tracemalloc" in PROFILE_MODE
+    if tracing:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        tracemalloc.reset_peak()
+        frame["start"] = frame["peak"] = current
+
+    # Like the traced peak: the enclosing stage keeps the high-water mark
+    # reached so far, then the mark restarts for this stage
+    high_water = rss_high_water_mb()
+    frame["high_water"] = reset_rss_high_water()
+    if stack and frame["high_water"]:
+        stack[-1]["rss_peak"] = max(stack[-1]["rss_peak"], high_water)
+
+    stack.append(frame)
+    record["timestamp"] = datetime.now().isoformat(timespec="milliseconds")
+    rss_start = current_rss_mb()
+    frame["rss_peak"] = rss_start
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    if profiler:
+        profiler.enable()
+
+    status = "ok"
+    try:
+        yield record
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+        record["wall_s"] = round(time.perf_counter() - wall_start, 4)
+        record["cpu_s"] = round(time.process_time() - cpu_start, 4)
+        rss_end = current_rss_mb()
+        record["rss_mb"] = round(rss_end, 1)
+        record["rss_delta_mb"] = round(rss_end - rss_start, 1)
+        high_water = rss_high_water_mb() if frame["high_water"] else None
+        frame["rss_peak"] = max(frame["rss_peak"], rss_end, high_water or 0)
+        record["peak_rss_mb"] = round(frame["rss_peak"], 1)
+        record["peak_rss_delta_mb"] = round(frame["rss_peak"] - rss_start, 1)
+        record["status"] = status
+        stack.pop()
+        if stack:
+            stack[-1]["rss_peak"] = max(stack[-1]["rss_peak"], frame["rss_peak"])
+
+        if tracing:
+            frame["peak"] = max(frame["peak"], tracemalloc.get_traced_memory()[1])
+            record["peak_traced_mb"] = round((frame["peak"] - frame["start"]) / 1024 ** 2, 2)
+            if stack:
+                stack[-1]["peak"] = max(stack[-1]["peak"], frame["peak"])
+            else:
+                top = tracemalloc.take_snapshot().statistics("lineno")[:25]
+                with open(profile_path(name, "tracemalloc.txt"), "w") as f:
+                    f.write("\n".join(str(stat) for stat in top))
+                tracemalloc.stop()
+        if profiler:
+            profiler.dump_stats(profile_path(name, "prof"))
+
+        write_record(record)
+
+
+def instrumented(name=None):
+    """Decorator recording each call of a function as a stage"""
+    def decorator(func):
+        if not METRICS_ENABLED:
+            return func
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(stage_name) as record:
+                result = func(*args, **kwargs)
+                describe_result(record, result)
+                return result
+        return wrapper
+    return decorator
@@ -0,0 +1,161 @@
+# pdf_layout.py
+import functools
+import math
+import pandas as pd
+from reportlab.platypus import PageTemplate, Frame, Flowable, Paragraph, Spacer, Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+
+# Styles, page template and the transaction appendix of the PDF report. Kept
+# out of report_generator so reportlab is only imported when a PDF is made
+
+# Transaction appendix layout (points)
+APPENDIX_FONT_SIZE = 7
+APPENDIX_ROW_HEIGHT = 10
+
+
+@functools.lru_cache(maxsize=None)
+def pdf_styles():
+    """Paragraph and table styles shared by every PDF, built once per process"""
+    sample = getSampleStyleSheet()
+    table = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ])
+    return {
+        "title": sample["Title"],
+        "heading": sample["Heading2"],
+        "normal": sample["Normal"],
+        "footer": ParagraphStyle("Footer", parent=sample["Normal"], fontSize=8, textColor=colors.grey),
+        "table": table,
+        "windows_table": TableStyle([('FONTSIZE', (0, 0), (-1, -1), 8)], parent=table),
+        # Fixed-height rows, so the appendix knows how many fit on a page
+        "appendix_table": TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), APPENDIX_FONT_SIZE),
+            ('LEADING', (0, 0), (-1, -1), APPENDIX_FONT_SIZE + 1),
+            ('TOPPADDING', (0, 0), (-1, -1), 1),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+            ('LINEBELOW', (0, 0), (-1, -1), 0.25, colors.grey),
+        ]),
+    }
+
+
+def draw_page_footer(canvas, doc):
+    """Report title and page number at the bottom of every page"""
+    canvas.saveState()
+    style = pdf_styles()["footer"]
+    canvas.setFont(style.fontName, style.fontSize)
+    canvas.setFillColor(style.textColor)
+    canvas.drawString(doc.leftMargin, doc.bottomMargin / 2, doc.title or "")
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, doc.bottomMargin / 2, f"Page {doc.page}")
+    canvas.restoreState()
+
+
+@functools.lru_cache(maxsize=None)
+def pdf_page_templates():
+    """Page template shared by every PDF: one frame inside 1 inch margins, with a footer"""
+    width, height = letter
+    frame = Frame(inch, inch, width - 2 * inch, height - 2 * inch, id="body")
+    return [PageTemplate(id="report", frames=[frame], onPage=draw_page_footer)]
+
+
+class AppendixRows:
+    """Lookahead cursor over formatted rows of an iterable of DataFrame chunks"""
+
+    def __init__(self, chunks, max_rows):
+        self.rows = self.iter_rows(chunks)
+        self.max_rows = max_rows
+        self.header = None
+        self.emitted = 0
+        self.next_row = None
+        self.started = False
+
+    def iter_rows(self, chunks):
+        for chunk in chunks:
+            if self.header is None:
+                self.header = [str(column) for column in chunk.columns]
+            for row in chunk.itertuples(index=False, name=None):
+                yield [format_cell(value) for value in row]
+
+    def peek(self):
+        if not self.started:
+            self.next_row = next(self.rows, None)
+            self.started = True
+        return self.next_row
+
+    def has_more(self):
+        return self.emitted < self.max_rows and self.peek() is not None
+
+    def truncated(self):
+        return self.emitted >= self.max_rows and self.peek() is not None
+
+    def take(self, count):
+        """Up to `count` rows, advancing the cursor"""
+        rows = []
+        while len(rows) < count and self.has_more():
+            rows.append(self.next_row)
+            self.emitted += 1
+            self.next_row = next(self.rows, None)
+        return rows
+
+
+def format_cell(value):
+    """Appendix cell text for a raw data value"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d")
+    return str(value)
+
+
+class TransactionAppendix(Flowable):
+    """Paginated table of raw rows that materializes one page at a time
+
+    Platypus asks a flowable that does not fit to split itself; each split
+    pulls just enough rows from the cursor to fill the remaining frame and
+    returns them as a small Table followed by a new appendix for the rest.
+    The complete table is never built, so memory stays bounded however many
+    rows are appended.
+    """
+
+    def __init__(self, cursor):
+        super().__init__()
+        self.cursor = cursor
+
+    def wrap(self, available_width, available_height):
+        if not self.cursor.has_more():
+            return available_width, 0
+        # Always taller than the frame, so platypus calls split()
+        return available_width, available_height + APPENDIX_ROW_HEIGHT
+
+    def split(self, available_width, available_height):
+        # One row is the repeated header
+        count = int(available_height // APPENDIX_ROW_HEIGHT) - 1
+        if count < 1:
+            return []
+
+        rows = self.cursor.take(count)
+        columns = len(self.cursor.header)
+        table = Table([self.cursor.header] + rows, colWidths=[available_width / columns] * columns,
+                      rowHeights=APPENDIX_ROW_HEIGHT, style=pdf_styles()["appendix_table"])
+        if self.cursor.has_more():
+            return [table, TransactionAppendix(self.cursor)]
+        if self.cursor.truncated():
+            note = f"First {self.cursor.emitted:,} rows shown; the Excel report has all of them."
+            return [table, Spacer(1, 6), Paragraph(note, pdf_styles()["footer"])]
+        return [table]
+
+    def draw(self):
+        pass
@@ -0,0 +1,165 @@
+# report_cache.py
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+import pandas as pd
+from config import REPORTS_DIR, REPORT_CACHE, REPORT_RETENTION_DAYS, REPORT_MAX_BYTES, PDF_APPENDIX_MAX_ROWS
+from instrumentation import instrumented, annotate
+
+logger = logging.getLogger(__name__)
+
+# Bump when the report layout changes, so earlier reports are not reused
+REPORT_LAYOUT_VERSION = 1
+
+# Metadata is kept next to each report file as <report file>.meta.json
+METADATA_SUFFIX = ".meta.json"
+
+REPORT_FILE_PATTERN = "daily_sales_report_*"
+
+
+class ReportCache:
+    """Reuse report files whose input data is unchanged, and evict old ones
+
+    Each report gets a metadata file with the fingerprint of its inputs. A
+    report is regenerated only when the fingerprint differs or the file is
+    missing; the metadata also records whom it was emailed to, so a rerun
+    on unchanged data (e.g. a scheduler restart) does not send it again.
+    """
+
+    def __init__(self, reports_dir=None, enabled=REPORT_CACHE, retention_days=REPORT_RETENTION_DAYS,
+                 max_bytes=REPORT_MAX_BYTES):
+        self.reports_dir = reports_dir or REPORTS_DIR
+        self.enabled = enabled
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+
+    @instrumented("report_fingerprint")
+    def fingerprint(self, summary, windows=None, data=None, date_range=(None, None), variant=None):
+        """Hash of everything a report is built from
+
+        Covers the summary, the window summaries, the date range and, when
+        `data` is a DataFrame, every row. In streaming mode (no DataFrame)
+        the rows are represented by the summary's totals and counts.
+        """
+        digest = hashlib.sha256()
+        inputs = {
+            "layout": REPORT_LAYOUT_VERSION,
+            "appendix_rows": PDF_APPENDIX_MAX_ROWS,
+            "summary": summary,
+            "windows": windows,
+            "date_range": date_range,
+            "variant": variant,
+        }
+        digest.update(json.dumps(inputs, default=str, sort_keys=True).encode())
+        if isinstance(data, pd.DataFrame):
+            digest.update(",".join(map(str, data.columns)).encode())
+            digest.update(pd.util.hash_pandas_object(data, index=False).values.tobytes())
+            annotate(rows=len(data))
+        return digest.hexdigest()
+
+    def metadata_path(self, filename):
+        return f"{filename}{METADATA_SUFFIX}"
+
+    def read_metadata(self, filename):
+        try:
+            with open(self.metadata_path(filename)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_metadata(self, filename, metadata):
+        """Atomically replace the metadata file of a report"""
+        path = self.metadata_path(filename)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(metadata, f)
+        os.replace(tmp_path, path)
+
+    def lookup(self, filename, fingerprint):
+        """Return filename if it exists and was built from the same inputs, else None"""
+        if not self.enabled or fingerprint is None or not os.path.exists(filename):
+            return None
+        metadata = self.read_metadata(filename)
+        if metadata is None or metadata.get("fingerprint") != fingerprint:
+            return None
+        return filename
+
+    def store(self, filename, fingerprint, **details):
+        """Record the fingerprint of a freshly generated report"""
+        if not self.enabled or fingerprint is None or not filename:
+            return
+        try:
+            self.write_metadata(filename, {
+                "fingerprint": fingerprint,
+                "created": time.time(),
+                "bytes": os.path.getsize(filename),
+                "sent_to": None,
+                **details,
+            })
+        except Exception as e:
+            logger.warning(f"Could not write report metadata for {filename}: {e}")
+
+    def was_sent(self, filenames, recipients):
+        """Whether all these reports were already emailed to exactly these recipients"""
+        filenames = [filename for filename in filenames if filename]
+        if not self.enabled or not filenames:
+            return False
+        return all((self.read_metadata(filename) or {}).get("sent_to") == sorted(recipients)
+                   for filename in filenames)
+
+    def mark_sent(self, filenames, recipients):
+        for filename in filenames:
+            metadata = self.read_metadata(filename) if filename else None
+            if metadata is not None:
+                metadata["sent_at"] = time.time()
+                metadata["sent_to"] = sorted(recipients)
+                self.write_metadata(filename, metadata)
+
+    @instrumented("report_evict")
+    def evict(self, keep=()):
+        """Remove reports older than the retention period, then the oldest beyond the size budget
+
+        Files in `keep` (e.g. the reports of the current run) are never
+        removed. Returns the removed report files.
+        """
+        keep = {os.path.abspath(filename) for filename in keep if filename}
+        reports = []
+        for path in glob.glob(os.path.join(self.reports_dir, REPORT_FILE_PATTERN)):
+            if path.endswith(METADATA_SUFFIX) or path.endswith(".tmp"):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            reports.append((stat.st_mtime, stat.st_size, path))
+
+        oldest_allowed = time.time() - self.retention_days * 86400
+        removed = []
+        total = 0
+        # Newest first, so the size budget is spent on the most recent reports
+        for mtime, size, path in sorted(reports, reverse=True):
+            if os.path.abspath(path) not in keep:
+                too_old = self.retention_days > 0 and mtime < oldest_allowed
+                over_budget = self.max_bytes > 0 and total + size > self.max_bytes
+                if too_old or over_budget:
+                    self.remove(path)
+                    removed.append(path)
+                    continue
+            total += size
+
+        if removed:
+            logger.info(f"Evicted {len(removed)} old report files; {total / 1024 ** 2:.1f} MB of reports kept")
+        annotate(removed=len(removed), bytes=total)
+        return removed
+
+    def remove(self, filename):
+        for path in (filename, self.metadata_path(filename)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Could not remove {path}: {e}")
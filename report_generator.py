@@ -1,122 +1,304 @@
 # report_generator.py
 import pandas as pd
-import openpyxl
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from datetime import date
+from datetime import date, timedelta
 import os
-from config import REPORTS_DIR
+import re
+from config import REPORTS_DIR, CHUNK_SIZE, REPORT_WINDOWS, PDF_APPENDIX_MAX_ROWS
+from instrumentation import instrumented, annotate
+
+# Excel's sheet limit is 1,048,576 rows, one of which is the header
+EXCEL_MAX_DATA_ROWS = 1_048_575
+
+REPORT_TITLE = "Daily Bakery Sales Report"
 
 
 class ReportGenerator:
-    def __init__(self):
-        self.reports_dir = REPORTS_DIR
+    """Renders the Excel and PDF reports (openpyxl and reportlab are imported on first use)"""
+
+    # Output formats, the methods that render them and their file extensions
+    RENDERERS = {
+        "excel": "generate_excel_report",
+        "pdf": "generate_pdf_report",
+    }
+    EXTENSIONS = {
+        "excel": "xlsx",
+        "pdf": "pdf",
+    }
+
+    # Report windows ending on the report date, and how they are labelled
+    WINDOW_LABELS = {
+        "daily": "Day",
+        "weekly": "Last 7 days",
+        "mtd": "Month to date",
+    }
+
+    def __init__(self, reports_dir=None):
+        self.reports_dir = reports_dir or REPORTS_DIR
+        self.chunk_size = CHUNK_SIZE
+        self.windows = REPORT_WINDOWS
         self.ensure_directories()
 
     def ensure_directories(self):
         """Create necessary directories if they don't exist"""
         os.makedirs(self.reports_dir, exist_ok=True)
 
-    def generate_excel_report(self, data, summary):
-        """Generate Excel report with raw data and summary"""
-        today = date.today().strftime("%Y-%m-%d")
-        filename = f"{self.reports_dir}/daily_sales_report_{today}.xlsx"
+    def render(self, report_format, data, summary, windows=None, variant=None, report_date=None):
+        """Render a report in the given format; `variant` (e.g. a city) and `report_date` name the file"""
+        if report_format not in self.RENDERERS:
+            raise ValueError(f"Unknown report format: {report_format}")
+        return getattr(self, self.RENDERERS[report_format])(data, summary, windows=windows, variant=variant,
+                                                            report_date=report_date)
+
+    def needs_rows(self, report_format):
+        """Whether a format renders the raw rows; the others can be given data=None"""
+        return report_format != "pdf" or PDF_APPENDIX_MAX_ROWS > 0
+
+    def window_bounds(self, window, report_date):
+        """[start, end) dates of a report window ending on the report date"""
+        end = report_date + timedelta(days=1)
+        if window == "daily":
+            return report_date, end
+        if window == "weekly":
+            return report_date - timedelta(days=6), end
+        if window == "mtd":
+            return report_date.replace(day=1), end
+        raise ValueError(f"Unknown report window: {window}")
+
+    def windows_range(self, report_date):
+        """[start, end) dates covering all report windows"""
+        bounds = [self.window_bounds(window, report_date) for window in self.windows]
+        return min(start for start, _ in bounds), report_date + timedelta(days=1)
+
+    def summarize_windows(self, processor, report_date, daily):
+        """Summary of each report window, merged from per-day aggregates
+
+        `daily` is the caller's processor.get_daily_aggregates result covering
+        windows_range(report_date); no raw rows are read here.
+        """
+        windows = []
+        for window in self.windows:
+            start, end = self.window_bounds(window, report_date)
+            partial = processor.window_partial(daily, start, end)
+            windows.append({
+                "window": window,
+                "label": self.WINDOW_LABELS[window],
+                "start": start,
+                "end": end - timedelta(days=1),
+                "summary": processor.get_summary_from_partial(partial),
+            })
+        return windows
+
+    def window_rows(self, windows):
+        """Header and one row per report window for the windows tables"""
+        rows = [['Window', 'From', 'To', 'Revenue', 'Profit', 'Transactions', 'Top City', 'Top Product']]
+        for window in windows:
+            summary = window["summary"]
+            rows.append([
+                window["label"],
+                window["start"].isoformat(),
+                window["end"].isoformat(),
+                f"${summary.get('total_revenue', 0):.2f}",
+                f"${summary.get('total_profit', 0):.2f}",
+                str(summary.get('total_transactions', 0)),
+                summary.get('top_city', 'N/A'),
+                summary.get('top_product', 'N/A'),
+            ])
+        return rows
+
+    def report_path(self, extension, suffix="", variant=None, report_date=None):
+        """Path of a report file, e.g. reports/daily_sales_report_<date>_<variant><suffix>.pdf
+
+        The date is the day the report covers (default today).
+        """
+        label = (report_date or date.today()).strftime("%Y-%m-%d")
+        if variant:
+            suffix = "_" + re.sub(r"[^\w-]+", "_", str(variant)) + suffix
+        return f"{self.reports_dir}/daily_sales_report_{label}{suffix}.{extension}"
+
+    def report_filename(self, report_format, variant=None, report_date=None):
+        """Path render() writes a report format to"""
+        return self.report_path(self.EXTENSIONS[report_format], variant=variant, report_date=report_date)
+
+    def iter_chunks(self, data):
+        """Yield DataFrame chunks from a DataFrame or an iterable of chunks"""
+        if isinstance(data, pd.DataFrame):
+            for start in range(0, max(len(data), 1), self.chunk_size):
+                yield data.iloc[start:start + self.chunk_size]
+        else:
+            yield from data
+
+    def header_row(self, sheet, columns):
+        """Build a bold header row for a write-only sheet"""
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+        cells = []
+        for column in columns:
+            cell = WriteOnlyCell(sheet, value=str(column))
+            cell.font = Font(bold=True)
+            cells.append(cell)
+        return cells
+
+    def write_raw_data(self, workbook, data, max_rows=EXCEL_MAX_DATA_ROWS):
+        """Stream rows into Raw_Data sheets, starting a new sheet at Excel's row limit"""
+        sheet = None
+        sheet_rows = 0
+        sheet_count = 0
+        total_rows = 0
+
+        for chunk in self.iter_chunks(data):
+            if chunk.isna().values.any():
+                # Excel has no NaN; leave missing values as empty cells
+                chunk = chunk.astype(object).where(chunk.notna(), None)
+
+            rows = chunk.itertuples(index=False, name=None)
+            remaining = len(chunk)
+            while sheet is None or remaining:
+                if sheet is None or sheet_rows == max_rows:
+                    sheet_count += 1
+                    name = "Raw_Data" if sheet_count == 1 else f"Raw_Data_{sheet_count}"
+                    sheet = workbook.create_sheet(name)
+                    sheet.append(self.header_row(sheet, chunk.columns))
+                    sheet_rows = 0
+
+                batch = min(remaining, max_rows - sheet_rows)
+                for _ in range(batch):
+                    sheet.append(next(rows))
+                sheet_rows += batch
+                remaining -= batch
+                total_rows += batch
+
+        return total_rows
+
+    @instrumented()
+    def generate_excel_report(self, data, summary, summary_only=False, windows=None, variant=None,
+                              report_date=None):
+        """Generate Excel report with raw data and summary
+
+        The workbook is written in openpyxl's write-only mode, so rows are
+        streamed to disk in chunks instead of building the workbook in memory.
+        With summary_only the raw data sheets are left out (data is ignored).
+        Report windows from summarize_windows get a Windows sheet. `variant`
+        (e.g. a city) and `report_date` (default today) are added to the file name.
+        """
+        filename = self.report_path("xlsx", "_summary" if summary_only else "", variant, report_date)
 
         try:
-            with pd.ExcelWriter(filename, engine="openpyxl") as writer:
-                # Raw data sheet
-                data.to_excel(writer, sheet_name="Raw_Data", index=False)
-
-                # Summary sheet
-                summary_df = pd.DataFrame([summary])
-                summary_df.to_excel(writer, sheet_name="Summary", index=False)
-
-                # Analytics sheet with key metrics
-                analytics_data = {
-                    'Metric': ['Total Revenue', 'Total Profit', 'Average Unit Price', 'Top City', 'Top Product'],
-                    'Value': [
-                        f"${summary.get('total_revenue', 0):.2f}",
-                        f"${summary.get('total_profit', 0):.2f}",
-                        f"${summary.get('avg_unit_price', 0):.2f}",
-                        summary.get('top_city', 'N/A'),
-                        summary.get('top_product', 'N/A')
-                    ]
-                }
-                pd.DataFrame(analytics_data).to_excel(writer, sheet_name="Analytics", index=False)
+            import openpyxl
+            workbook = openpyxl.Workbook(write_only=True)
+
+            # Raw data sheet(s)
+            if not summary_only:
+                annotate(rows=self.write_raw_data(workbook, data))
+
+            # Summary sheet
+            sheet = workbook.create_sheet("Summary")
+            sheet.append(self.header_row(sheet, summary.keys()))
+            sheet.append(list(summary.values()))
 
+            # Analytics sheet with key metrics
+            analytics_data = [
+                ['Total Revenue', f"${summary.get('total_revenue', 0):.2f}"],
+                ['Total Profit', f"${summary.get('total_profit', 0):.2f}"],
+                ['Average Unit Price', f"${summary.get('avg_unit_price', 0):.2f}"],
+                ['Top City', summary.get('top_city', 'N/A')],
+                ['Top Product', summary.get('top_product', 'N/A')]
+            ]
+            sheet = workbook.create_sheet("Analytics")
+            sheet.append(self.header_row(sheet, ['Metric', 'Value']))
+            for row in analytics_data:
+                sheet.append(row)
+
+            if windows:
+                header, *rows = self.window_rows(windows)
+                sheet = workbook.create_sheet("Windows")
+                sheet.append(self.header_row(sheet, header))
+                for row in rows:
+                    sheet.append(row)
+
+            workbook.save(filename)
             print(f"Excel report saved as {filename}")
             return filename
         except Exception as e:
             print(f"Error generating Excel report: {e}")
             return None
 
-    def generate_pdf_report(self, data, summary):
-        """Generate PDF report with formatted content"""
-        today = date.today().strftime("%Y-%m-%d")
-        filename = f"{self.reports_dir}/daily_sales_report_{today}.pdf"
+    def pdf_story(self, summary, windows=None, title=REPORT_TITLE, report_date=None):
+        """Flowables of the report pages before the transaction appendix"""
+        from reportlab.platypus import Paragraph, Spacer, Table
+        from pdf_layout import pdf_styles
+        styles = pdf_styles()
+        label = (report_date or date.today()).strftime("%Y-%m-%d")
+        story = [
+            Paragraph(title, styles["title"]),
+            Spacer(1, 12),
+            Paragraph(f"Date: {label}", styles["normal"]),
+            Spacer(1, 12),
+            Paragraph("Key Performance Indicators", styles["heading"]),
+            Spacer(1, 6),
+        ]
 
-        try:
-            doc = SimpleDocTemplate(filename, pagesize=letter)
-            styles = getSampleStyleSheet()
-            story = []
-
-            # Title
-            title = Paragraph("Daily Bakery Sales Report", styles["Title"])
-            story.append(title)
-            story.append(Spacer(1, 12))
-
-            # Date
-            date_para = Paragraph(f"Date: {today}", styles["Normal"])
-            story.append(date_para)
-            story.append(Spacer(1, 12))
-
-            # Summary section
-            summary_title = Paragraph("Key Performance Indicators", styles["Heading2"])
-            story.append(summary_title)
-            story.append(Spacer(1, 6))
-
-            # Summary table
-            summary_data = [
-                ['Metric', 'Value'],
-                ['Total Revenue', f"${summary.get('total_revenue', 0):.2f}"],
-                ['Total Profit', f"${summary.get('total_profit', 0):.2f}"],
-                ['Average Unit Price', f"${summary.get('avg_unit_price', 0):.2f}"],
-                ['Top Performing City', summary.get('top_city', 'N/A')],
-                ['Most Profitable Product', summary.get('top_product', 'N/A')],
-                ['Total Transactions', str(summary.get('total_transactions', 0))]
-            ]
+        # Summary table
+        summary_data = [
+            ['Metric', 'Value'],
+            ['Total Revenue', f"${summary.get('total_revenue', 0):.2f}"],
+            ['Total Profit', f"${summary.get('total_profit', 0):.2f}"],
+            ['Average Unit Price', f"${summary.get('avg_unit_price', 0):.2f}"],
+            ['Top Performing City', summary.get('top_city', 'N/A')],
+            ['Most Profitable Product', summary.get('top_product', 'N/A')],
+            ['Total Transactions', str(summary.get('total_transactions', 0))]
+        ]
+        story += [Table(summary_data, style=styles["table"]), Spacer(1, 12)]
 
-            table = Table(summary_data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-
-            story.append(table)
-            story.append(Spacer(1, 12))
-
-            # Insights section
-            insights_title = Paragraph("Business Insights", styles["Heading2"])
-            story.append(insights_title)
-            story.append(Spacer(1, 6))
-
-            insights = [
-                f"• {summary.get('top_city', 'N/A')} generates the highest revenue",
-                f"• {summary.get('top_product', 'N/A')} is the most profitable product",
-                f"• Consider promotions in {summary.get('lowest_margin_city', 'N/A')} to improve margins"
+        # Daily / weekly / month-to-date windows
+        if windows:
+            story += [
+                Paragraph("Sales Windows", styles["heading"]),
+                Spacer(1, 6),
+                Table(self.window_rows(windows), style=styles["windows_table"]),
+                Spacer(1, 12),
             ]
 
-            for insight in insights:
-                story.append(Paragraph(insight, styles["Normal"]))
-                story.append(Spacer(1, 3))
+        # Insights section
+        story += [Paragraph("Business Insights", styles["heading"]), Spacer(1, 6)]
+        insights = [
+            f"• {summary.get('top_city', 'N/A')} generates the highest revenue",
+            f"• {summary.get('top_product', 'N/A')} is the most profitable product",
+            f"• Consider promotions in {summary.get('lowest_margin_city', 'N/A')} to improve margins"
+        ]
+        for insight in insights:
+            story += [Paragraph(insight, styles["normal"]), Spacer(1, 3)]
+        return story
+
+    @instrumented()
+    def generate_pdf_report(self, data, summary, windows=None, variant=None, title=None,
+                            appendix_rows=None, report_date=None):
+        """Generate PDF report with formatted content
+
+        Styles and the page template are built once per process and shared
+        by every report. `variant` (e.g. a city) is added to the file name
+        and title, and `report_date` (default today) to the file name and the
+        date line. With appendix_rows > 0 (default PDF_APPENDIX_MAX_ROWS) the
+        first that many rows of `data` - a DataFrame or an iterable of
+        chunks - are appended as a paginated transaction table, laid out one
+        page at a time.
+        """
+        filename = self.report_path("pdf", variant=variant, report_date=report_date)
+        title = title or (f"{REPORT_TITLE} - {variant}" if variant else REPORT_TITLE)
+        appendix_rows = PDF_APPENDIX_MAX_ROWS if appendix_rows is None else appendix_rows
+
+        try:
+            from reportlab.platypus import BaseDocTemplate, PageBreak, Paragraph, Spacer
+            from reportlab.lib.pagesizes import letter
+            from pdf_layout import AppendixRows, TransactionAppendix, pdf_page_templates, pdf_styles
+            doc = BaseDocTemplate(filename, pagesize=letter, pageTemplates=pdf_page_templates(), title=title)
+            story = self.pdf_story(summary, windows, title, report_date)
+            if appendix_rows > 0 and data is not None:
+                story += [
+                    PageBreak(),
+                    Paragraph("Transaction Appendix", pdf_styles()["heading"]),
+                    Spacer(1, 6),
+                    TransactionAppendix(AppendixRows(self.iter_chunks(data), appendix_rows)),
+                ]
 
             doc.build(story)
             print(f"PDF report saved as {filename}")
@@ -124,4 +306,19 @@ class ReportGenerator:
 
         except Exception as e:
             print(f"Error generating PDF report: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    @instrumented()
+    def generate_pdf_batch(self, variants, appendix_rows=None, report_date=None):
+        """Render one PDF per variant in this process, e.g. per city or store
+
+        `variants` maps a variant name to (data, summary, windows). All
+        documents share the cached styles and page template. Returns
+        {name: filename} (filename None for a failed variant).
+        """
+        annotate(variants=len(variants))
+        return {
+            name: self.generate_pdf_report(data, summary, windows, variant=name, appendix_rows=appendix_rows,
+                                           report_date=report_date)
+            for name, (data, summary, windows) in variants.items()
+        }
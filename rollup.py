@@ -0,0 +1,414 @@
+# rollup.py
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from config import ROLLUP_BACKEND, ROLLUP_TABLE, ROLLUP_DB_PATH, ROLLUP_REFRESH_SECONDS
+from data_processor import DataProcessor, GROUP_KEYS, PARTIAL_AGGREGATIONS_SQL, SALES_SCHEMA
+from instrumentation import instrumented, annotate
+
+logger = logging.getLogger(__name__)
+
+# Measures stored per (day, city, product), in PARTIAL_AGGREGATIONS_SQL order.
+# They are all sums and counts, so new rows are folded in by addition
+ROLLUP_COLUMNS = {
+    "units_sold": "BIGINT",
+    "revenue": "DOUBLE PRECISION",
+    "profit": "DOUBLE PRECISION",
+    "unit_price_sum": "DOUBLE PRECISION",
+    "unit_price_count": "BIGINT",
+    "margin_sum": "DOUBLE PRECISION",
+    "margin_count": "BIGINT",
+    "transactions": "BIGINT",
+}
+
+# Relative difference check_consistency tolerates: float sums depend on the
+# order in which rows were added
+CONSISTENCY_TOLERANCE = 1e-9
+
+# State row of the local rollup (the PostgreSQL one is keyed by sales table)
+LOCAL_SOURCE = "local"
+
+# When each rollup was last refreshed by this process, by (backend setting,
+# sales table, local path); reads use it to refresh at most once per interval
+last_refreshed = {}
+
+
+class SalesRollup:
+    """Per-(day, city, product) rollup of the sales table, maintained incrementally
+
+    Each cell holds the partial_aggregate sums and counts, so KPI totals,
+    city/product breakdowns and any range of days are sums over a few cells
+    instead of scans over the transactions. A refresh aggregates only the
+    sales added since the previous one and adds them to the existing cells
+    with an upsert.
+
+    The rollup lives next to the sales table in PostgreSQL, where the sales
+    above the stored watermark are aggregated by the database. The local
+    stand-in is a SQLite file built from the snapshot (new part files only)
+    or the backup. Rows without a sale date are not part of the rollup, so
+    totals read from it (the dashboard cube, get_summary_stats) leave them
+    out.
+
+    Writers call refresh(); read() only folds in new sales when this process
+    has not refreshed the rollup for `refresh_seconds`, so dashboard reads do
+    not take the lock or write the store on every rerun.
+    """
+
+    def __init__(self, processor=None, backend=None, local_path=None, refresh_seconds=ROLLUP_REFRESH_SECONDS):
+        self.processor = processor or DataProcessor()
+        self.backend = backend or ROLLUP_BACKEND
+        self.local_path = local_path or ROLLUP_DB_PATH
+        self.table = ROLLUP_TABLE
+        self.state_table = f"{ROLLUP_TABLE}_state"
+        self.date_column = self.processor.date_column
+        self.key_columns = [self.date_column, *GROUP_KEYS]
+        self.refresh_seconds = refresh_seconds
+
+    @property
+    def refresh_key(self):
+        return (self.backend, self.processor.sales_table, self.local_path)
+
+    def refresh_due(self):
+        """Whether a read should fold in new sales first"""
+        refreshed = last_refreshed.get(self.refresh_key)
+        return refreshed is None or time.monotonic() - refreshed >= self.refresh_seconds
+
+    @contextmanager
+    def connect(self):
+        """Yield (backend, connection) for the rollup store, committing on success
+
+        With the 'auto' backend the local SQLite file is used whenever the
+        database is unreachable.
+        """
+        backend = "sqlite" if self.backend == "sqlite" else "postgres"
+        conn = None
+        if backend == "postgres":
+            conn = self.processor.connect_to_db()
+            if conn is None:
+                if self.backend != "auto":
+                    raise ConnectionError("Database unavailable for the rollup")
+                backend = "sqlite"
+        if backend == "sqlite":
+            os.makedirs(os.path.dirname(self.local_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.local_path)
+
+        try:
+            yield backend, conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            if backend == "postgres":
+                self.processor.release_connection(conn)
+            else:
+                conn.close()
+
+    def execute(self, backend, conn, query, params=(), many=False):
+        """Run a statement written with %s placeholders on either backend"""
+        if backend == "sqlite":
+            query = query.replace("%s", "?")
+        cursor = conn.cursor()
+        if many:
+            cursor.executemany(query, params)
+        else:
+            cursor.execute(query, params)
+        return cursor
+
+    def ensure_tables(self, backend, conn):
+        """Create the rollup and its state table if they do not exist"""
+        measures = ", ".join(f"{column} {sql_type} NOT NULL" for column, sql_type in ROLLUP_COLUMNS.items())
+        self.execute(backend, conn, f"""
+            CREATE TABLE IF NOT EXISTS {self.table} (
+                {self.date_column} DATE NOT NULL,
+                city TEXT NOT NULL,
+                product TEXT NOT NULL,
+                {measures},
+                PRIMARY KEY ({self.date_column}, city, product)
+            )
+        """)
+        self.execute(backend, conn, f"""
+            CREATE TABLE IF NOT EXISTS {self.state_table} (
+                source TEXT PRIMARY KEY,
+                watermark TEXT,
+                version TEXT
+            )
+        """)
+
+    def read_state(self, backend, conn, source):
+        """(watermark, version) recorded by the last refresh of a source"""
+        row = self.execute(backend, conn, f"SELECT watermark, version FROM {self.state_table} WHERE source = %s",
+                           [source]).fetchone()
+        return row if row else (None, None)
+
+    def write_state(self, backend, conn, source, watermark, version=None):
+        self.execute(backend, conn, f"""
+            INSERT INTO {self.state_table} (source, watermark, version) VALUES (%s, %s, %s)
+            ON CONFLICT (source) DO UPDATE SET watermark = excluded.watermark, version = excluded.version
+        """, [source, watermark, version])
+
+    def upsert_sql(self, rows_sql):
+        """INSERT adding the measures of `rows_sql` to any existing cells"""
+        columns = ", ".join(self.key_columns + list(ROLLUP_COLUMNS))
+        updates = ", ".join(f"{column} = {self.table}.{column} + excluded.{column}" for column in ROLLUP_COLUMNS)
+        return (f"INSERT INTO {self.table} ({columns}) {rows_sql} "
+                f"ON CONFLICT ({', '.join(self.key_columns)}) DO UPDATE SET {updates}")
+
+    def aggregate_sql(self, low=None, high=None, start=None, end=None):
+        """Query aggregating the raw sales table into rollup cells
+
+        Covers watermarks in (low, high] and a [start, end) date range.
+        """
+        watermark_column = self.processor.watermark_column
+        conditions = [f"{self.date_column} IS NOT NULL"]
+        params = []
+        if low is not None:
+            conditions.append(f"{watermark_column} > %s")
+            params.append(low)
+        if high is not None:
+            conditions.append(f"{watermark_column} <= %s")
+            params.append(high)
+        for op, bound in self.processor.date_bounds(start, end):
+            conditions.append(f"{self.date_column} {op} %s")
+            params.append(bound.date())
+
+        query = f"""
+            SELECT {self.date_column}::date AS {self.date_column},
+                COALESCE(city, '') AS city,
+                COALESCE(product, '') AS product,
+                {PARTIAL_AGGREGATIONS_SQL}
+            FROM {self.processor.sales_table}
+            WHERE {' AND '.join(conditions)}
+            GROUP BY 1, 2, 3
+        """
+        return query, params
+
+    def refresh_from_table(self, conn):
+        """Fold sales above the watermark into the PostgreSQL rollup (cells updated)"""
+        # Concurrent refreshes would add the same rows twice
+        self.execute("postgres", conn, "SELECT pg_advisory_xact_lock(hashtext(%s))", [self.table])
+        source = self.processor.sales_table
+        watermark, _ = self.read_state("postgres", conn, source)
+
+        where, params = "", []
+        if watermark is not None:
+            where, params = f"WHERE {self.processor.watermark_column} > %s", [watermark]
+        high = self.execute("postgres", conn, f"SELECT MAX({self.processor.watermark_column}) "
+                                              f"FROM {source} {where}", params).fetchone()[0]
+        if high is None:
+            return 0
+
+        query, params = self.aggregate_sql(watermark, high)
+        cells = self.execute("postgres", conn, self.upsert_sql(query), params).rowcount
+        self.write_state("postgres", conn, source, str(high))
+        return cells
+
+    def local_cells(self, data):
+        """Aggregate local rows into rollup cell tuples"""
+        columns = list(SALES_SCHEMA) + [self.date_column]
+        data = data[columns].dropna(subset=[self.date_column])
+        if data.empty:
+            return []
+        daily = self.processor.daily_aggregate(self.processor.calculate_metrics(data, copy=False)).reset_index()
+        daily[self.date_column] = daily[self.date_column].dt.strftime("%Y-%m-%d")
+        for key in GROUP_KEYS:
+            daily[key] = daily[key].astype(object).fillna("").astype(str)
+        return list(daily[self.key_columns + list(ROLLUP_COLUMNS)].itertuples(index=False, name=None))
+
+    def read_local_source(self, previous):
+        """New local rows since `previous` (a stored version), the new version and whether to rebuild
+
+        Snapshot parts are append-only, so only parts not folded in yet are
+        read; a compacted snapshot or a replaced backup is rebuilt from scratch.
+        """
+        columns = list(SALES_SCHEMA) + [self.date_column]
+        state = self.processor.read_snapshot_state()
+        if state and state["parts"]:
+            folded = previous.get("parts", [])
+            rebuild = not folded or not set(folded) <= set(state["parts"])
+            parts = state["parts"] if rebuild else [part for part in state["parts"] if part not in folded]
+            if not parts:
+                return None, previous, False
+            data = pd.concat([pd.read_parquet(os.path.join(self.processor.snapshot_dir, part), columns=columns)
+                              for part in parts], ignore_index=True)
+            return self.processor.apply_schema(data, report=False), {"parts": state["parts"]}, rebuild
+
+        backup_path = self.processor.backup_path
+        if not os.path.exists(backup_path):
+            return None, previous, False
+        stat = os.stat(backup_path)
+        version = {"backup": f"{backup_path}:{stat.st_mtime_ns}:{stat.st_size}"}
+        if version == previous:
+            return None, previous, False
+        return self.processor.load_data_from_backup(columns), version, True
+
+    def refresh_from_local(self, conn):
+        """Fold new local rows into the SQLite rollup (cells updated)"""
+        _, version = self.read_state("sqlite", conn, LOCAL_SOURCE)
+        data, new_version, rebuild = self.read_local_source(json.loads(version) if version else {})
+        if data is None:
+            return 0
+
+        if rebuild:
+            self.execute("sqlite", conn, f"DELETE FROM {self.table}")
+        cells = self.local_cells(data)
+        if cells:
+            placeholders = ", ".join(["%s"] * len(cells[0]))
+            self.execute("sqlite", conn, self.upsert_sql(f"VALUES ({placeholders})"), cells, many=True)
+        self.write_state("sqlite", conn, LOCAL_SOURCE, None, json.dumps(new_version))
+        return len(cells)
+
+    def fold_new_rows(self, backend, conn):
+        """Create the tables if needed and fold in new sales (cells updated)"""
+        self.ensure_tables(backend, conn)
+        if backend == "postgres":
+            return self.refresh_from_table(conn)
+        return self.refresh_from_local(conn)
+
+    @instrumented("rollup_refresh")
+    def refresh(self):
+        """Fold sales added since the last refresh into the rollup
+
+        Returns the number of cells updated, or None on failure.
+        """
+        try:
+            with self.connect() as (backend, conn):
+                cells = self.fold_new_rows(backend, conn)
+            last_refreshed[self.refresh_key] = time.monotonic()
+            annotate(backend=backend, cells=cells)
+            logger.info(f"Rollup refreshed in {backend} ({cells} cells updated)")
+            return cells
+        except Exception as e:
+            logger.error(f"Error refreshing rollup: {e}")
+            return None
+
+    def rebuild(self):
+        """Recompute the rollup from scratch (cells written, None on failure)"""
+        try:
+            with self.connect() as (backend, conn):
+                self.ensure_tables(backend, conn)
+                self.execute(backend, conn, f"DELETE FROM {self.table}")
+                self.execute(backend, conn, f"DELETE FROM {self.state_table}")
+                cells = self.fold_new_rows(backend, conn)
+            logger.info(f"Rollup rebuilt in {backend} ({cells} cells)")
+            return cells
+        except Exception as e:
+            logger.error(f"Error rebuilding rollup: {e}")
+            return None
+
+    def cells_frame(self, data):
+        """Index rollup cells by (day, city, product) like get_daily_aggregates"""
+        data[self.date_column] = pd.to_datetime(data[self.date_column])
+        for key in GROUP_KEYS:
+            data[key] = data[key].astype(object).fillna("").astype(str)
+        return data.set_index(self.key_columns)
+
+    def select_cells(self, backend, conn, start=None, end=None):
+        conditions = []
+        params = []
+        for op, bound in self.processor.date_bounds(start, end):
+            conditions.append(f"{self.date_column} {op} %s")
+            params.append(bound.date() if backend == "postgres" else bound.date().isoformat())
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        cursor = self.execute(backend, conn, f"SELECT {', '.join(self.key_columns + list(ROLLUP_COLUMNS))} "
+                                             f"FROM {self.table} {where}", params)
+        columns = [column[0] for column in cursor.description]
+        return self.cells_frame(pd.DataFrame.from_records(cursor.fetchall(), columns=columns))
+
+    @instrumented("rollup_read")
+    def read(self, start=None, end=None, refresh=None):
+        """Rollup cells for a [start, end) date range
+
+        New sales are folded in first when `refresh` is true, or by default
+        when refresh_due().
+
+        Returns a frame indexed by (day, city, product) with the
+        partial_aggregate columns, or None when the rollup is unavailable
+        (disabled, no sale date column, or the store cannot be used).
+        """
+        if self.backend == "off" or not self.processor.has_date_column():
+            return None
+
+        try:
+            with self.connect() as (backend, conn):
+                if refresh or (refresh is None and self.refresh_due()):
+                    self.fold_new_rows(backend, conn)
+                    last_refreshed[self.refresh_key] = time.monotonic()
+                cells = self.select_cells(backend, conn, start, end)
+            annotate(backend=backend)
+            return cells
+        except Exception as e:
+            logger.error(f"Error reading rollup: {e}")
+            return None
+
+    def compare(self, rollup, raw):
+        """Cells whose rollup and raw values differ, side by side"""
+        rollup, raw = rollup.align(raw, join="outer", fill_value=0)
+        tolerance = CONSISTENCY_TOLERANCE * np.maximum(rollup.abs(), raw.abs()) + 1e-6
+        mismatched = ((rollup - raw).abs() > tolerance).any(axis=1)
+        return pd.concat({"rollup": rollup[mismatched], "raw": raw[mismatched]}, axis=1)
+
+    @instrumented("rollup_check")
+    def check_consistency(self, start=None, end=None):
+        """Compare the rollup with aggregates recomputed from the raw data
+
+        The rollup is refreshed first; in PostgreSQL only sales up to its
+        watermark are compared, so rows arriving meanwhile are not reported.
+        Returns the mismatched cells (empty when consistent), None if the
+        check could not run.
+        """
+        try:
+            with self.connect() as (backend, conn):
+                self.fold_new_rows(backend, conn)
+                rollup = self.select_cells(backend, conn, start, end)
+                if backend == "postgres":
+                    watermark, _ = self.read_state(backend, conn, self.processor.sales_table)
+                    query, params = self.aggregate_sql(high=watermark, start=start, end=end)
+                    raw = pd.read_sql_query(query, conn, params=params)
+                else:
+                    data = self.processor.load_local_data(list(SALES_SCHEMA) + [self.date_column],
+                                                          start=start, end=end)
+                    raw = pd.DataFrame(self.local_cells(data), columns=self.key_columns + list(ROLLUP_COLUMNS))
+            differences = self.compare(rollup, self.cells_frame(raw))
+            annotate(backend=backend, cells=len(rollup), mismatched=len(differences))
+        except Exception as e:
+            logger.error(f"Error checking rollup consistency: {e}")
+            return None
+
+        if differences.empty:
+            logger.info(f"Rollup is consistent with the raw data ({len(rollup)} cells)")
+        else:
+            logger.warning(f"Rollup differs from the raw data in {len(differences)} cells")
+        return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the daily sales rollup")
+    parser.add_argument("command", choices=["refresh", "rebuild", "check"])
+    parser.add_argument("--start", help="first day to check (YYYY-MM-DD)")
+    parser.add_argument("--end", help="day after the last one to check")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    rollup = SalesRollup()
+    if args.command == "refresh":
+        return 0 if rollup.refresh() is not None else 1
+    if args.command == "rebuild":
+        return 0 if rollup.rebuild() is not None else 1
+
+    differences = rollup.check_consistency(args.start, args.end)
+    if differences is None:
+        return 1
+    if not differences.empty:
+        print(differences.to_string())
+    return 0 if differences.empty else 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())